@@ -20,6 +20,9 @@ from pmotools.scripts.convertors_to_pmo.microhaplotype_table_to_json_file import
 from pmotools.scripts.convertors_to_pmo.terra_amp_output_to_json import (
     terra_amp_output_to_json,
 )
+from pmotools.scripts.convertors_to_pmo.sqlite_to_pmo import (
+    sqlite_to_pmo,
+)
 
 # extractors_from_pmo
 from pmotools.scripts.extractors_from_pmo.extract_pmo_with_selected_meta import (
@@ -37,13 +40,19 @@ from pmotools.scripts.extractors_from_pmo.extract_pmo_with_select_targets import
 from pmotools.scripts.extractors_from_pmo.extract_pmo_with_read_filter import (
     extract_pmo_with_read_filter,
 )
+from pmotools.scripts.extractors_from_pmo.extract_pmo_with_filter import (
+    extract_pmo_with_filter,
+)
 from pmotools.scripts.pmo_to_tables.extract_allele_table import (
     extract_for_allele_table,
 )
 
 # pmo_utils
 from pmotools.scripts.pmo_utils.combine_pmos import combine_pmos
+from pmotools.scripts.pmo_utils.append_pmo import append_pmo
 from pmotools.scripts.pmo_utils.validate_pmo import validate_pmo
+from pmotools.scripts.pmo_utils.split_pmo import split_pmo
+from pmotools.scripts.pmo_utils.pmo_cache import pmo_cache
 
 # extract_info_from_pmo
 from pmotools.scripts.extract_info_from_pmo.list_library_sample_names_per_specimen_name import (
@@ -64,6 +73,13 @@ from pmotools.scripts.extract_info_from_pmo.count_targets_per_library_sample imp
 from pmotools.scripts.extract_info_from_pmo.count_library_samples_per_target import (
     count_library_samples_per_target,
 )
+from pmotools.scripts.extract_info_from_pmo.calc_within_sample_diversity import (
+    calc_within_sample_diversity,
+)
+from pmotools.scripts.extract_info_from_pmo.calc_population_diversity import (
+    calc_population_diversity,
+)
+from pmotools.scripts.extract_info_from_pmo.query_pmo import query_pmo
 
 # panel info subset
 from pmotools.scripts.pmo_to_tables.extract_insert_of_panels import (
@@ -96,6 +112,18 @@ from pmotools.scripts.pmo_to_tables.export_target_info_meta_table import (
 from pmotools.scripts.pmo_to_tables.export_panel_info_meta_table import (
     export_panel_info_meta_table,
 )
+from pmotools.scripts.pmo_to_tables.export_all_tables import (
+    export_all_tables,
+)
+from pmotools.scripts.pmo_to_tables.pmo_to_sqlite import (
+    pmo_to_sqlite,
+)
+from pmotools.scripts.pmo_to_tables.export_allele_matrix import (
+    export_allele_matrix,
+)
+from pmotools.scripts.pmo_to_tables.calc_pairwise_distances import (
+    calc_pairwise_distances,
+)
 
 
 @dataclass(frozen=True)
@@ -119,6 +147,9 @@ REGISTRY: Dict[str, Dict[str, PmoCommand]] = {
         "terra_amp_output_to_json": PmoCommand(
             terra_amp_output_to_json, "Convert Terra output to JSON sequence table"
         ),
+        "sqlite_to_pmo": PmoCommand(
+            sqlite_to_pmo, "Convert a SQLite database from pmo_to_sqlite back to a PMO"
+        ),
     },
     "extractors_from_pmo": {
         "extract_pmo_with_selected_meta": PmoCommand(
@@ -139,11 +170,26 @@ REGISTRY: Dict[str, Dict[str, PmoCommand]] = {
         "extract_pmo_with_read_filter": PmoCommand(
             extract_pmo_with_read_filter, "Extract with a read filter"
         ),
+        "extract_pmo_with_filter": PmoCommand(
+            extract_pmo_with_filter,
+            "Extract with combined specimen, library, target, meta and read filters in one pass",
+        ),
     },
     "working_with_multiple_pmos": {
         "combine_pmos": PmoCommand(
             combine_pmos, "Combine multiple PMOs of the same panel"
         ),
+        "append_pmo": PmoCommand(
+            append_pmo, "Append new PMOs of the same panel to an existing PMO"
+        ),
+        "split_pmo": PmoCommand(
+            split_pmo,
+            "Split a PMO into shards by number, project or specimen meta field",
+        ),
+        "pmo_cache": PmoCommand(
+            pmo_cache,
+            "List, shrink or clear the cache of parsed PMO files used when PMOTOOLS_CACHE_DIR is set",
+        ),
     },
     "extract_basic_info_from_pmo": {
         "list_library_sample_names_per_specimen_name": PmoCommand(
@@ -167,6 +213,18 @@ REGISTRY: Dict[str, Dict[str, PmoCommand]] = {
         "count_library_samples_per_target": PmoCommand(
             count_library_samples_per_target, "Count number of samples per target"
         ),
+        "calc_within_sample_diversity": PmoCommand(
+            calc_within_sample_diversity,
+            "Calculate MOI proxies and within-host heterozygosity per sample",
+        ),
+        "calc_population_diversity": PmoCommand(
+            calc_population_diversity,
+            "Calculate per target heterozygosity and allele richness per population and pairwise Fst",
+        ),
+        "query_pmo": PmoCommand(
+            query_pmo,
+            "Run a SQL query against a PMO loaded into SQLite tables",
+        ),
     },
     "validation": {
         "validate_pmo": PmoCommand(
@@ -201,10 +259,26 @@ REGISTRY: Dict[str, Dict[str, PmoCommand]] = {
             export_panel_info_meta_table,
             "export the panel info meta table from a PMO file",
         ),
+        "export_all_tables": PmoCommand(
+            export_all_tables,
+            "export all the meta tables from a PMO file into a directory in one go",
+        ),
+        "pmo_to_sqlite": PmoCommand(
+            pmo_to_sqlite,
+            "export a whole PMO file into an indexed SQLite database of relational tables",
+        ),
         "extract_allele_table": PmoCommand(
             extract_for_allele_table,
             "Extract allele tables for tools like dcifer or moire",
         ),
+        "export_allele_matrix": PmoCommand(
+            export_allele_matrix,
+            "Export a sparse library sample x allele matrix as a numpy .npz",
+        ),
+        "calc_pairwise_distances": PmoCommand(
+            calc_pairwise_distances,
+            "Calculate pairwise allele sharing, Jaccard or IBS distances between library samples",
+        ),
         "extract_insert_of_panels": PmoCommand(
             extract_insert_of_panels, "Extract inserts of panels from a PMO"
         ),
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import pandas as pd
+from pmotools.pmo_engine.pmo_index import PMOIndex
 from pmotools.pmo_engine.pmo_processor import PMOProcessor
 from datetime import datetime
 
@@ -36,6 +37,7 @@ class PMOUpdater(object):
         geo_admin3_col: str = None,
         lat_lon_col: str = None,
         replace_current_traveler_info: bool = False,
+        pmo_index: PMOIndex = None,
     ):
         """
         Update a PMO's specimen's metadata with travel info
@@ -51,6 +53,7 @@ class PMOUpdater(object):
         :param geo_admin3_col: (Optional) the column name containing the traveled to country admin level 3 info
         :param lat_lon_col: (Optional) the latitude and longitude column name containing the region traveled to latitude and longitude
         :param replace_current_traveler_info: whether to replace current travel info
+        :param pmo_index: an optional PMOIndex of pmo to reuse, it is invalidated after the specimens are updated
         :return: a reference to the updated PMO
         """
         required_cols = [
@@ -76,7 +79,7 @@ class PMOUpdater(object):
                 " columns in table: " + ",".join(traveler_info.columns),
             )
 
-        specimen_names_in_pmo = set(PMOProcessor.get_specimen_names(pmo))
+        specimen_names_in_pmo = set(PMOProcessor.get_specimen_names(pmo, pmo_index))
         specimen_names_in_traveler_info = set(
             traveler_info[specimen_name_col].astype(str).tolist()
         )
@@ -89,7 +92,7 @@ class PMOUpdater(object):
                 f"Provided traveler info for the following specimens but they are missing from the PMO: {sorted(missing_traveler_specs)}"
             )
         traveler_info_records = traveler_info[required_cols].to_dict(orient="records")
-        spec_indexs = PMOProcessor.get_index_key_of_specimen_names(pmo)
+        spec_indexs = PMOProcessor.get_index_key_of_specimen_names(pmo, pmo_index)
 
         # prep traveler info lists, clear the list if we are replacing or start an empty list to append to if none exist already
         for specimen_name in specimen_names_in_traveler_info:
@@ -122,4 +125,7 @@ class PMOUpdater(object):
             pmo["specimen_info"][spec_indexs[specimen_name]][
                 "travel_out_six_month"
             ].append(travel_rec)
+        if pmo_index is not None:
+            # the specimen meta has changed
+            pmo_index.invalidate()
         return pmo
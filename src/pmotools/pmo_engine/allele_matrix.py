@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+import os
+
+import numpy as np
+
+
+class AlleleMatrix:
+    """
+    A sparse library sample x allele matrix, e.g. of the reads of each detected microhaplotype, held in compressed sparse row (CSR) form.
+    The non-zero values of row i are data[indptr[i]:indptr[i + 1]] in the columns indices[indptr[i]:indptr[i + 1]], the same layout as
+    scipy.sparse.csr_matrix((data, indices, indptr), shape) so it can be handed to scipy as is.
+    Rows are labelled by library_sample_name and columns by target_name and mhap_id. Built with PMOExporter.export_allele_matrix,
+    and saved as a .npz that only needs numpy to load.
+    """
+
+    # the arrays saved to and loaded from a .npz file
+    array_names = [
+        "indptr",
+        "indices",
+        "data",
+        "library_sample_names",
+        "target_names",
+        "mhap_ids",
+    ]
+
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+        library_sample_names: np.ndarray,
+        target_names: np.ndarray,
+        mhap_ids: np.ndarray,
+    ):
+        """
+        :param indptr: the start of each row's values in indices and data, with the number of values appended
+        :param indices: the column of each value
+        :param data: the values
+        :param library_sample_names: the library_sample_name of each row
+        :param target_names: the target_name of each column
+        :param mhap_ids: the mhap_id of each column
+        """
+        if len(indptr) != len(library_sample_names) + 1:
+            raise Exception(
+                "indptr should be 1 longer than the number of rows, "
+                + str(len(indptr))
+                + " vs "
+                + str(len(library_sample_names))
+            )
+        if len(target_names) != len(mhap_ids):
+            raise Exception(
+                "target_names and mhap_ids should be the same length, "
+                + str(len(target_names))
+                + " vs "
+                + str(len(mhap_ids))
+            )
+        if len(indices) != len(data):
+            raise Exception(
+                "indices and data should be the same length, "
+                + str(len(indices))
+                + " vs "
+                + str(len(data))
+            )
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.library_sample_names = library_sample_names
+        self.target_names = target_names
+        self.mhap_ids = mhap_ids
+
+    @staticmethod
+    def from_columns(
+        library_sample_ids: np.ndarray,
+        mhaps_target_ids: np.ndarray,
+        mhap_ids: np.ndarray,
+        reads: np.ndarray,
+        library_sample_names: list[str],
+        representative_target_names: list[str],
+        value: str = "reads",
+    ) -> "AlleleMatrix":
+        """
+        Build the matrix from one entry per detected microhaplotype, e.g. the columns of a PMOFrame.
+        There is a row for every library sample and a column for every detected (mhaps_target_id, mhap_id), in the order of mhaps_target_id and then mhap_id.
+        Repeated cells (e.g. a library sample detected in more than one bioinformatics run) have their reads summed
+        :param library_sample_ids: the library_sample_id of each entry
+        :param mhaps_target_ids: the mhaps_target_id of each entry
+        :param mhap_ids: the mhap_id of each entry
+        :param reads: the reads of each entry
+        :param library_sample_names: the library_sample_name of each library_sample_id
+        :param representative_target_names: the target_name of each mhaps_target_id
+        :param value: the value of each cell, either reads or presence (1 if detected)
+        :return: the matrix
+        """
+        if value not in ["reads", "presence"]:
+            raise Exception(
+                "value should be either reads or presence, not " + str(value)
+            )
+        # columns, one per detected (mhaps_target_id, mhap_id)
+        mhap_dim = int(mhap_ids.max()) + 1 if len(mhap_ids) > 0 else 1
+        column_keys, column_index = np.unique(
+            mhaps_target_ids * mhap_dim + mhap_ids, return_inverse=True
+        )
+        column_number = max(len(column_keys), 1)
+        # cells, sorted by row then column which is the CSR order
+        cell_keys, cell_index = np.unique(
+            library_sample_ids * column_number + column_index, return_inverse=True
+        )
+        if value == "reads":
+            data = np.bincount(cell_index, weights=reads).astype(np.int64)
+        else:
+            data = np.ones(len(cell_keys), dtype=np.int8)
+        row_counts = np.bincount(
+            cell_keys // column_number, minlength=len(library_sample_names)
+        )
+        return AlleleMatrix(
+            np.concatenate(([0], np.cumsum(row_counts))).astype(np.int64),
+            (cell_keys % column_number).astype(np.int64),
+            data,
+            np.asarray(library_sample_names, dtype=str),
+            np.asarray(representative_target_names, dtype=str)[column_keys // mhap_dim],
+            column_keys % mhap_dim,
+        )
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.library_sample_names), len(self.target_names)
+
+    @property
+    def nnz(self) -> int:
+        """
+        The number of stored (non-zero) values
+        """
+        return len(self.data)
+
+    @property
+    def row_index(self) -> np.ndarray:
+        """
+        The row of each value, i.e. the rows of the COO form of the matrix
+        """
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def to_dense(self) -> np.ndarray:
+        """
+        Get the matrix as a dense array, only sensible for small matrices
+        :return: a 2D array of shape self.shape
+        """
+        ret = np.zeros(self.shape, dtype=self.data.dtype)
+        ret[self.row_index, self.indices] = self.data
+        return ret
+
+    def save(self, fnp: str | os.PathLike[str]):
+        """
+        Save the matrix as a compressed .npz file holding the arrays named in array_names, the labels are stored as
+        fixed width unicode arrays so the file can be loaded with numpy.load(fnp) without allow_pickle
+        :param fnp: the output file name path, .npz is added by numpy if it doesn't end with it
+        :return: nothing
+        """
+        np.savez_compressed(
+            fnp,
+            indptr=self.indptr,
+            indices=self.indices,
+            data=self.data,
+            library_sample_names=np.asarray(self.library_sample_names, dtype=str),
+            target_names=np.asarray(self.target_names, dtype=str),
+            mhap_ids=self.mhap_ids,
+        )
+
+    @staticmethod
+    def load(fnp: str | os.PathLike[str]) -> "AlleleMatrix":
+        """
+        Load a matrix saved with save
+        :param fnp: the .npz file name path
+        :return: the matrix
+        """
+        with np.load(fnp, allow_pickle=False) as npz:
+            missing = [name for name in AlleleMatrix.array_names if name not in npz]
+            if len(missing) > 0:
+                raise Exception(
+                    f"{fnp} is missing arrays: {', '.join(missing)}, not an allele matrix"
+                )
+            return AlleleMatrix(*(npz[name] for name in AlleleMatrix.array_names))
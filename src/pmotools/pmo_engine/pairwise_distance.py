@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pmotools.pmo_engine.allele_matrix import AlleleMatrix
+
+
+class PairwiseDistance:
+    """
+    Pairwise genetic distances between the rows (library samples) of an AlleleMatrix, only counting the targets detected in both samples of a pair.
+    Each sample's alleles at each target are packed into bitmasks of 64 alleles per word, so the alleles two samples share at a target
+    are the popcount of the AND of their words. The distances are computed a block of rows at a time, optionally in a process pool,
+    and written into a condensed (like scipy.spatial.distance.pdist) or square array which can be memory mapped to a .npy file.
+
+    The metrics are
+        jaccard: 1 - shared alleles / the union of alleles, summed over the shared targets
+        allele_sharing: 1 - the fraction of shared targets where the samples have at least one allele in common
+        ibs: 1 - the fraction of shared targets where the samples have identical alleles
+    Pairs without any shared targets have a distance of NaN.
+    """
+
+    metrics = ["jaccard", "allele_sharing", "ibs"]
+
+    # the PairwiseDistance of the worker processes, set by _init_worker
+    _worker_distance = None
+
+    # number of bits set in each byte, for numpy versions without np.bitwise_count
+    _popcount_table = np.array([bin(byte).count("1") for byte in range(256)], np.uint8)
+
+    def __init__(self, allele_matrix: AlleleMatrix):
+        """
+        :param allele_matrix: the matrix to compute the distances between the rows of, any stored value counts as the allele being present
+        """
+        self.sample_number = allele_matrix.shape[0]
+        # group the columns by target
+        _, column_targets = np.unique(allele_matrix.target_names, return_inverse=True)
+        self.target_number = int(column_targets.max()) + 1 if len(column_targets) else 0
+        column_order = np.argsort(column_targets, kind="stable")
+        target_sizes = np.bincount(column_targets, minlength=self.target_number)
+        target_starts = np.concatenate(([0], np.cumsum(target_sizes)[:-1]))
+        column_rank = np.empty(len(column_targets), dtype=np.int64)
+        column_rank[column_order] = np.arange(len(column_targets)) - np.repeat(
+            target_starts, target_sizes
+        )
+        # words per target and the word and bit of each column
+        target_word_counts = (target_sizes + 63) // 64
+        self.target_word_offsets = np.concatenate(
+            ([0], np.cumsum(target_word_counts))
+        ).astype(np.int64)
+        column_words = self.target_word_offsets[column_targets] + column_rank // 64
+        column_bits = np.left_shift(np.uint64(1), (column_rank % 64).astype(np.uint64))
+
+        present = allele_matrix.data != 0
+        rows = allele_matrix.row_index[present]
+        columns = allele_matrix.indices[present]
+        self.masks = np.zeros(
+            (self.sample_number, int(self.target_word_offsets[-1])), dtype=np.uint64
+        )
+        np.bitwise_or.at(
+            self.masks, (rows, column_words[columns]), column_bits[columns]
+        )
+        # the number of alleles of each sample at each target
+        self.sizes = np.bincount(
+            rows * self.target_number + column_targets[columns],
+            minlength=self.sample_number * self.target_number,
+        ).reshape(self.sample_number, self.target_number)
+
+    @staticmethod
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        """
+        Count the bits set in each word
+        :param words: an array of uint64
+        :return: the counts, same shape as words
+        """
+        if hasattr(np, "bitwise_count"):
+            return np.bitwise_count(words)
+        return (
+            PairwiseDistance._popcount_table[np.ascontiguousarray(words).view(np.uint8)]
+            .reshape(words.shape + (8,))
+            .sum(axis=-1)
+        )
+
+    def calc_block(
+        self, row_start: int, row_end: int, column_start: int, metric: str
+    ) -> np.ndarray:
+        """
+        Compute the distances of a block of rows to the samples from column_start onwards
+        :param row_start: the first row of the block
+        :param row_end: the row after the last row of the block
+        :param column_start: the first sample to compute the distances to
+        :param metric: the distance metric, one of metrics
+        :return: an array of shape (row_end - row_start, sample_number - column_start)
+        """
+        shape = (row_end - row_start, self.sample_number - column_start)
+        row_masks = self.masks[row_start:row_end]
+        column_masks = self.masks[column_start:]
+        row_typed = (self.sizes[row_start:row_end] > 0).astype(np.float64)
+        column_typed = (self.sizes[column_start:] > 0).astype(np.float64)
+        # the number of targets detected in both samples of each pair
+        shared_targets = row_typed @ column_typed.T
+        numerator = np.zeros(shape, dtype=np.int64)
+        if metric == "jaccard":
+            # alleles only match within a target so the shared alleles can be summed over all the words at once
+            for word in range(row_masks.shape[1]):
+                numerator += PairwiseDistance._popcount(
+                    row_masks[:, word, None] & column_masks[None, :, word]
+                )
+            # the union over the shared targets, |A| + |B| - |A & B|
+            denominator = (
+                self.sizes[row_start:row_end] @ column_typed.T
+                + row_typed @ self.sizes[column_start:].T
+                - numerator
+            )
+        else:
+            for target in range(self.target_number):
+                words = range(
+                    self.target_word_offsets[target],
+                    self.target_word_offsets[target + 1],
+                )
+                if metric == "allele_sharing":
+                    matches = np.zeros(shape, dtype=bool)
+                    for word in words:
+                        matches |= (
+                            row_masks[:, word, None] & column_masks[None, :, word]
+                        ) != 0
+                else:
+                    # identical alleles, untyped samples have all zero words so only typed rows are counted
+                    matches = np.broadcast_to(
+                        row_typed[:, target, None] > 0, shape
+                    ).copy()
+                    for word in words:
+                        matches &= (
+                            row_masks[:, word, None] == column_masks[None, :, word]
+                        )
+                numerator += matches
+            denominator = shared_targets
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(denominator > 0, 1 - numerator / denominator, np.nan)
+
+    @staticmethod
+    def _init_worker(allele_matrix: AlleleMatrix):
+        """
+        Set up the PairwiseDistance of a worker process once, rather than sending it with every block
+        :param allele_matrix: the matrix to compute the distances of
+        :return: nothing
+        """
+        PairwiseDistance._worker_distance = PairwiseDistance(allele_matrix)
+
+    @staticmethod
+    def _calc_block_in_worker(
+        row_start: int, row_end: int, column_start: int, metric: str
+    ) -> np.ndarray:
+        """
+        calc_block run in a worker process set up by _init_worker
+        """
+        return PairwiseDistance._worker_distance.calc_block(
+            row_start, row_end, column_start, metric
+        )
+
+    @staticmethod
+    def calc_distances(
+        allele_matrix: AlleleMatrix,
+        metric: str = "jaccard",
+        output_fnp: str | os.PathLike[str] = None,
+        square: bool = False,
+        threads: int = 1,
+        block_size: int = 256,
+    ) -> np.ndarray:
+        """
+        Compute the pairwise distances between all the rows of an allele matrix
+        :param allele_matrix: the matrix to compute the distances of
+        :param metric: the distance metric, one of PairwiseDistance.metrics
+        :param output_fnp: if given, the distances are written to this .npy file through a memory map rather than held in memory
+        :param square: if True, output the full square matrix, otherwise the condensed upper triangle in the order of scipy.spatial.distance.pdist
+        :param threads: the number of worker processes to compute the blocks in
+        :param block_size: the number of rows to compute at once, the memory used per block is about 48 x block_size x the number of rows bytes
+        :return: the distances, a numpy.memmap of output_fnp if given
+        """
+        if metric not in PairwiseDistance.metrics:
+            raise Exception(
+                "metric should be one of "
+                + ", ".join(PairwiseDistance.metrics)
+                + ", not "
+                + str(metric)
+            )
+        if block_size < 1:
+            raise Exception("block_size must be at least 1, not " + str(block_size))
+        sample_number = allele_matrix.shape[0]
+        shape = (
+            (sample_number, sample_number)
+            if square
+            else (sample_number * (sample_number - 1) // 2,)
+        )
+        if output_fnp is None:
+            ret = np.empty(shape, dtype=np.float64)
+        else:
+            ret = np.lib.format.open_memmap(
+                output_fnp, mode="w+", dtype=np.float64, shape=shape
+            )
+        # for the condensed form only the upper triangle, the columns from the block's first row on, are needed
+        blocks = [
+            (row_start, min(row_start + block_size, sample_number))
+            for row_start in range(0, sample_number, block_size)
+        ]
+
+        def store(row_start: int, block: np.ndarray):
+            if square:
+                ret[row_start : row_start + len(block)] = block
+                return
+            for block_row, row in enumerate(range(row_start, row_start + len(block))):
+                offset = row * sample_number - row * (row + 1) // 2
+                ret[offset : offset + sample_number - row - 1] = block[
+                    block_row, row - row_start + 1 :
+                ]
+
+        if threads <= 1:
+            distance = PairwiseDistance(allele_matrix)
+            for row_start, row_end in blocks:
+                store(
+                    row_start,
+                    distance.calc_block(
+                        row_start, row_end, 0 if square else row_start, metric
+                    ),
+                )
+        else:
+            blocks_iter = iter(blocks)
+            with ProcessPoolExecutor(
+                max_workers=threads,
+                initializer=PairwiseDistance._init_worker,
+                initargs=(allele_matrix,),
+            ) as executor:
+
+                def submit(row_start: int, row_end: int):
+                    return row_start, executor.submit(
+                        PairwiseDistance._calc_block_in_worker,
+                        row_start,
+                        row_end,
+                        0 if square else row_start,
+                        metric,
+                    )
+
+                # only a limited number of blocks are in flight so memory stays bounded
+                in_flight = deque(
+                    submit(*block)
+                    for block in itertools.islice(blocks_iter, 2 * threads)
+                )
+                while in_flight:
+                    row_start, future = in_flight.popleft()
+                    store(row_start, future.result())
+                    next_block = next(blocks_iter, None)
+                    if next_block is not None:
+                        in_flight.append(submit(*next_block))
+        if output_fnp is not None:
+            ret.flush()
+        return ret
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import pickle
+import time
+
+from pmotools import __version__ as __pmotools_version__
+
+
+class PMOCache:
+    """
+    An on disk cache of parsed PMO files, so reading in the same PMO file again (e.g. by several pmotools commands in a row) unpickles
+    it rather than decompressing and parsing the JSON again.
+
+    The cache is opt-in, PMOReader.read_in_pmo uses it when given a cache directory or when the PMOTOOLS_CACHE_DIR environment variable is set.
+    Entries are keyed on the PMO file's absolute path, size and modification time, so an edited file is parsed again, and each
+    entry is a pickle (protocol 5) of a small header describing the PMO file followed by the parsed PMO. Reading an entry marks it
+    as used by updating its modification time, and once the entries add up to more than the maximum size (PMOTOOLS_CACHE_MAX_SIZE, 2G by default)
+    the least recently used are removed.
+    """
+
+    cache_dir_env_var = "PMOTOOLS_CACHE_DIR"
+    max_size_env_var = "PMOTOOLS_CACHE_MAX_SIZE"
+    default_max_size = 2 * 1024**3
+    pickle_protocol = 5
+    entry_extension = ".pmo.pickle"
+
+    @staticmethod
+    def get_cache_dir(cache_dir: str | os.PathLike[str] = None) -> str | None:
+        """
+        Get the cache directory to use
+        :param cache_dir: the cache directory, if not given the PMOTOOLS_CACHE_DIR environment variable is used
+        :return: the cache directory or None if caching isn't turned on
+        """
+        if cache_dir is None:
+            cache_dir = os.environ.get(PMOCache.cache_dir_env_var)
+        if cache_dir is None or str(cache_dir) == "":
+            return None
+        return str(cache_dir)
+
+    @staticmethod
+    def parse_size(size: str | int) -> int:
+        """
+        Parse a size in bytes, which can end in K, M, G or T, e.g. 500M
+        :param size: the size
+        :return: the size in bytes
+        """
+        if isinstance(size, int):
+            return size
+        size = str(size).strip().upper().removesuffix("B")
+        multiplier = 1
+        for power, suffix in enumerate(["K", "M", "G", "T"], start=1):
+            if size.endswith(suffix):
+                size = size[:-1]
+                multiplier = 1024**power
+                break
+        try:
+            return int(float(size) * multiplier)
+        except ValueError:
+            raise Exception(
+                "Could not parse size " + str(size) + ", expected e.g. 1000, 500M or 2G"
+            )
+
+    @staticmethod
+    def get_max_size(max_size: str | int = None) -> int:
+        """
+        Get the maximum total size of the cache
+        :param max_size: the maximum size, if not given the PMOTOOLS_CACHE_MAX_SIZE environment variable or else default_max_size is used
+        :return: the maximum size in bytes
+        """
+        if max_size is None:
+            max_size = os.environ.get(
+                PMOCache.max_size_env_var, PMOCache.default_max_size
+            )
+        return PMOCache.parse_size(max_size)
+
+    @staticmethod
+    def file_header(fnp: str | os.PathLike[str]) -> dict:
+        """
+        Describe a PMO file for its cache entry, an entry is only used while this stays the same.
+        Take this before reading the file so a file changed while being read isn't cached under its new size and modification time
+        :param fnp: the PMO file
+        :return: the absolute path, size and modification time of the file and the pmotools version
+        """
+        stat = os.stat(fnp)
+        return {
+            "fnp": os.path.abspath(fnp),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "pmotools_version": __pmotools_version__,
+        }
+
+    @staticmethod
+    def _entry_fnp(cache_dir: str, header: dict) -> str:
+        key = hashlib.sha256(
+            "\0".join(str(header[field]) for field in sorted(header)).encode()
+        ).hexdigest()
+        return os.path.join(cache_dir, key + PMOCache.entry_extension)
+
+    @staticmethod
+    def load(header: dict, cache_dir: str | os.PathLike[str]):
+        """
+        Get the cached parsed PMO of a PMO file
+        :param header: the header of the PMO file, see file_header
+        :param cache_dir: the cache directory
+        :return: the PMO or None if it isn't cached
+        """
+        entry_fnp = PMOCache._entry_fnp(str(cache_dir), header)
+        try:
+            with open(entry_fnp, "rb") as f:
+                if pickle.load(f) != header:
+                    return None
+                pmo = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            # an unreadable entry, e.g. from an interrupted write, is parsed again
+            PMOCache._remove(entry_fnp)
+            return None
+        # mark as used for the least recently used eviction
+        try:
+            os.utime(entry_fnp)
+        except FileNotFoundError:
+            pass
+        return pmo
+
+    @staticmethod
+    def store(
+        header: dict,
+        pmo: dict,
+        cache_dir: str | os.PathLike[str],
+        max_size: str | int = None,
+    ):
+        """
+        Cache the parsed PMO of a PMO file, then evict the least recently used entries over the maximum size
+        :param header: the header of the PMO file taken before it was read, see file_header
+        :param pmo: the parsed PMO
+        :param cache_dir: the cache directory, created if it doesn't exist
+        :param max_size: the maximum total size of the cache, see get_max_size
+        :return: nothing
+        """
+        cache_dir = str(cache_dir)
+        max_size = PMOCache.get_max_size(max_size)
+        os.makedirs(cache_dir, exist_ok=True)
+        entry_fnp = PMOCache._entry_fnp(cache_dir, header)
+        # written under a temporary name so other processes only ever see complete entries
+        tmp_entry_fnp = entry_fnp + "." + str(os.getpid()) + ".tmp"
+        try:
+            with open(tmp_entry_fnp, "wb") as f:
+                pickle.dump(header, f, protocol=PMOCache.pickle_protocol)
+                pickle.dump(pmo, f, protocol=PMOCache.pickle_protocol)
+            if os.path.getsize(tmp_entry_fnp) <= max_size:
+                os.replace(tmp_entry_fnp, entry_fnp)
+        finally:
+            PMOCache._remove(tmp_entry_fnp)
+        PMOCache.evict(cache_dir, max_size)
+
+    @staticmethod
+    def _remove(fnp: str) -> int:
+        """
+        Remove a file if it still exists, other processes can be using the same cache
+        :param fnp: the file
+        :return: the size of the file removed, 0 if it was already gone
+        """
+        try:
+            size = os.path.getsize(fnp)
+            os.remove(fnp)
+            return size
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def list_entries(cache_dir: str | os.PathLike[str] = None) -> list[dict]:
+        """
+        List the entries of the cache, only reading the header of each
+        :param cache_dir: the cache directory, see get_cache_dir
+        :return: a list of the entries, least recently used first, each a dict of the entry file, its size and last use and the header of its PMO file
+        """
+        cache_dir = PMOCache.get_cache_dir(cache_dir)
+        if cache_dir is None or not os.path.isdir(cache_dir):
+            return []
+        ret = []
+        for name in os.listdir(cache_dir):
+            if not name.endswith(PMOCache.entry_extension):
+                continue
+            entry_fnp = os.path.join(cache_dir, name)
+            try:
+                stat = os.stat(entry_fnp)
+                with open(entry_fnp, "rb") as f:
+                    header = pickle.load(f)
+            except FileNotFoundError:
+                continue
+            except (pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+                header = {}
+            ret.append(
+                {
+                    "entry": entry_fnp,
+                    "entry_size": stat.st_size,
+                    "last_used": time.strftime(
+                        "%Y-%m-%d %H:%M:%S", time.localtime(stat.st_mtime)
+                    ),
+                    "last_used_ns": stat.st_mtime_ns,
+                    **header,
+                }
+            )
+        return sorted(ret, key=lambda entry: entry["last_used_ns"])
+
+    @staticmethod
+    def evict(cache_dir: str | os.PathLike[str] = None, max_size: str | int = None):
+        """
+        Remove the least recently used entries until the cache is at most max_size
+        :param cache_dir: the cache directory, see get_cache_dir
+        :param max_size: the maximum total size of the cache, see get_max_size
+        :return: the number of entries removed and their total size
+        """
+        max_size = PMOCache.get_max_size(max_size)
+        entries = PMOCache.list_entries(cache_dir)
+        total_size = sum(entry["entry_size"] for entry in entries)
+        removed = 0
+        removed_size = 0
+        for entry in entries:
+            if total_size <= max_size:
+                break
+            total_size -= entry["entry_size"]
+            removed_size += PMOCache._remove(entry["entry"])
+            removed += 1
+        return removed, removed_size
+
+    @staticmethod
+    def clear(cache_dir: str | os.PathLike[str] = None):
+        """
+        Remove all the entries of the cache
+        :param cache_dir: the cache directory, see get_cache_dir
+        :return: the number of entries removed and their total size
+        """
+        return PMOCache.evict(cache_dir, 0)
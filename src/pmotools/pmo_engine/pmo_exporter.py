@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
 import copy
+from array import array
 import json
 import os
+import shutil
+import sys
+import tempfile
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import NamedTuple
+import numpy as np
 import pandas as pd
 
+from pmotools.pmo_engine.allele_matrix import AlleleMatrix
 from pmotools.pmo_engine.pmo_checker import PMOChecker
+from pmotools.pmo_engine.pmo_frame import PMOFrame
+from pmotools.pmo_engine.pmo_index import PMOIndex
 from pmotools.pmo_engine.pmo_processor import PMOProcessor
+from pmotools.utils.small_utils import Utils
 
 from pmotools import __version__ as __pmotools_version__
 
@@ -220,6 +230,120 @@ class PMOExporter(object):
             rows.append(export_row)
         return pd.DataFrame(rows)
 
+    # the tables of export_all_tables, each is built by export_<name>_table
+    meta_table_names = [
+        "specimen_meta",
+        "specimen_travel_meta",
+        "library_sample_meta",
+        "sequencing_info_meta",
+        "project_info_meta",
+        "panel_info_meta",
+        "target_info_meta",
+    ]
+
+    @staticmethod
+    def _check_meta_table_names(table_names: list[str]) -> list[str]:
+        """
+        Check the names of tables to export
+        :param table_names: the names, None for all of meta_table_names
+        :return: the names to export
+        """
+        if table_names is None:
+            return list(PMOExporter.meta_table_names)
+        unknown = [
+            name for name in table_names if name not in PMOExporter.meta_table_names
+        ]
+        if len(unknown) > 0:
+            raise Exception(
+                "Unknown tables: "
+                + ", ".join(unknown)
+                + ", options are "
+                + ", ".join(PMOExporter.meta_table_names)
+            )
+        return list(table_names)
+
+    @staticmethod
+    def export_all_tables(
+        pmodata, separator: str = ",", table_names: list[str] = None, threads: int = 1
+    ) -> dict[str, pd.DataFrame]:
+        """
+        Export several meta tables of a PMO at once, the same tables as the individual export_<name>_table functions
+        :param pmodata: the pmo export the information from
+        :param separator: the separator to use for list values
+        :param table_names: the tables to export, any of meta_table_names, defaults to all of them
+        :param threads: the number of threads to build the tables in
+        :return: key: table name, val: the table
+        """
+        table_names = PMOExporter._check_meta_table_names(table_names)
+
+        def export_table(name: str) -> pd.DataFrame:
+            return getattr(PMOExporter, "export_" + name + "_table")(pmodata, separator)
+
+        if threads <= 1:
+            return {name: export_table(name) for name in table_names}
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return dict(zip(table_names, executor.map(export_table, table_names)))
+
+    @staticmethod
+    def write_all_tables(
+        pmodata,
+        output_directory: str,
+        delim: str = "tab",
+        gzip: bool = False,
+        prefix: str = "",
+        overwrite: bool = False,
+        separator: str = ",",
+        table_names: list[str] = None,
+        threads: int = 1,
+    ) -> dict[str, str]:
+        """
+        Export several meta tables of a PMO at once and write each to OUTPUT_DIRECTORY/PREFIX + name + _table + extension, all with
+        the same delimiter and compression. With more than 1 thread the tables are built and written concurrently
+        :param pmodata: the pmo export the information from
+        :param output_directory: the directory to write to, created if it doesn't exist
+        :param delim: the delimiter of the output files, tab, comma or the actual delimiter, see Utils.process_delimiter_and_output_extension
+        :param gzip: whether to gzip the output files
+        :param prefix: a prefix for the output file names
+        :param overwrite: whether to overwrite output files if they exist
+        :param separator: the separator to use for list values
+        :param table_names: the tables to export, any of meta_table_names, defaults to all of them
+        :param threads: the number of threads to build and write the tables in
+        :return: key: table name, val: the file it was written to
+        """
+        table_names = PMOExporter._check_meta_table_names(table_names)
+        output_delim, output_extension = Utils.process_delimiter_and_output_extension(
+            delim, gzip=gzip
+        )
+        output_fnps = {
+            name: os.path.join(
+                output_directory, prefix + name + "_table" + output_extension
+            )
+            for name in table_names
+        }
+        # check all the outputs up front so nothing is written if any of them can't be
+        for fnp in output_fnps.values():
+            Utils.outputfile_check(fnp, overwrite)
+        os.makedirs(output_directory, exist_ok=True)
+
+        def export_and_write_table(name: str):
+            table = getattr(PMOExporter, "export_" + name + "_table")(
+                pmodata, separator
+            )
+            with Utils.smart_open_write(output_fnps[name]) as f:
+                table.to_csv(f, sep=output_delim, index=False)
+
+        if threads <= 1:
+            for name in table_names:
+                export_and_write_table(name)
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                for future in [
+                    executor.submit(export_and_write_table, name)
+                    for name in table_names
+                ]:
+                    future.result()
+        return output_fnps
+
     @staticmethod
     def write_bed_locs(bed_locs: list[bed_loc_tuple], fnp, add_header: bool = False):
         """
@@ -422,6 +546,7 @@ class PMOExporter(object):
             f"portable_microhaplotype_object_v{__pmotools_version__}.schema.json",
         ),
         validate_pmo: bool = False,
+        pmo_index: PMOIndex = None,
     ) -> pd.DataFrame:
         """
         Create a pd.Dataframe of sample, target and allele. Can optionally add on any other additional fields
@@ -434,6 +559,7 @@ class PMOExporter(object):
         :param default_base_col_names: The default column name for the sample, locus and allele
         :param jsonschema_fnp: path to the jsonschema schema file to validate the PMO against
         :param validate_pmo: whether to validate the PMO with a jsonschema
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: pandas dataframe
         """
 
@@ -443,6 +569,70 @@ class PMOExporter(object):
                 checker = PMOChecker(json.load(f))
                 checker.validate_pmo_json(pmodata)
 
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        PMOExporter._check_alleles_per_sample_table_fields(
+            pmodata,
+            additional_specimen_info_fields,
+            additional_library_sample_info_fields,
+            additional_representative_info_fields,
+            default_base_col_names,
+        )
+        # Check to see if at least 1 haplotype has this field
+        # samples without this meta field will have NA
+        if additional_microhap_fields is not None:
+            PMOExporter._check_detected_microhap_fields_with_data(
+                additional_microhap_fields,
+                {
+                    additional_microhap_field
+                    for additional_microhap_field in additional_microhap_fields
+                    if PMOExporter._detected_microhap_field_is_set(
+                        pmo_index.pmo_frame, additional_microhap_field
+                    )
+                },
+            )
+
+        pmo_frame = pmo_index.pmo_frame
+        if len(pmo_frame) == 0:
+            return pd.DataFrame()
+        build_table = PMOExporter._alleles_per_sample_table_builder(
+            pmodata,
+            pmo_index,
+            additional_specimen_info_fields,
+            additional_library_sample_info_fields,
+            additional_representative_info_fields,
+            default_base_col_names,
+        )
+        microhap_columns = {}
+        if additional_microhap_fields is not None:
+            for field in additional_microhap_fields:
+                microhap_columns[field] = PMOExporter._detected_microhap_field_values(
+                    pmo_frame, field
+                )
+        return build_table(
+            pmo_frame.bioinformatics_run_id,
+            pmo_frame.library_sample_id,
+            pmo_frame.mhaps_target_id,
+            pmo_frame.mhap_id,
+            microhap_columns,
+        )
+
+    @staticmethod
+    def _check_alleles_per_sample_table_fields(
+        pmodata,
+        additional_specimen_info_fields: list[str],
+        additional_library_sample_info_fields: list[str],
+        additional_representative_info_fields: list[str],
+        default_base_col_names: list[str],
+    ):
+        """
+        Check the fields requested for an alleles per sample table, each additional field has to be set for at least one record
+        :param pmodata: the PMO the table is for
+        :param additional_specimen_info_fields: the fields from specimen_info
+        :param additional_library_sample_info_fields: the fields from library_sample_info
+        :param additional_representative_info_fields: the fields from representative_microhaplotypes
+        :param default_base_col_names: the column names for the sample, locus and allele
+        :return: nothing, raises an exception if the fields aren't valid
+        """
         # Check to see if at least 1 sample has supplied meta field
         # samples without this meta field will have NA
         if additional_specimen_info_fields is not None:
@@ -485,28 +675,6 @@ class PMOExporter(object):
 
         # Check to see if at least 1 haplotype has this field
         # samples without this meta field will have NA
-        if additional_microhap_fields is not None:
-            # Find meta fields that have at least some data
-            additional_microhap_fields_with_data = {
-                additional_microhap_field
-                for additional_microhap_field in additional_microhap_fields
-                for detected_microhaplotypes in pmodata["detected_microhaplotypes"]
-                for library_samples_data in detected_microhaplotypes["library_samples"]
-                for target_data in library_samples_data["target_results"]
-                for microhap_data in target_data["mhaps"]
-                if additional_microhap_field in microhap_data
-            }
-            # Determine meta fields with no samples having data
-            additional_microhap_fields_with_no_samples = (
-                set(additional_microhap_fields) - additional_microhap_fields_with_data
-            )
-
-            if additional_microhap_fields_with_no_samples:
-                raise Exception(
-                    f"No detected_microhaplotypes have data for fields: {', '.join(additional_microhap_fields_with_no_samples)}"
-                )
-        # Check to see if at least 1 haplotype has this field
-        # samples without this meta field will have NA
         if additional_representative_info_fields is not None:
             # Find meta fields that have at least some data
             additional_microhap_fields_with_data = {
@@ -534,69 +702,462 @@ class PMOExporter(object):
                 )
             )
 
-        rows = []
+    @staticmethod
+    def _alleles_per_sample_table_builder(
+        pmodata,
+        pmo_index: PMOIndex,
+        additional_specimen_info_fields: list[str],
+        additional_library_sample_info_fields: list[str],
+        additional_representative_info_fields: list[str],
+        default_base_col_names: list[str],
+        object_columns: bool = False,
+    ):
+        """
+        Set up the look-ups of the metadata columns of an alleles per sample table, so the table of any set of detected microhaplotypes
+        (e.g. a chunk of them) is built column-wise by indexing with their ids rather than one dict per row
+        :param pmodata: the PMO the table is for
+        :param pmo_index: the PMOIndex of pmodata
+        :param additional_specimen_info_fields: the fields from specimen_info
+        :param additional_library_sample_info_fields: the fields from library_sample_info
+        :param additional_representative_info_fields: the fields from representative_microhaplotypes
+        :param default_base_col_names: the column names for the sample, locus and allele
+        :param object_columns: if True, every column is kept as the values as they are in the PMO rather than pandas inferring a type
+        from the values in the table, so tables built from different chunks are written the same way
+        :return: a function taking the bioinformatics_run_id, library_sample_id, mhaps_target_id and mhap_id arrays of the rows and
+        a dict of any microhaplotype field columns and returning the table
+        """
+
+        def lookup(values: list) -> np.ndarray:
+            # held in an object array so values such as lists are taken as is
+            ret = np.empty(len(values), dtype=object)
+            for pos, value in enumerate(values):
+                ret[pos] = value
+            return ret
+
         specimen_info = pmodata["specimen_info"]
-        target_info = pmodata["target_info"]
         library_sample_info = pmodata["library_sample_info"]
-        detected_microhaps = pmodata["detected_microhaplotypes"]
         rep_haps = pmodata["representative_microhaplotypes"]["targets"]
-        bioinformatics_run_names = PMOProcessor.get_bioinformatics_run_names(pmodata)
-        for bio_run_for_detected_microhaps in detected_microhaps:
-            bioinformatics_run_id = bio_run_for_detected_microhaps[
-                "bioinformatics_run_id"
-            ]
-            for sample_data in bio_run_for_detected_microhaps["library_samples"]:
+        bioinformatics_run_names = lookup(pmo_index.bioinformatics_run_names)
+        library_sample_names = lookup(
+            [library["library_sample_name"] for library in library_sample_info]
+        )
+        target_names = lookup(pmo_index.representative_target_names)
+        library_fields = {
+            field: lookup([library.get(field, "NA") for library in library_sample_info])
+            for field in (additional_library_sample_info_fields or [])
+        }
+        library_specimen_ids = np.array(
+            pmo_index.library_sample_specimen_ids, dtype=np.int64
+        )
+        specimen_fields = {
+            field: lookup([specimen.get(field, "NA") for specimen in specimen_info])
+            for field in (additional_specimen_info_fields or [])
+        }
+        # the representative microhaplotypes flattened, each row's is at target_mhap_starts[mhaps_target_id] + mhap_id
+        target_mhap_starts = np.cumsum(
+            [0] + [len(target["microhaplotypes"]) for target in rep_haps]
+        )
+        rep_hap_fields = {
+            field: lookup(
+                [
+                    rep_hap.get(field, "NA")
+                    for target in rep_haps
+                    for rep_hap in target["microhaplotypes"]
+                ]
+            )
+            for field in (additional_representative_info_fields or [])
+        }
+
+        def build_table(
+            bioinformatics_run_ids: np.ndarray,
+            library_sample_ids: np.ndarray,
+            mhaps_target_ids: np.ndarray,
+            mhap_ids: np.ndarray,
+            microhap_columns: dict[str, list],
+        ) -> pd.DataFrame:
+            # lists of Python values so pandas infers the same dtypes as it would for a list of row dicts
+            columns = {
+                "bioinformatics_run_name": bioinformatics_run_names[
+                    bioinformatics_run_ids
+                ].tolist(),
+                default_base_col_names[0]: library_sample_names[
+                    library_sample_ids
+                ].tolist(),
+                default_base_col_names[1]: target_names[mhaps_target_ids].tolist(),
+                default_base_col_names[2]: mhap_ids,
+            }
+            for field, values in library_fields.items():
+                columns[field] = values[library_sample_ids].tolist()
+            specimen_ids = library_specimen_ids[library_sample_ids]
+            for field, values in specimen_fields.items():
+                columns[field] = values[specimen_ids].tolist()
+            for field, values in microhap_columns.items():
+                columns[field] = values
+            rep_hap_positions = target_mhap_starts[mhaps_target_ids] + mhap_ids
+            for field, values in rep_hap_fields.items():
+                columns[field] = values[rep_hap_positions].tolist()
+            return pd.DataFrame(columns, dtype=object if object_columns else None)
+
+        return build_table
+
+    @staticmethod
+    def _iter_detected_microhap_chunks(
+        detected_microhaplotypes,
+        chunk_size: int,
+        microhap_fields: list[str],
+        microhap_fields_seen: set[str],
+    ):
+        """
+        Walk detected_microhaplotypes, yielding the ids of chunk_size detected microhaplotypes at a time
+        :param detected_microhaplotypes: the detected_microhaplotypes of a PMO, can be a StreamedPMOSection of a lazily read PMO
+        :param chunk_size: the number of detected microhaplotypes per chunk, the last chunk can be smaller
+        :param microhap_fields: the fields of the microhaplotypes to collect, NA where not set
+        :param microhap_fields_seen: the microhap_fields that are set for at least one microhaplotype are added to this
+        :return: a generator of (bioinformatics_run_ids, library_sample_ids, mhaps_target_ids, mhap_ids, dict of the microhap_fields values)
+        """
+        bioinformatics_run_ids = array("q")
+        library_sample_ids = array("q")
+        mhaps_target_ids = array("q")
+        mhap_ids = array("q")
+        microhap_columns = {field: [] for field in microhap_fields}
+
+        def chunk():
+            return (
+                np.frombuffer(bioinformatics_run_ids, dtype=np.int64).copy(),
+                np.frombuffer(library_sample_ids, dtype=np.int64).copy(),
+                np.frombuffer(mhaps_target_ids, dtype=np.int64).copy(),
+                np.frombuffer(mhap_ids, dtype=np.int64).copy(),
+                {field: list(values) for field, values in microhap_columns.items()},
+            )
+
+        for block in detected_microhaplotypes:
+            bioinformatics_run_id = block["bioinformatics_run_id"]
+            for sample_data in block["library_samples"]:
                 library_sample_id = sample_data["library_sample_id"]
-                specimen_id = library_sample_info[library_sample_id]["specimen_id"]
-                library_meta = library_sample_info[library_sample_id]
-                specimen_meta = specimen_info[specimen_id]
                 for target_data in sample_data["target_results"]:
-                    target_name = target_info[
-                        rep_haps[target_data["mhaps_target_id"]]["target_id"]
-                    ]["target_name"]
+                    mhaps_target_id = target_data["mhaps_target_id"]
                     for microhap_data in target_data["mhaps"]:
-                        allele_id = microhap_data["mhap_id"]
-                        # print(rep_haps[target_data["mhaps_target_id"]])
-                        rep_hap_meta = rep_haps[target_data["mhaps_target_id"]][
-                            "microhaplotypes"
-                        ][allele_id]
-                        row = {
-                            "bioinformatics_run_name": bioinformatics_run_names[
-                                bioinformatics_run_id
-                            ],
-                            default_base_col_names[0]: library_meta[
-                                "library_sample_name"
+                        bioinformatics_run_ids.append(bioinformatics_run_id)
+                        library_sample_ids.append(library_sample_id)
+                        mhaps_target_ids.append(mhaps_target_id)
+                        mhap_ids.append(microhap_data["mhap_id"])
+                        for field, values in microhap_columns.items():
+                            if field in microhap_data:
+                                microhap_fields_seen.add(field)
+                            values.append(microhap_data.get(field, "NA"))
+                        if len(mhap_ids) == chunk_size:
+                            yield chunk()
+                            for ids in [
+                                bioinformatics_run_ids,
+                                library_sample_ids,
+                                mhaps_target_ids,
+                                mhap_ids,
+                            ]:
+                                del ids[:]
+                            for values in microhap_columns.values():
+                                values.clear()
+        if len(mhap_ids) > 0:
+            yield chunk()
+
+    @staticmethod
+    def write_alleles_per_sample_table(
+        pmodata,
+        output_fnp: str,
+        sep: str = "\t",
+        additional_specimen_info_fields: list[str] = None,
+        additional_library_sample_info_fields: list[str] = None,
+        additional_microhap_fields: list[str] = None,
+        additional_representative_info_fields: list[str] = None,
+        default_base_col_names: list[str] = [
+            "library_sample_name",
+            "target_name",
+            "mhap_id",
+        ],
+        allele_freqs_fnp: str = None,
+        allele_freqs_group_by_fields: list[str] = None,
+        chunk_size: int = 100000,
+        pmo_index: PMOIndex = None,
+    ):
+        """
+        Write the table of extract_alleles_per_sample_table to a delimited file in one walk over detected_microhaplotypes, chunk_size rows
+        at a time, so only a chunk of the table is in memory at once and with a lazily read PMO (PMOStreamReader.read_in_pmo_lazily)
+        the memory used doesn't grow with the number of detected microhaplotypes. The allele frequencies of
+        PMOProcessor.extract_allele_counts_freq_from_pmo can be counted in the same walk, only holding a count per distinct allele.
+
+        The values are written as they are in the PMO rather than with a type inferred per chunk, so a field mixing integers with
+        nulls or decimals is written as e.g. 1 rather than 1.0. With a lazily read PMO, additional_microhap_fields set for no
+        microhaplotype are only found by the end of the walk, so the table is written to a temporary file first and only moved to
+        output_fnp once the fields are checked
+
+        :param pmodata: the PMO to write from, can be a lazily read PMO
+        :param output_fnp: the output file, STDOUT for standard out, gzipped if it ends with .gz
+        :param sep: the delimiter of the output
+        :param additional_specimen_info_fields: any additional fields to write from the specimen_info object
+        :param additional_library_sample_info_fields: any additional fields to write from the library_samples object
+        :param additional_microhap_fields: any additional fields to write from the microhap object
+        :param additional_representative_info_fields: any additional fields to write from the representative_microhaplotype_sequences object
+        :param default_base_col_names: The default column name for the sample, locus and allele
+        :param allele_freqs_fnp: if given, also write the allele counts and frequencies per bioinformatics run to this file
+        :param allele_freqs_group_by_fields: compute the allele frequencies within each group of these fields, see PMOProcessor.extract_allele_counts_freq_from_pmo
+        :param chunk_size: the number of rows to build and write at a time
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :return: nothing
+        """
+        if chunk_size < 1:
+            raise Exception("chunk_size must be at least 1, not " + str(chunk_size))
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        PMOExporter._check_alleles_per_sample_table_fields(
+            pmodata,
+            additional_specimen_info_fields,
+            additional_library_sample_info_fields,
+            additional_representative_info_fields,
+            default_base_col_names,
+        )
+        microhap_fields = (
+            [] if additional_microhap_fields is None else additional_microhap_fields
+        )
+        # in memory the microhaplotype fields are checked before anything is written, a lazily read PMO is only checked by the end of the walk
+        check_fields_up_front = isinstance(pmodata["detected_microhaplotypes"], list)
+        if check_fields_up_front and len(microhap_fields) > 0:
+            PMOExporter._check_detected_microhap_fields_with_data(
+                microhap_fields,
+                {
+                    field
+                    for field in microhap_fields
+                    if PMOExporter._detected_microhap_field_is_set(
+                        pmo_index.pmo_frame, field
+                    )
+                },
+            )
+        build_table = PMOExporter._alleles_per_sample_table_builder(
+            pmodata,
+            pmo_index,
+            additional_specimen_info_fields,
+            additional_library_sample_info_fields,
+            additional_representative_info_fields,
+            default_base_col_names,
+            object_columns=True,
+        )
+        microhap_fields_seen = set()
+
+        # the codes of the allele frequency key columns, sorted so the counted keys come out in the same order as extract_allele_counts_freq_from_pmo
+        group_by_fields = (
+            []
+            if allele_freqs_group_by_fields is None
+            else list(allele_freqs_group_by_fields)
+        )
+        group_codes = {}
+        for field in group_by_fields:
+            group_codes[field] = pd.factorize(
+                pd.Series(
+                    PMOProcessor.get_library_sample_field_values(
+                        pmodata, field, pmo_index=pmo_index
+                    ),
+                    dtype=object,
+                ),
+                sort=True,
+            )
+        target_codes, target_values = pd.factorize(
+            pd.Series(pmo_index.representative_target_names, dtype=object), sort=True
+        )
+        allele_counts = defaultdict(int)
+
+        def write_table(table_fnp: str):
+            with Utils.smart_open_write(table_fnp) as out:
+                wrote_header = False
+                for (
+                    bioinformatics_run_ids,
+                    library_sample_ids,
+                    mhaps_target_ids,
+                    mhap_ids,
+                    microhap_columns,
+                ) in PMOExporter._iter_detected_microhap_chunks(
+                    pmodata["detected_microhaplotypes"],
+                    chunk_size,
+                    microhap_fields,
+                    microhap_fields_seen,
+                ):
+                    build_table(
+                        bioinformatics_run_ids,
+                        library_sample_ids,
+                        mhaps_target_ids,
+                        mhap_ids,
+                        microhap_columns,
+                    ).to_csv(out, sep=sep, index=False, header=not wrote_header)
+                    wrote_header = True
+                    if allele_freqs_fnp is not None:
+                        keys = np.stack(
+                            [
+                                codes[library_sample_ids]
+                                for codes, _ in group_codes.values()
+                            ]
+                            + [
+                                bioinformatics_run_ids,
+                                target_codes[mhaps_target_ids],
+                                mhap_ids,
                             ],
-                            default_base_col_names[1]: target_name,
-                            default_base_col_names[2]: allele_id,
-                        }
-                        if additional_library_sample_info_fields is not None:
-                            for field in additional_library_sample_info_fields:
-                                row[field] = library_meta.get(field, "NA")
-                        if additional_specimen_info_fields is not None:
-                            for field in additional_specimen_info_fields:
-                                row[field] = specimen_meta.get(field, "NA")
-                        if additional_microhap_fields is not None:
-                            for field in additional_microhap_fields:
-                                row[field] = microhap_data.get(field, "NA")
-                        if additional_representative_info_fields is not None:
-                            for field in additional_representative_info_fields:
-                                row[field] = rep_hap_meta.get(field, "NA")
-                        rows.append(row)
-        # Build and return DataFrame
-        return pd.DataFrame(rows)
+                            axis=1,
+                        )
+                        chunk_keys, chunk_counts = np.unique(
+                            keys, axis=0, return_counts=True
+                        )
+                        for key, count in zip(
+                            map(tuple, chunk_keys.tolist()), chunk_counts.tolist()
+                        ):
+                            allele_counts[key] += count
+                if not wrote_header:
+                    pd.DataFrame().to_csv(out, sep=sep, index=False)
+
+        if check_fields_up_front or len(microhap_fields) == 0:
+            write_table(output_fnp)
+        else:
+            if "STDOUT" == output_fnp:
+                table_fd, table_fnp = tempfile.mkstemp(suffix=".tmp")
+                os.close(table_fd)
+            else:
+                # next to the output so it can be moved into place, ending the same so it's gzipped the same
+                table_fnp = (
+                    output_fnp
+                    + "."
+                    + str(os.getpid())
+                    + ".tmp"
+                    + (".gz" if output_fnp.endswith(".gz") else "")
+                )
+            try:
+                write_table(table_fnp)
+                PMOExporter._check_detected_microhap_fields_with_data(
+                    microhap_fields, microhap_fields_seen
+                )
+                if "STDOUT" == output_fnp:
+                    with Utils.smart_open_read_by_ext(table_fnp) as f:
+                        shutil.copyfileobj(f, sys.stdout)
+                else:
+                    os.replace(table_fnp, output_fnp)
+            finally:
+                if os.path.exists(table_fnp):
+                    os.remove(table_fnp)
+
+        if allele_freqs_fnp is not None:
+            keys = np.array(list(allele_counts.keys()), dtype=np.int64).reshape(
+                -1, len(group_codes) + 3
+            )
+            key_columns = {
+                field: (keys[:, pos], values)
+                for pos, (field, (_, values)) in enumerate(group_codes.items())
+            }
+            run_values, run_codes = np.unique(keys[:, -3], return_inverse=True)
+            key_columns["bioinformatics_run_id"] = (run_codes, run_values)
+            key_columns["target_name"] = (keys[:, -2], target_values)
+            allele_freqs = PMOProcessor._allele_counts_freq_table(
+                key_columns,
+                keys[:, -1],
+                np.array(list(allele_counts.values()), dtype=np.int64),
+                group_by_fields=group_by_fields,
+            )
+            with Utils.smart_open_write(allele_freqs_fnp) as out:
+                allele_freqs.to_csv(out, sep=sep, index=False)
+
+    @staticmethod
+    def _check_detected_microhap_fields_with_data(
+        microhap_fields: list[str], microhap_fields_with_data: set[str]
+    ):
+        """
+        Check that each of the requested detected microhaplotype fields is set for at least one detected microhaplotype
+        :param microhap_fields: the requested fields
+        :param microhap_fields_with_data: the fields set for at least one detected microhaplotype
+        :return: nothing, raises an exception listing the fields without any data
+        """
+        fields_with_no_data = set(microhap_fields) - microhap_fields_with_data
+        if fields_with_no_data:
+            raise Exception(
+                f"No detected_microhaplotypes have data for fields: {', '.join(fields_with_no_data)}"
+            )
+
+    @staticmethod
+    def _detected_microhap_field_is_set(pmo_frame: PMOFrame, field: str) -> bool:
+        """
+        Check whether any detected microhaplotype has a field
+        :param pmo_frame: the PMOFrame of the detected microhaplotypes
+        :param field: the field of the microhaplotypes
+        :return: True if at least one detected microhaplotype has the field
+        """
+        if field in ["mhap_id", "reads"]:
+            return len(pmo_frame) > 0
+        if field == "umis" and np.any(pmo_frame.umis != -1):
+            return True
+        return any(field in extra for extra in pmo_frame.extra_fields["mhaps"].values())
+
+    @staticmethod
+    def _detected_microhap_field_values(pmo_frame: PMOFrame, field: str) -> list:
+        """
+        Get the value of a field of every detected microhaplotype from the columnar view, NA where it isn't set
+        :param pmo_frame: the PMOFrame of the detected microhaplotypes
+        :param field: the field of the microhaplotypes
+        :return: a list of the value of each row
+        """
+        mhap_extra = pmo_frame.extra_fields["mhaps"]
+        if field in ["mhap_id", "reads"]:
+            return getattr(pmo_frame, field).tolist()
+        if field == "umis":
+            ret = pmo_frame.umis.tolist()
+            for row in np.flatnonzero(pmo_frame.umis == -1).tolist():
+                # explicit nulls are kept in the extra fields
+                ret[row] = mhap_extra.get(row, {}).get("umis", "NA")
+            return ret
+        ret = ["NA"] * len(pmo_frame)
+        for row, extra in mhap_extra.items():
+            if field in extra:
+                ret[row] = extra[field]
+        return ret
+
+    @staticmethod
+    def export_allele_matrix(
+        pmodata,
+        value: str = "reads",
+        bioinformatics_run_ids: list[int] = None,
+        pmo_index: PMOIndex = None,
+    ) -> AlleleMatrix:
+        """
+        Build a sparse library sample x allele matrix straight from the columnar PMOFrame of detected_microhaplotypes, without building a long table to pivot.
+        There is a row for every library sample in library_sample_info and a column for every detected (target, mhap_id), columns are in the order of
+        representative_microhaplotypes and then mhap_id. A library sample detected in more than one bioinformatics run has its reads summed
+
+        :param pmodata: the PMO to export from
+        :param value: the value of each cell, either reads or presence (1 if detected)
+        :param bioinformatics_run_ids: optional list of bioinformatics_run_ids to include
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :return: the sparse matrix
+        """
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        pmo_frame = PMOProcessor.get_pmo_frame(pmodata, pmo_index)
+        passing = slice(None)
+        if bioinformatics_run_ids is not None:
+            passing = np.isin(
+                pmo_frame.bioinformatics_run_id, list(bioinformatics_run_ids)
+            )
+        return AlleleMatrix.from_columns(
+            pmo_frame.library_sample_id[passing],
+            pmo_frame.mhaps_target_id[passing],
+            pmo_frame.mhap_id[passing],
+            pmo_frame.reads[passing],
+            pmo_index.library_sample_names,
+            pmo_index.representative_target_names,
+            value,
+        )
 
     @staticmethod
     def list_library_sample_names_per_specimen_name(
         pmodata,
         select_specimen_ids: list[int] = None,
         select_specimen_names: list[str] = None,
+        pmo_index: PMOIndex = None,
     ) -> pd.DataFrame:
         """
         List all the library_sample_names per specimen_name
         :param pmodata: the PMO
         :param select_specimen_ids: a list of specimen_ids to select, if None, all specimen_ids are used
         :param select_specimen_names: a list of specimen_names to select, if None, all specimen_names are used
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a pandas dataframe with 3 columns, specimen_id, library_sample_id, and library_sample_id_count(the number of library_sample_ids per specimen_id)
         """
         if select_specimen_ids is not None and select_specimen_names is not None:
@@ -606,7 +1167,7 @@ class PMOExporter(object):
         lib_samples_per_spec = defaultdict(list[str])
         if select_specimen_names is not None:
             select_specimen_ids = PMOProcessor.get_index_of_specimen_names(
-                pmodata, select_specimen_names
+                pmodata, select_specimen_names, pmo_index
             )
         for lib_sample in pmodata["library_sample_info"]:
             if (
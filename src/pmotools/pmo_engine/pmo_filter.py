@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+from dataclasses import dataclass
+
+
+@dataclass
+class PMOFilterSpec:
+    """
+    The selections to apply to a PMO with PMOProcessor.filter_pmo, which applies all of them in one pass over the PMO.
+    Selections left as None (or 0 for the thresholds) are not applied. The library sample selections (specimen_names,
+    library_sample_names and meta_fields_values) are combined, so only library samples passing all of them are kept.
+    """
+
+    # keep only the library samples of these specimens
+    specimen_names: set[str] = None
+    # keep only these library samples
+    library_sample_names: set[str] = None
+    # keep only these targets
+    target_names: set[str] = None
+    # keep only the library samples of specimens with these meta values, same format as PMOProcessor.extract_from_pmo_samples_with_meta_groupings
+    meta_fields_values: str = None
+    # keep only microhaplotypes with at least this many reads
+    min_reads: float = 0.0
+    # keep only microhaplotypes with at least this fraction of the reads of their target within their library sample
+    min_within_target_freq: float = 0.0
+
+    def filters_microhaplotypes(self) -> bool:
+        """
+        Whether the spec filters out individual microhaplotypes
+        :return: True if min_reads or min_within_target_freq is set
+        """
+        return self.min_reads > 0 or self.min_within_target_freq > 0
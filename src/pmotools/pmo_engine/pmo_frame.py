@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+from array import array
+from functools import cached_property
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+_get_reads = itemgetter("reads")
+_get_mhaps_target_id = itemgetter("mhaps_target_id")
+
+
+class TargetResultsFrame:
+    """
+    A columnar view of the detected_microhaplotypes of a PMO down to the target results, with the total reads of each target result
+    rather than a row per detected microhaplotype. Enough for per target counts and much cheaper to build than a PMOFrame
+    as the microhaplotypes' reads are summed without being stored.
+    """
+
+    def __init__(
+        self,
+        block_bioinformatics_run_ids: np.ndarray,
+        block_sample_offsets: np.ndarray,
+        sample_library_sample_ids: np.ndarray,
+        sample_target_offsets: np.ndarray,
+        target_mhaps_target_ids: np.ndarray,
+        target_reads: np.ndarray = None,
+    ):
+        """
+        :param block_bioinformatics_run_ids: the bioinformatics_run_id of each block of detected_microhaplotypes
+        :param block_sample_offsets: the start of each block's library samples, with the total number of library samples appended
+        :param sample_library_sample_ids: the library_sample_id of each library sample
+        :param sample_target_offsets: the start of each library sample's target results, with the total number of target results appended
+        :param target_mhaps_target_ids: the mhaps_target_id of each target result
+        :param target_reads: the total reads of each target result, can be left out by subclasses that compute it
+        """
+        self.block_bioinformatics_run_ids = block_bioinformatics_run_ids
+        self.block_sample_offsets = block_sample_offsets
+        self.sample_library_sample_ids = sample_library_sample_ids
+        self.sample_target_offsets = sample_target_offsets
+        self.target_mhaps_target_ids = target_mhaps_target_ids
+        if target_reads is not None:
+            self.target_reads = target_reads
+
+    @staticmethod
+    def from_detected_microhaplotypes(detected_microhaplotypes) -> "TargetResultsFrame":
+        """
+        Build the view in one pass over detected_microhaplotypes
+        :param detected_microhaplotypes: the detected_microhaplotypes of a PMO, can also be a StreamedPMOSection of a lazily read PMO
+        :return: the TargetResultsFrame
+        """
+        block_bioinformatics_run_ids = array("q")
+        block_sample_offsets = array("q", [0])
+        sample_library_sample_ids = array("q")
+        sample_target_offsets = array("q", [0])
+        target_mhaps_target_ids = array("q")
+        target_reads = array("q")
+        for block in detected_microhaplotypes:
+            block_bioinformatics_run_ids.append(block["bioinformatics_run_id"])
+            for library_sample in block["library_samples"]:
+                sample_library_sample_ids.append(library_sample["library_sample_id"])
+                target_results = library_sample["target_results"]
+                target_mhaps_target_ids.extend(
+                    map(_get_mhaps_target_id, target_results)
+                )
+                target_reads.extend(
+                    [
+                        sum(map(_get_reads, target_result["mhaps"]))
+                        for target_result in target_results
+                    ]
+                )
+                sample_target_offsets.append(len(target_mhaps_target_ids))
+            block_sample_offsets.append(len(sample_library_sample_ids))
+        return TargetResultsFrame(
+            np.frombuffer(block_bioinformatics_run_ids, dtype=np.int64),
+            np.frombuffer(block_sample_offsets, dtype=np.int64),
+            np.frombuffer(sample_library_sample_ids, dtype=np.int64),
+            np.frombuffer(sample_target_offsets, dtype=np.int64),
+            np.frombuffer(target_mhaps_target_ids, dtype=np.int64),
+            np.frombuffer(target_reads, dtype=np.int64),
+        )
+
+    @property
+    def block_count(self) -> int:
+        """
+        The number of bioinformatics run blocks
+        """
+        return len(self.block_bioinformatics_run_ids)
+
+    @property
+    def sample_count(self) -> int:
+        """
+        The number of library sample entries across all blocks
+        """
+        return len(self.sample_library_sample_ids)
+
+    @property
+    def target_count(self) -> int:
+        """
+        The number of target results across all library samples
+        """
+        return len(self.target_mhaps_target_ids)
+
+    @cached_property
+    def sample_block_index(self) -> np.ndarray:
+        """
+        The block index of each library sample entry
+        """
+        return np.repeat(
+            np.arange(self.block_count), np.diff(self.block_sample_offsets)
+        )
+
+    @cached_property
+    def target_sample_index(self) -> np.ndarray:
+        """
+        The library sample entry index of each target result
+        """
+        return np.repeat(
+            np.arange(self.sample_count), np.diff(self.sample_target_offsets)
+        )
+
+    @cached_property
+    def target_bioinformatics_run_ids(self) -> np.ndarray:
+        """
+        The bioinformatics_run_id of each target result
+        """
+        return self.block_bioinformatics_run_ids[
+            self.sample_block_index[self.target_sample_index]
+        ]
+
+    @cached_property
+    def target_library_sample_ids(self) -> np.ndarray:
+        """
+        The library_sample_id of each target result
+        """
+        return self.sample_library_sample_ids[self.target_sample_index]
+
+
+class PMOFrame(TargetResultsFrame):
+    """
+    A columnar view of the detected_microhaplotypes of a PMO with one row per detected microhaplotype.
+    The per row data is held in contiguous NumPy arrays (mhap_id, reads, umis) along with the offsets of where each
+    bioinformatics run block, library sample and target result start, so the nested form can be rebuilt exactly.
+    The per row bioinformatics_run_id, library_sample_id and mhaps_target_id columns are expanded from the offsets when first used.
+    """
+
+    # the keys of each level of detected_microhaplotypes held in the arrays, any other keys are kept in extra_fields
+    block_keys = {"bioinformatics_run_id", "library_samples"}
+    sample_keys = {"library_sample_id", "target_results"}
+    target_keys = {"mhaps_target_id", "mhaps"}
+    mhap_keys = {"mhap_id", "reads", "umis"}
+
+    def __init__(
+        self,
+        block_bioinformatics_run_ids: np.ndarray,
+        block_sample_offsets: np.ndarray,
+        sample_library_sample_ids: np.ndarray,
+        sample_target_offsets: np.ndarray,
+        target_mhaps_target_ids: np.ndarray,
+        target_mhap_offsets: np.ndarray,
+        mhap_id: np.ndarray,
+        reads: np.ndarray,
+        umis: np.ndarray,
+        extra_fields: dict[str, dict[int, dict]] = None,
+    ):
+        """
+        :param block_bioinformatics_run_ids: the bioinformatics_run_id of each block of detected_microhaplotypes
+        :param block_sample_offsets: the start of each block's library samples, with the total number of library samples appended
+        :param sample_library_sample_ids: the library_sample_id of each library sample
+        :param sample_target_offsets: the start of each library sample's target results, with the total number of target results appended
+        :param target_mhaps_target_ids: the mhaps_target_id of each target result
+        :param target_mhap_offsets: the start of each target result's microhaplotypes, with the total number of microhaplotypes appended
+        :param mhap_id: the mhap_id of each detected microhaplotype
+        :param reads: the reads of each detected microhaplotype
+        :param umis: the umis of each detected microhaplotype, -1 if not given
+        :param extra_fields: any other fields, key1: level (blocks, samples, targets or mhaps), key2: position in that level, val: the fields
+        """
+        super().__init__(
+            block_bioinformatics_run_ids,
+            block_sample_offsets,
+            sample_library_sample_ids,
+            sample_target_offsets,
+            target_mhaps_target_ids,
+        )
+        self.target_mhap_offsets = target_mhap_offsets
+        self.mhap_id = mhap_id
+        self.reads = reads
+        self.umis = umis
+        self.extra_fields = (
+            extra_fields
+            if extra_fields is not None
+            else {"blocks": {}, "samples": {}, "targets": {}, "mhaps": {}}
+        )
+
+    @staticmethod
+    def _extra_fields(record: dict, keys: set[str]) -> dict:
+        """
+        Get the fields of a record that aren't held in the arrays
+        :param record: the record
+        :param keys: the keys held in the arrays
+        :return: the other fields, empty if there are none
+        """
+        if len(record) <= len(keys) and keys.issuperset(record):
+            return {}
+        return {key: value for key, value in record.items() if key not in keys}
+
+    @staticmethod
+    def from_detected_microhaplotypes(detected_microhaplotypes) -> "PMOFrame":
+        """
+        Build the columnar view in one pass over detected_microhaplotypes
+        :param detected_microhaplotypes: the detected_microhaplotypes of a PMO, can also be a StreamedPMOSection of a lazily read PMO
+        :return: the PMOFrame
+        """
+        block_bioinformatics_run_ids = array("q")
+        block_sample_offsets = array("q", [0])
+        sample_library_sample_ids = array("q")
+        sample_target_offsets = array("q", [0])
+        target_mhaps_target_ids = array("q")
+        target_mhap_offsets = array("q", [0])
+        mhap_ids = array("q")
+        reads = array("q")
+        umis = array("q")
+        extra_fields = {"blocks": {}, "samples": {}, "targets": {}, "mhaps": {}}
+        for block in detected_microhaplotypes:
+            block_extra = PMOFrame._extra_fields(block, PMOFrame.block_keys)
+            if block_extra:
+                extra_fields["blocks"][len(block_bioinformatics_run_ids)] = block_extra
+            block_bioinformatics_run_ids.append(block["bioinformatics_run_id"])
+            for library_sample in block["library_samples"]:
+                sample_extra = PMOFrame._extra_fields(
+                    library_sample, PMOFrame.sample_keys
+                )
+                if sample_extra:
+                    extra_fields["samples"][
+                        len(sample_library_sample_ids)
+                    ] = sample_extra
+                sample_library_sample_ids.append(library_sample["library_sample_id"])
+                for target_result in library_sample["target_results"]:
+                    target_extra = PMOFrame._extra_fields(
+                        target_result, PMOFrame.target_keys
+                    )
+                    if target_extra:
+                        extra_fields["targets"][
+                            len(target_mhaps_target_ids)
+                        ] = target_extra
+                    target_mhaps_target_ids.append(target_result["mhaps_target_id"])
+                    for mhap in target_result["mhaps"]:
+                        mhap_ids.append(mhap["mhap_id"])
+                        reads.append(mhap["reads"])
+                        if len(mhap) == 2:
+                            umis.append(-1)
+                            continue
+                        mhap_extra = PMOFrame._extra_fields(mhap, PMOFrame.mhap_keys)
+                        umi_count = mhap.get("umis")
+                        if umi_count is None:
+                            if "umis" in mhap:
+                                # keep explicit nulls so they round trip
+                                mhap_extra["umis"] = None
+                            umi_count = -1
+                        if mhap_extra:
+                            extra_fields["mhaps"][len(mhap_ids) - 1] = mhap_extra
+                        umis.append(umi_count)
+                    target_mhap_offsets.append(len(mhap_ids))
+                sample_target_offsets.append(len(target_mhaps_target_ids))
+            block_sample_offsets.append(len(sample_library_sample_ids))
+        return PMOFrame(
+            np.frombuffer(block_bioinformatics_run_ids, dtype=np.int64),
+            np.frombuffer(block_sample_offsets, dtype=np.int64),
+            np.frombuffer(sample_library_sample_ids, dtype=np.int64),
+            np.frombuffer(sample_target_offsets, dtype=np.int64),
+            np.frombuffer(target_mhaps_target_ids, dtype=np.int64),
+            np.frombuffer(target_mhap_offsets, dtype=np.int64),
+            np.frombuffer(mhap_ids, dtype=np.int64),
+            np.frombuffer(reads, dtype=np.int64),
+            np.frombuffer(umis, dtype=np.int64),
+            extra_fields,
+        )
+
+    @staticmethod
+    def from_pmo(pmodata) -> "PMOFrame":
+        """
+        Build the columnar view of the detected_microhaplotypes of a PMO
+        :param pmodata: the loaded PMO, can be a lazily read PMO
+        :return: the PMOFrame
+        """
+        return PMOFrame.from_detected_microhaplotypes(
+            pmodata["detected_microhaplotypes"]
+        )
+
+    def __len__(self) -> int:
+        return len(self.mhap_id)
+
+    @cached_property
+    def mhap_target_index(self) -> np.ndarray:
+        """
+        The target result index of each row
+        """
+        return np.repeat(
+            np.arange(self.target_count), np.diff(self.target_mhap_offsets)
+        )
+
+    @cached_property
+    def bioinformatics_run_id(self) -> np.ndarray:
+        """
+        The bioinformatics_run_id of each row
+        """
+        return self.target_bioinformatics_run_ids[self.mhap_target_index]
+
+    @cached_property
+    def library_sample_id(self) -> np.ndarray:
+        """
+        The library_sample_id of each row
+        """
+        return self.target_library_sample_ids[self.mhap_target_index]
+
+    @cached_property
+    def mhaps_target_id(self) -> np.ndarray:
+        """
+        The mhaps_target_id of each row
+        """
+        return self.target_mhaps_target_ids[self.mhap_target_index]
+
+    @cached_property
+    def target_reads(self) -> np.ndarray:
+        """
+        The total reads of each target result, summed over its microhaplotypes
+        """
+        cumulative_reads = np.concatenate(
+            (np.zeros(1, dtype=self.reads.dtype), np.cumsum(self.reads))
+        )
+        return (
+            cumulative_reads[self.target_mhap_offsets[1:]]
+            - cumulative_reads[self.target_mhap_offsets[:-1]]
+        )
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Get the per row columns as a pandas DataFrame
+        :return: a DataFrame with columns bioinformatics_run_id, library_sample_id, mhaps_target_id, mhap_id, reads, umis
+        """
+        return pd.DataFrame(
+            {
+                "bioinformatics_run_id": self.bioinformatics_run_id,
+                "library_sample_id": self.library_sample_id,
+                "mhaps_target_id": self.mhaps_target_id,
+                "mhap_id": self.mhap_id,
+                "reads": self.reads,
+                "umis": self.umis,
+            }
+        )
+
+    def to_detected_microhaplotypes(self) -> list[dict]:
+        """
+        Rebuild the nested detected_microhaplotypes from the columnar view
+        :return: the detected_microhaplotypes list
+        """
+        block_run_ids = self.block_bioinformatics_run_ids.tolist()
+        block_sample_offsets = self.block_sample_offsets.tolist()
+        sample_library_sample_ids = self.sample_library_sample_ids.tolist()
+        sample_target_offsets = self.sample_target_offsets.tolist()
+        target_mhaps_target_ids = self.target_mhaps_target_ids.tolist()
+        target_mhap_offsets = self.target_mhap_offsets.tolist()
+        mhap_ids = self.mhap_id.tolist()
+        reads = self.reads.tolist()
+        umis = self.umis.tolist()
+        block_extra = self.extra_fields["blocks"]
+        sample_extra = self.extra_fields["samples"]
+        target_extra = self.extra_fields["targets"]
+        mhap_extra = self.extra_fields["mhaps"]
+
+        ret = []
+        for block_index, run_id in enumerate(block_run_ids):
+            library_samples = []
+            for sample_index in range(
+                block_sample_offsets[block_index], block_sample_offsets[block_index + 1]
+            ):
+                target_results = []
+                for target_index in range(
+                    sample_target_offsets[sample_index],
+                    sample_target_offsets[sample_index + 1],
+                ):
+                    mhaps = []
+                    for row in range(
+                        target_mhap_offsets[target_index],
+                        target_mhap_offsets[target_index + 1],
+                    ):
+                        mhap = {"mhap_id": mhap_ids[row], "reads": reads[row]}
+                        if umis[row] >= 0:
+                            mhap["umis"] = umis[row]
+                        if row in mhap_extra:
+                            mhap.update(mhap_extra[row])
+                        mhaps.append(mhap)
+                    target_result = {
+                        "mhaps_target_id": target_mhaps_target_ids[target_index],
+                        "mhaps": mhaps,
+                    }
+                    if target_index in target_extra:
+                        target_result.update(target_extra[target_index])
+                    target_results.append(target_result)
+                library_sample = {
+                    "library_sample_id": sample_library_sample_ids[sample_index],
+                    "target_results": target_results,
+                }
+                if sample_index in sample_extra:
+                    library_sample.update(sample_extra[sample_index])
+                library_samples.append(library_sample)
+            block = {
+                "bioinformatics_run_id": run_id,
+                "library_samples": library_samples,
+            }
+            if block_index in block_extra:
+                block.update(block_extra[block_index])
+            ret.append(block)
+        return ret
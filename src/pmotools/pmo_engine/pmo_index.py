@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+from collections import defaultdict
+from functools import cached_property
+
+from pmotools.pmo_engine.pmo_frame import PMOFrame, TargetResultsFrame
+from pmotools.pmo_engine.specimen_meta_index import SpecimenMetaIndex
+
+
+class PMOIndex:
+    """
+    A class holding the name to id look-ups and the links between the sections of a loaded PMO.
+    Each look-up is built the first time it is used and then reused, so one PMOIndex can be passed to many PMOProcessor, PMOExporter and PMOUpdater calls
+    instead of each call re-scanning the PMO. The look-ups are not updated when the PMO is modified, call invalidate() after changing the PMO.
+    The look-ups returned are shared between calls and should not be modified.
+    """
+
+    def __init__(self, pmodata):
+        """
+        :param pmodata: the loaded PMO to index
+        """
+        self.pmodata = pmodata
+
+    @staticmethod
+    def for_pmo(pmodata, pmo_index: "PMOIndex" = None) -> "PMOIndex":
+        """
+        Get the index to use for a PMO, either the supplied index or a new one if none was supplied
+        :param pmodata: the loaded PMO
+        :param pmo_index: an already built index for pmodata, or None
+        :return: the index for pmodata
+        """
+        if pmo_index is None:
+            return PMOIndex(pmodata)
+        if pmo_index.pmodata is not pmodata:
+            raise Exception("pmo_index was built for a different PMO than supplied")
+        return pmo_index
+
+    def invalidate(self):
+        """
+        Drop all the built look-ups so they are rebuilt from the PMO the next time they are used, needs to be called after the PMO is modified
+        :return: nothing
+        """
+        for name in list(self.__dict__):
+            if name != "pmodata":
+                del self.__dict__[name]
+
+    @cached_property
+    def bioinformatics_run_names(self) -> list[str]:
+        """
+        The bioinformatics_run_names in the order they appear in bioinformatics_run_info
+        """
+        return [
+            bioinformatics_run["bioinformatics_run_name"]
+            for bioinformatics_run in self.pmodata["bioinformatics_run_info"]
+        ]
+
+    @cached_property
+    def specimen_names(self) -> list[str]:
+        """
+        The specimen_names in the order they appear in specimen_info
+        """
+        return [specimen["specimen_name"] for specimen in self.pmodata["specimen_info"]]
+
+    @cached_property
+    def library_sample_names(self) -> list[str]:
+        """
+        The library_sample_names in the order they appear in library_sample_info
+        """
+        return [
+            library_sample["library_sample_name"]
+            for library_sample in self.pmodata["library_sample_info"]
+        ]
+
+    @cached_property
+    def target_names(self) -> list[str]:
+        """
+        The target_names in the order they appear in target_info
+        """
+        return [target["target_name"] for target in self.pmodata["target_info"]]
+
+    @cached_property
+    def panel_names(self) -> list[str]:
+        """
+        The panel_names in the order they appear in panel_info
+        """
+        return [panel["panel_name"] for panel in self.pmodata["panel_info"]]
+
+    @cached_property
+    def bioinformatics_run_name_index(self) -> dict[str, int]:
+        """
+        key: bioinformatics_run_name, val: index in bioinformatics_run_info
+        """
+        return {name: idx for idx, name in enumerate(self.bioinformatics_run_names)}
+
+    @cached_property
+    def specimen_name_index(self) -> dict[str, int]:
+        """
+        key: specimen_name, val: index in specimen_info
+        """
+        return {name: idx for idx, name in enumerate(self.specimen_names)}
+
+    @cached_property
+    def library_sample_name_index(self) -> dict[str, int]:
+        """
+        key: library_sample_name, val: index in library_sample_info
+        """
+        return {name: idx for idx, name in enumerate(self.library_sample_names)}
+
+    @cached_property
+    def target_name_index(self) -> dict[str, int]:
+        """
+        key: target_name, val: index in target_info
+        """
+        return {name: idx for idx, name in enumerate(self.target_names)}
+
+    @cached_property
+    def panel_name_index(self) -> dict[str, int]:
+        """
+        key: panel_name, val: index in panel_info
+        """
+        return {name: idx for idx, name in enumerate(self.panel_names)}
+
+    @cached_property
+    def library_sample_specimen_ids(self) -> list[int]:
+        """
+        The specimen_id of each library sample, in the order of library_sample_info
+        """
+        return [
+            library_sample["specimen_id"]
+            for library_sample in self.pmodata["library_sample_info"]
+        ]
+
+    @cached_property
+    def specimen_library_sample_ids(self) -> dict[int, list[int]]:
+        """
+        key: specimen_id, val: the library_sample_ids of the specimen in the order they appear in library_sample_info, specimens without library samples are left out
+        """
+        ret = defaultdict(list)
+        for library_sample_id, specimen_id in enumerate(
+            self.library_sample_specimen_ids
+        ):
+            ret[specimen_id].append(library_sample_id)
+        return dict(ret)
+
+    @cached_property
+    def representative_target_ids(self) -> list[int]:
+        """
+        The target_id (index in target_info) of each target in representative_microhaplotypes, in the order of representative_microhaplotypes["targets"]
+        """
+        return [
+            target["target_id"]
+            for target in self.pmodata["representative_microhaplotypes"]["targets"]
+        ]
+
+    @cached_property
+    def representative_target_names(self) -> list[str]:
+        """
+        The target_name of each target in representative_microhaplotypes, in the order of representative_microhaplotypes["targets"]
+        """
+        target_names = self.target_names
+        return [target_names[target_id] for target_id in self.representative_target_ids]
+
+    @cached_property
+    def target_id_representative_index(self) -> dict[int, int]:
+        """
+        key: target_id (index in target_info), val: index in representative_microhaplotypes["targets"]
+        """
+        return {
+            target_id: idx
+            for idx, target_id in enumerate(self.representative_target_ids)
+        }
+
+    @cached_property
+    def target_name_representative_index(self) -> dict[str, int]:
+        """
+        key: target_name, val: index in representative_microhaplotypes["targets"]
+        """
+        return {
+            target_name: idx
+            for idx, target_name in enumerate(self.representative_target_names)
+        }
+
+    @cached_property
+    def pmo_frame(self) -> PMOFrame:
+        """
+        The columnar PMOFrame of the detected_microhaplotypes
+        """
+        return PMOFrame.from_pmo(self.pmodata)
+
+    @cached_property
+    def target_results_frame(self) -> TargetResultsFrame:
+        """
+        The TargetResultsFrame of the detected_microhaplotypes, the PMOFrame if it has already been built, otherwise the cheaper target level view
+        """
+        if "pmo_frame" in self.__dict__:
+            return self.pmo_frame
+        return TargetResultsFrame.from_detected_microhaplotypes(
+            self.pmodata["detected_microhaplotypes"]
+        )
+
+    @cached_property
+    def specimen_meta_index(self) -> SpecimenMetaIndex:
+        """
+        The inverted index of the specimen meta fields in specimen_info
+        """
+        return SpecimenMetaIndex(self.pmodata["specimen_info"])
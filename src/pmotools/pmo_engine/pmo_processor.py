@@ -1,285 +1,318 @@
 #!/usr/bin/env python3
 import os
 import copy
+import heapq
+import numpy as np
 import pandas as pd
 
 from collections import defaultdict
 
+from pmotools.pmo_engine.allele_matrix import AlleleMatrix
+from pmotools.pmo_engine.pairwise_distance import PairwiseDistance
+from pmotools.pmo_engine.pmo_filter import PMOFilterSpec
+from pmotools.pmo_engine.pmo_frame import PMOFrame
+from pmotools.pmo_engine.pmo_index import PMOIndex
+from pmotools.pmo_engine.population_diversity import PopulationDiversity
+from pmotools.pmo_engine.specimen_meta_index import SpecimenMetaIndex
+
 
 class PMOProcessor:
     """
-    A class to extract info out of a loaded PMO object
+    A class to extract info out of a loaded PMO object.
+    Functions that look up names or ids take an optional pmo_index, a PMOIndex built for the same PMO, so its look-ups are reused across calls instead of being rebuilt each time
     """
 
     @staticmethod
-    def get_index_key_of_bioinformatics_run_names(pmodata):
+    def get_index_key_of_bioinformatics_run_names(pmodata, pmo_index: PMOIndex = None):
         """
         Get key of bioinformatics_run_name to index in pmodata["bioinformatics_run_info"]
         :param pmodata: the PMO to get indexes from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a dictionary of indexes keyed by bioinformatics_run_name
         """
-        ret = {}
-        for idx, bioinformatics_run in enumerate(pmodata["bioinformatics_run_info"]):
-            ret[bioinformatics_run["bioinformatics_run_name"]] = idx
-        return ret
+        return PMOIndex.for_pmo(pmodata, pmo_index).bioinformatics_run_name_index
 
     @staticmethod
-    def get_index_key_of_specimen_names(pmodata):
+    def get_index_key_of_specimen_names(pmodata, pmo_index: PMOIndex = None):
         """
         Get key of specimen_name to index in pmodata["specimen_info"]
         :param pmodata: the PMO to get indexes from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a dictionary of indexes keyed by specimen_name
         """
-        ret = {}
-        for idx, specimen in enumerate(pmodata["specimen_info"]):
-            ret[specimen["specimen_name"]] = idx
-        return ret
+        return PMOIndex.for_pmo(pmodata, pmo_index).specimen_name_index
 
     @staticmethod
-    def get_index_key_of_library_sample_names(pmodata):
+    def get_index_key_of_library_sample_names(pmodata, pmo_index: PMOIndex = None):
         """
         Get key of library_sample_name to index in pmodata["library_sample_info"]
         :param pmodata: the PMO to get indexes from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a dictionary of indexes keyed by library_sample_name
         """
-        ret = {}
-        for idx, library in enumerate(pmodata["library_sample_info"]):
-            ret[library["library_sample_name"]] = idx
-        return ret
+        return PMOIndex.for_pmo(pmodata, pmo_index).library_sample_name_index
 
     @staticmethod
-    def get_index_key_of_target_names(pmodata):
+    def get_index_key_of_target_names(pmodata, pmo_index: PMOIndex = None):
         """
         Get key of target_name to index in pmodata["target_info"]
         :param pmodata: the PMO to get indexes from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a dictionary of indexes keyed by target_name
         """
-        ret = {}
-        for idx, target in enumerate(pmodata["target_info"]):
-            ret[target["target_name"]] = idx
-        return ret
+        return PMOIndex.for_pmo(pmodata, pmo_index).target_name_index
 
     @staticmethod
-    def get_index_key_of_panel_names(pmodata):
+    def get_index_key_of_panel_names(pmodata, pmo_index: PMOIndex = None):
         """
         Get key of panel_name to index in pmodata["panel_info"]
         :param pmodata: the PMO to get indexes from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a dictionary of indexes keyed by panel_name
         """
-        ret = {}
-        for idx, panel in enumerate(pmodata["panel_info"]):
-            ret[panel["panel_name"]] = idx
-        return ret
+        return PMOIndex.for_pmo(pmodata, pmo_index).panel_name_index
 
     @staticmethod
-    def get_sorted_bioinformatics_run_names(pmodata) -> list[str]:
+    def get_sorted_bioinformatics_run_names(
+        pmodata, pmo_index: PMOIndex = None
+    ) -> list[str]:
         """
         Get a name sorted list of bioinformatics_run_names in pmodata["bioinformatics_run_info"]
         :param pmodata: the PMO to get bioinformatics_run_names from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a list of all bioinformatics_run_names
         """
         return sorted(
-            PMOProcessor.get_index_key_of_bioinformatics_run_names(pmodata).keys()
+            PMOProcessor.get_index_key_of_bioinformatics_run_names(
+                pmodata, pmo_index
+            ).keys()
         )
 
     @staticmethod
-    def get_sorted_specimen_names(pmodata) -> list[str]:
+    def get_sorted_specimen_names(pmodata, pmo_index: PMOIndex = None) -> list[str]:
         """
         Get a name sorted list of specimen_names in pmodata["specimen_info"]
         :param pmodata: the PMO to get specimen_names from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a list of all specimen_names
         """
-        return sorted(PMOProcessor.get_index_key_of_specimen_names(pmodata).keys())
+        return sorted(
+            PMOProcessor.get_index_key_of_specimen_names(pmodata, pmo_index).keys()
+        )
 
     @staticmethod
-    def get_sorted_library_sample_names(pmodata) -> list[str]:
+    def get_sorted_library_sample_names(
+        pmodata, pmo_index: PMOIndex = None
+    ) -> list[str]:
         """
         Get a name sorted list of library_sample_names in pmodata["library_sample_info"]
         :param pmodata: the PMO to get library_sample_names from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a list of all library_sample_names
         """
         return sorted(
-            PMOProcessor.get_index_key_of_library_sample_names(pmodata).keys()
+            PMOProcessor.get_index_key_of_library_sample_names(
+                pmodata, pmo_index
+            ).keys()
         )
 
     @staticmethod
-    def get_sorted_target_names(pmodata) -> list[str]:
+    def get_sorted_target_names(pmodata, pmo_index: PMOIndex = None) -> list[str]:
         """
         Get a name sorted list of target_names in pmodata["target_info"]
         :param pmodata: the PMO to get target_names from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a list of all target_names
         """
-        return sorted(PMOProcessor.get_index_key_of_target_names(pmodata).keys())
+        return sorted(
+            PMOProcessor.get_index_key_of_target_names(pmodata, pmo_index).keys()
+        )
 
     @staticmethod
-    def get_sorted_panel_names(pmodata) -> list[str]:
+    def get_sorted_panel_names(pmodata, pmo_index: PMOIndex = None) -> list[str]:
         """
         Get a name sorted list of panel_names in pmodata["panel_info"]
         :param pmodata: the PMO to get panel_names from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a list of all panel_names
         """
-        return sorted(PMOProcessor.get_index_key_of_panel_names(pmodata).keys())
+        return sorted(
+            PMOProcessor.get_index_key_of_panel_names(pmodata, pmo_index).keys()
+        )
 
     @staticmethod
-    def get_bioinformatics_run_names(pmodata) -> list[str]:
+    def get_bioinformatics_run_names(pmodata, pmo_index: PMOIndex = None) -> list[str]:
         """
         Get a list of bioinformatics_run_names in pmodata["bioinformatics_run_info"] in order they appear
         :param pmodata: the PMO to get bioinformatics_run_names from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a list of all bioinformatics_run_names
         """
-        ret = []
-        for bioinformatics_run in pmodata["bioinformatics_run_info"]:
-            ret.append(bioinformatics_run["bioinformatics_run_name"])
-        return ret
+        return list(PMOIndex.for_pmo(pmodata, pmo_index).bioinformatics_run_names)
 
     @staticmethod
-    def get_specimen_names(pmodata) -> list[str]:
+    def get_specimen_names(pmodata, pmo_index: PMOIndex = None) -> list[str]:
         """
         Get a list of specimen_names in pmodata["specimen_info"] in the order they appear
         :param pmodata: the PMO to get specimen_names from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a list of all specimen_names
         """
-        ret = []
-        for specimen in pmodata["specimen_info"]:
-            ret.append(specimen["specimen_name"])
-        return ret
+        return list(PMOIndex.for_pmo(pmodata, pmo_index).specimen_names)
 
     @staticmethod
-    def get_library_sample_names(pmodata) -> list[str]:
+    def get_library_sample_names(pmodata, pmo_index: PMOIndex = None) -> list[str]:
         """
         Get a list of library_sample_names in pmodata["library_sample_info"] in the order they appear
         :param pmodata: the PMO to get library_sample_names from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a list of all library_sample_names
         """
-        ret = []
-        for library_sample in pmodata["library_sample_info"]:
-            ret.append(library_sample["library_sample_name"])
-        return ret
+        return list(PMOIndex.for_pmo(pmodata, pmo_index).library_sample_names)
 
     @staticmethod
-    def get_target_names(pmodata) -> list[str]:
+    def get_target_names(pmodata, pmo_index: PMOIndex = None) -> list[str]:
         """
         Get a list of target_names in pmodata["target_info"] in the order they appear
         :param pmodata: the PMO to get target_names from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a list of all target_names
         """
-        ret = []
-        for target in pmodata["target_info"]:
-            ret.append(target["target_name"])
-        return ret
+        return list(PMOIndex.for_pmo(pmodata, pmo_index).target_names)
 
     @staticmethod
-    def get_panel_names(pmodata) -> list[str]:
+    def get_panel_names(pmodata, pmo_index: PMOIndex = None) -> list[str]:
         """
         Get a list of panel_names in pmodata["panel_info"] in the order they appear
         :param pmodata: the PMO to get panel_names from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a list of all panel_names
         """
-        ret = []
-        for panel in pmodata["panel_info"]:
-            ret.append(panel["panel_name"])
-        return ret
+        return list(PMOIndex.for_pmo(pmodata, pmo_index).panel_names)
 
     @staticmethod
-    def get_index_key_of_target_in_representative_microhaplotypes(pmodata):
+    def get_index_key_of_target_in_representative_microhaplotypes(
+        pmodata, pmo_index: PMOIndex = None
+    ):
         """
         Get key of target_name to index for the representative microhaplotypes for the target_name in pmodata["representative_microhaplotypes"]
         :param pmodata: the PMO to get indexes from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a dictionary of indexes keyed by target_name
         """
-        ret = {}
-        for idx, representative_microhaplotypes_for_target in enumerate(
-            pmodata["representative_microhaplotypes"]["targets"]
-        ):
-            ret[
-                pmodata["target_info"][
-                    representative_microhaplotypes_for_target["target_id"]
-                ]["target_name"]
-            ] = idx
-        return ret
+        return PMOIndex.for_pmo(pmodata, pmo_index).target_name_representative_index
+
+    @staticmethod
+    def get_pmo_frame(pmodata, pmo_index: PMOIndex = None) -> PMOFrame:
+        """
+        Get the columnar PMOFrame of pmodata["detected_microhaplotypes"], one row per detected microhaplotype
+        :param pmodata: the PMO to get the detected microhaplotypes from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse, the frame is then only built once
+        :return: the PMOFrame, PMOFrame.to_detected_microhaplotypes() rebuilds the nested form
+        """
+        return PMOIndex.for_pmo(pmodata, pmo_index).pmo_frame
 
     @staticmethod
     def get_index_of_bioinformatics_run_names(
-        pmodata, bioinformatics_run_names: list[str]
+        pmodata, bioinformatics_run_names: list[str], pmo_index: PMOIndex = None
     ):
         """
         Get index of bioinformatics_run_name in pmodata["bioinformatics_run_info"]
         :param pmodata: the PMO to get indexes from
         :param bioinformatics_run_names: a list of bioinformatics_run_names
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: the index of bioinformatics_run_names in pmodata["bioinformatics_run_name"] returned in the same order as bioinformatics_run_names
         """
         bioinformatics_run_key = PMOProcessor.get_index_key_of_bioinformatics_run_names(
-            pmodata
+            pmodata, pmo_index
         )
         return [bioinformatics_run_key[name] for name in bioinformatics_run_names]
 
     @staticmethod
-    def get_index_of_specimen_names(pmodata, specimen_names: list[str]):
+    def get_index_of_specimen_names(
+        pmodata, specimen_names: list[str], pmo_index: PMOIndex = None
+    ):
         """
         Get index of specimen_name in pmodata["specimen_info"]
         :param pmodata: the PMO to get indexes from
         :param specimen_names: a list of specimen_names
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: the index of specimen_names in pmodata["specimen_info"] returned in the same order as specimen_names
         """
-        specimen_key = PMOProcessor.get_index_key_of_specimen_names(pmodata)
+        specimen_key = PMOProcessor.get_index_key_of_specimen_names(pmodata, pmo_index)
         return [specimen_key[name] for name in specimen_names]
 
     @staticmethod
-    def get_index_of_library_sample_names(pmodata, library_sample_names: list[str]):
+    def get_index_of_library_sample_names(
+        pmodata, library_sample_names: list[str], pmo_index: PMOIndex = None
+    ):
         """
         Get index of library_sample_name in pmodata["library_sample_info"]
         :param pmodata: the PMO to get indexes from
         :param library_sample_names: a list of library_sample_names
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: the index of library_sample_names in pmodata["library_sample_info"] returned in the same order as library_sample_names
         """
-        library_sample_key = PMOProcessor.get_index_key_of_library_sample_names(pmodata)
+        library_sample_key = PMOProcessor.get_index_key_of_library_sample_names(
+            pmodata, pmo_index
+        )
         return [library_sample_key[name] for name in library_sample_names]
 
     @staticmethod
-    def get_index_of_target_names(pmodata, target_names: list[str]):
+    def get_index_of_target_names(
+        pmodata, target_names: list[str], pmo_index: PMOIndex = None
+    ):
         """
         Get index of target_name in pmodata["target_info"]
         :param pmodata: the PMO to get indexes from
         :param target_names: a list of target_names
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: the index of target_names in pmodata["target_info"] returned in the same order as target_names
         """
-        target_key = PMOProcessor.get_index_key_of_target_names(pmodata)
+        target_key = PMOProcessor.get_index_key_of_target_names(pmodata, pmo_index)
         return [target_key[name] for name in target_names]
 
     @staticmethod
-    def get_index_of_panel_names(pmodata, panel_names: list[str]):
+    def get_index_of_panel_names(
+        pmodata, panel_names: list[str], pmo_index: PMOIndex = None
+    ):
         """
         Get index of panel_name in pmodata["panel_info"]
         :param pmodata: the PMO to get indexes from
         :param panel_names: a list of panel_names
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: the index of panel_names in pmodata["panel_info"] returned in the same order as panel_names
         """
-        panel_key = PMOProcessor.get_index_key_of_panel_names(pmodata)
+        panel_key = PMOProcessor.get_index_key_of_panel_names(pmodata, pmo_index)
         return [panel_key[name] for name in panel_names]
 
     @staticmethod
     def get_index_of_target_in_representative_microhaplotypes(
-        pmodata, target_names: list[str]
+        pmodata, target_names: list[str], pmo_index: PMOIndex = None
     ):
         """
         Get index of target_name in pmodata["representative_microhaplotypes"]["targets"]
         :param pmodata: the PMO to get indexes from
         :param target_names: a list of target_names
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: the index of target_names in pmodata["representative_microhaplotypes"]["targets"] returned in the same order as target_names
         """
         microhap_target_key = (
             PMOProcessor.get_index_key_of_target_in_representative_microhaplotypes(
-                pmodata
+                pmodata, pmo_index
             )
         )
         return [microhap_target_key[name] for name in target_names]
 
     @staticmethod
-    def get_library_ids_for_specimen_ids(pmodata, specimen_ids: set[int]):
+    def get_library_ids_for_specimen_ids(
+        pmodata, specimen_ids: set[int], pmo_index: PMOIndex = None
+    ):
         """
         get a dictionary that lists the library_ids for a specimen_id
         :param pmodata: the PMO to get indexes from
         :param specimen_ids: a set of specimen_ids
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a dictionary that lists the library_ids for a specimen_id
         """
         ret = defaultdict(set)
@@ -293,50 +326,56 @@ class PMOProcessor:
                 )
         if len(warnings) > 0:
             raise Exception("\n".join(warnings))
-        for library_sample_id, library_sample in enumerate(
-            pmodata["library_sample_info"]
-        ):
-            if library_sample["specimen_id"] in specimen_ids:
-                ret[library_sample["specimen_id"]].add(library_sample_id)
+        specimen_library_sample_ids = PMOIndex.for_pmo(
+            pmodata, pmo_index
+        ).specimen_library_sample_ids
+        for specimen_id in specimen_ids:
+            if specimen_id in specimen_library_sample_ids:
+                ret[specimen_id].update(specimen_library_sample_ids[specimen_id])
         return ret
 
     @staticmethod
     def count_targets_per_library_sample(
-        pmodata, min_reads: float = 0.0
+        pmodata, min_reads: float = 0.0, pmo_index: PMOIndex = None
     ) -> pd.DataFrame:
         """
         Count the number of targets per library sample, with optional collapsing across bioinformatics runs.
 
         :param pmodata: the loaded PMO
         :param min_reads: a minimum number of reads for a target in order for it to be counted
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a pandas DataFrame, columns = [bioinformatics_run_id, library_sample_name, target_number]
         """
-        records = []
-        library_sample_info = pmodata["library_sample_info"]
-
-        for result in pmodata["detected_microhaplotypes"]:
-            run_id = result["bioinformatics_run_id"]
-            for sample in result["library_samples"]:
-                sample_id = sample["library_sample_id"]
-                sample_name = library_sample_info[sample_id]["library_sample_name"]
-
-                target_count = sum(
-                    sum(hap["reads"] for hap in target["mhaps"]) >= min_reads
-                    for target in sample["target_results"]
-                )
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        target_results = pmo_index.target_results_frame
+        library_sample_names = np.asarray(pmo_index.library_sample_names, dtype=object)
 
-                record = {
-                    "bioinformatics_run_id": run_id,
-                    "library_sample_name": sample_name,
-                    "target_number": target_count,
-                }
-
-                records.append(record)
-        return pd.DataFrame.from_records(records)
+        # number of targets passing min_reads per library sample entry, summed over the sample's run of target results
+        cumulative_passing = np.concatenate(
+            ([0], np.cumsum(target_results.target_reads >= min_reads, dtype=np.int64))
+        )
+        target_count = (
+            cumulative_passing[target_results.sample_target_offsets[1:]]
+            - cumulative_passing[target_results.sample_target_offsets[:-1]]
+        )
+        return pd.DataFrame(
+            {
+                "bioinformatics_run_id": target_results.block_bioinformatics_run_ids[
+                    target_results.sample_block_index
+                ],
+                "library_sample_name": library_sample_names[
+                    target_results.sample_library_sample_ids
+                ],
+                "target_number": target_count,
+            }
+        )
 
     @staticmethod
     def count_library_samples_per_target(
-        pmodata, min_reads: float = 0.0, collapse_across_runs: bool = False
+        pmodata,
+        min_reads: float = 0.0,
+        collapse_across_runs: bool = False,
+        pmo_index: PMOIndex = None,
     ) -> pd.DataFrame:
         """
         Count the number of library samples per target, optionally collapsing across bioinformatics runs.
@@ -344,36 +383,42 @@ class PMOProcessor:
         :param pmodata: the loaded PMO
         :param min_reads: the minimum number of reads for a target in order for it to be counted
         :param collapse_across_runs: if True, sums across bioinformatics_run_id per target
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a pandas dataframe
                  - if collapse_across_runs=False: columns = [bioinformatics_run_id, target_name, sample_count]
                  - if collapse_across_runs=True:  columns = [target_name, sample_count]
         """
-        records = []
-        microhap_targets = pmodata["representative_microhaplotypes"]["targets"]
-        target_info = pmodata["target_info"]
-
-        for result in pmodata["detected_microhaplotypes"]:
-            run_id = result["bioinformatics_run_id"]
-            target_sample_counts = defaultdict(int)
-
-            for sample in result["library_samples"]:
-                for target_result in sample["target_results"]:
-                    if sum(hap["reads"] for hap in target_result["mhaps"]) >= min_reads:
-                        mhaps_target_id = target_result["mhaps_target_id"]
-                        target_id = microhap_targets[mhaps_target_id]["target_id"]
-                        target_name = target_info[target_id]["target_name"]
-                        target_sample_counts[target_name] += 1
-
-            for target_name, count in target_sample_counts.items():
-                records.append(
-                    {
-                        "bioinformatics_run_id": run_id,
-                        "target_name": target_name,
-                        "sample_count": count,
-                    }
-                )
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        target_results = pmo_index.target_results_frame
+        # integer code per target name so targets sharing a name are counted together
+        target_name_codes, target_names = pd.factorize(
+            pd.Series(pmo_index.representative_target_names, dtype=object)
+        )
 
-        ret = pd.DataFrame.from_records(records)
+        passing = target_results.target_reads >= min_reads
+        block_index = target_results.sample_block_index[
+            target_results.target_sample_index
+        ][passing]
+        name_code = target_name_codes[target_results.target_mhaps_target_ids[passing]]
+        name_number = max(len(target_names), 1)
+        keys = block_index * name_number + name_code
+        unique_keys, first_index, sample_count = np.unique(
+            keys, return_index=True, return_counts=True
+        )
+        # keep each run's targets in the order they were first seen
+        order = np.argsort(first_index, kind="stable")
+        unique_keys = unique_keys[order]
+        ret = pd.DataFrame(
+            {
+                "bioinformatics_run_id": target_results.block_bioinformatics_run_ids[
+                    unique_keys // name_number
+                ],
+                "target_name": np.asarray(target_names, dtype=object)[
+                    unique_keys % name_number
+                ],
+                "sample_count": sample_count[order],
+            }
+        )
 
         if collapse_across_runs:
             ret = ret.groupby("target_name", as_index=False)["sample_count"].sum()
@@ -383,6 +428,98 @@ class PMOProcessor:
             drop=True
         )
 
+    @staticmethod
+    def _passing_microhaplotypes(
+        pmo_frame: PMOFrame, min_reads: float = 0.0, min_within_target_freq: float = 0.0
+    ) -> np.ndarray:
+        """
+        Get which rows of a PMOFrame pass read thresholds
+        :param pmo_frame: the columnar view of the PMO's detected_microhaplotypes
+        :param min_reads: the minimum number of reads
+        :param min_within_target_freq: the minimum fraction of the reads of its target within its library sample
+        :return: a boolean array, True for the rows passing both thresholds
+        """
+        return (pmo_frame.reads >= min_reads) & (
+            pmo_frame.reads
+            >= min_within_target_freq
+            * pmo_frame.target_reads[pmo_frame.mhap_target_index]
+        )
+
+    @staticmethod
+    def calc_within_sample_diversity(
+        pmodata,
+        min_reads: float = 0.0,
+        min_within_target_freq: float = 0.0,
+        pmo_index: PMOIndex = None,
+    ) -> pd.DataFrame:
+        """
+        Calculate complexity of infection (MOI) proxies and within-host diversity for each library sample of each bioinformatics run.
+        Only microhaplotypes passing the thresholds are counted, and the within-host heterozygosity of a target (1 - the sum of the squared
+        read frequencies of its microhaplotypes) uses the reads of the passing microhaplotypes only
+
+        :param pmodata: the loaded PMO
+        :param min_reads: only count microhaplotypes with at least this many reads
+        :param min_within_target_freq: only count microhaplotypes with at least this fraction of the reads of their target within their library sample
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :return: a pandas DataFrame, columns = [bioinformatics_run_id, library_sample_name, target_number, polyallelic_target_number, max_alleles_per_target, median_alleles_per_target, mean_within_host_heterozygosity], library samples without any passing microhaplotypes have a target_number of 0 and NaN for the rest
+        """
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        pmo_frame = PMOProcessor.get_pmo_frame(pmodata, pmo_index)
+        library_sample_names = np.asarray(pmo_index.library_sample_names, dtype=object)
+
+        passing = PMOProcessor._passing_microhaplotypes(
+            pmo_frame, min_reads, min_within_target_freq
+        )
+        target_index = pmo_frame.mhap_target_index[passing]
+        reads = pmo_frame.reads[passing]
+        allele_counts = np.bincount(target_index, minlength=pmo_frame.target_count)
+        target_reads = np.bincount(
+            target_index, weights=reads, minlength=pmo_frame.target_count
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            freqs = reads / target_reads[target_index]
+        heterozygosity = 1 - np.bincount(
+            target_index, weights=freqs * freqs, minlength=pmo_frame.target_count
+        )
+
+        typed = allele_counts > 0
+        per_sample = (
+            pd.DataFrame(
+                {
+                    "sample_index": pmo_frame.target_sample_index[typed],
+                    "alleles": allele_counts[typed],
+                    "polyallelic": allele_counts[typed] > 1,
+                    "heterozygosity": heterozygosity[typed],
+                }
+            )
+            .groupby("sample_index")
+            .agg(
+                target_number=("alleles", "size"),
+                polyallelic_target_number=("polyallelic", "sum"),
+                max_alleles_per_target=("alleles", "max"),
+                median_alleles_per_target=("alleles", "median"),
+                mean_within_host_heterozygosity=("heterozygosity", "mean"),
+            )
+            .reindex(np.arange(pmo_frame.sample_count))
+        )
+        per_sample["target_number"] = (
+            per_sample["target_number"].fillna(0).astype(np.int64)
+        )
+        per_sample["polyallelic_target_number"] = (
+            per_sample["polyallelic_target_number"].fillna(0).astype(np.int64)
+        )
+        per_sample.insert(
+            0,
+            "library_sample_name",
+            library_sample_names[pmo_frame.sample_library_sample_ids],
+        )
+        per_sample.insert(
+            0,
+            "bioinformatics_run_id",
+            pmo_frame.block_bioinformatics_run_ids[pmo_frame.sample_block_index],
+        )
+        return per_sample.reset_index(drop=True)
+
     @staticmethod
     def count_targets_per_panel(pmodata) -> pd.DataFrame:
         """
@@ -405,29 +542,33 @@ class PMOProcessor:
         )
 
     @staticmethod
-    def count_specimen_per_meta_fields(pmodata) -> pd.DataFrame:
+    def count_specimen_per_meta_fields(
+        pmodata, pmo_index: PMOIndex = None
+    ) -> pd.DataFrame:
         """
         Get a pandas dataframe of counts of the meta fields within the specimen_info section
         :param pmodata: the pmo to count from
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: a pandas dataframe of counts with the following columns: field, present_in_specimens_count, total_specimen_count
         """
-        field_counts = defaultdict(int)
-        for specimen in pmodata["specimen_info"]:
-            for meta_field in specimen:
-                field_counts[meta_field] += 1
+        specimen_meta_index = PMOIndex.for_pmo(pmodata, pmo_index).specimen_meta_index
         counts_df = pd.DataFrame(
             columns=["field", "present_in_specimens_count", "total_specimen_count"]
         )
-        for field_name, field_count in field_counts.items():
+        for field_name in specimen_meta_index.fields:
             counts_df.loc[len(counts_df)] = {
                 "field": field_name,
-                "present_in_specimens_count": field_count,
+                "present_in_specimens_count": specimen_meta_index.field_specimen_count(
+                    field_name
+                ),
                 "total_specimen_count": len(pmodata["specimen_info"]),
             }
         return counts_df
 
     @staticmethod
-    def count_specimen_by_field_value(pmodata, meta_fields: list[str]) -> pd.DataFrame:
+    def count_specimen_by_field_value(
+        pmodata, meta_fields: list[str], pmo_index: PMOIndex = None
+    ) -> pd.DataFrame:
         """
         Count the values of the meta fields. If a specimen doesn't have a field, it is marked as 'NA'.
         Groups are combinations of all given meta fields.
@@ -435,14 +576,13 @@ class PMOProcessor:
         :param pmodata: the pmo to count from
         :param meta_fields: a list of meta fields to count
         :type meta_fields: list[str]
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
         :return: counts for all sub-field groups, with metadata
         """
         total_specimens = len(pmodata["specimen_info"])
-        field_counts = defaultdict(int)
-
-        for specimen in pmodata["specimen_info"]:
-            key = tuple(str(specimen.get(field, "NA")) for field in meta_fields)
-            field_counts[key] += 1
+        field_counts = PMOIndex.for_pmo(
+            pmodata, pmo_index
+        ).specimen_meta_index.count_by_field_values(meta_fields, "NA")
 
         records = []
         for key, count in field_counts.items():
@@ -462,6 +602,45 @@ class PMOProcessor:
             .reset_index(drop=True)
         )
 
+    @staticmethod
+    def get_library_sample_field_values(
+        pmodata, field: str, missing_value: str = "NA", pmo_index: PMOIndex = None
+    ) -> list[str]:
+        """
+        Get the value of a field for each library sample, taken from library_sample_info if any library sample has the field, otherwise from the library sample's specimen in specimen_info.
+        project_name, if not a field of either, gives the name of the specimen's project
+        :param pmodata: the loaded PMO
+        :param field: the field
+        :param missing_value: the value used when a library sample (or its specimen) doesn't have the field
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :return: the values as strings, in the order of library_sample_info
+        """
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        if any(
+            field in library_sample for library_sample in pmodata["library_sample_info"]
+        ):
+            return [
+                str(library_sample.get(field, missing_value))
+                for library_sample in pmodata["library_sample_info"]
+            ]
+        if (
+            field == "project_name"
+            and field not in pmo_index.specimen_meta_index.fields
+        ):
+            specimen_values = [
+                pmodata["project_info"][specimen["project_id"]]["project_name"]
+                for specimen in pmodata["specimen_info"]
+            ]
+        else:
+            specimen_values = [
+                str(specimen.get(field, missing_value))
+                for specimen in pmodata["specimen_info"]
+            ]
+        return [
+            specimen_values[specimen_id]
+            for specimen_id in pmo_index.library_sample_specimen_ids
+        ]
+
     @staticmethod
     def extract_allele_counts_freq_from_pmo(
         pmodata,
@@ -469,97 +648,270 @@ class PMOProcessor:
         library_sample_names: list[str] = None,
         target_names: list[str] = None,
         collapse_across_runs: bool = False,
+        pmo_index: PMOIndex = None,
+        group_by_fields: list[str] = None,
+        min_reads: float = 0.0,
+        min_within_target_freq: float = 0.0,
     ) -> pd.DataFrame:
         """
         Extract allele counts from PMO data into a single DataFrame.
+        Counts are computed on the columnar PMOFrame by giving each (group, run, target, allele) an integer code and counting the codes,
+        so all the groups are computed together in one pass.
 
         :param pmodata: the pmo data structure
         :param bioinformatics_run_ids: optional list of bioinformatics_run_ids to include
         :param library_sample_names: optional list of library_sample_names to include
         :param target_names: optional list of target_names to include
         :param collapse_across_runs: whether to collapse count/freqs across bioinformatics_run_id runs
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :param group_by_fields: optional fields of library_sample_info or specimen_info (e.g. collection_country or project_name) to compute the counts/freqs within each group of, see get_library_sample_field_values, added as the first columns
+        :param min_reads: only count microhaplotypes with at least this many reads
+        :param min_within_target_freq: only count microhaplotypes with at least this fraction of the reads of their target within their library sample
         :return: DataFrame with columns: bioinformatics_run_id, target, mhap_id, count, freq, target_total
         """
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        pmo_frame = PMOProcessor.get_pmo_frame(pmodata, pmo_index)
+        group_by_fields = [] if group_by_fields is None else list(group_by_fields)
 
-        allele_counts = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
-        target_totals = defaultdict(lambda: defaultdict(int))
+        # select the rows
+        library_sample_ids = pmo_frame.library_sample_id
+        mhaps_target_ids = pmo_frame.mhaps_target_id
+        passing = PMOProcessor._passing_microhaplotypes(
+            pmo_frame, min_reads, min_within_target_freq
+        )
+        if bioinformatics_run_ids is not None:
+            passing &= np.isin(
+                pmo_frame.bioinformatics_run_id, list(bioinformatics_run_ids)
+            )
+        if library_sample_names is not None:
+            library_sample_names = set(library_sample_names)
+            passing &= np.array(
+                [
+                    name in library_sample_names
+                    for name in pmo_index.library_sample_names
+                ],
+                dtype=bool,
+            )[library_sample_ids]
+        if target_names is not None:
+            target_names = set(target_names)
+            passing &= np.array(
+                [
+                    name in target_names
+                    for name in pmo_index.representative_target_names
+                ],
+                dtype=bool,
+            )[mhaps_target_ids]
+
+        # integer codes of each key column in sorted order of their values, so the counted codes come out sorted
+        key_columns = {}
+        for field in group_by_fields:
+            codes, values = pd.factorize(
+                pd.Series(
+                    PMOProcessor.get_library_sample_field_values(
+                        pmodata, field, pmo_index=pmo_index
+                    ),
+                    dtype=object,
+                ),
+                sort=True,
+            )
+            key_columns[field] = (codes[library_sample_ids[passing]], values)
+        if not collapse_across_runs:
+            values, codes = np.unique(
+                pmo_frame.bioinformatics_run_id[passing], return_inverse=True
+            )
+            key_columns["bioinformatics_run_id"] = (codes, values)
+        codes, values = pd.factorize(
+            pd.Series(pmo_index.representative_target_names, dtype=object), sort=True
+        )
+        key_columns["target_name"] = (codes[mhaps_target_ids[passing]], values)
+        return PMOProcessor._allele_counts_freq_table(
+            key_columns,
+            pmo_frame.mhap_id[passing],
+            group_by_fields=group_by_fields,
+            collapse_across_runs=collapse_across_runs,
+        )
 
-        for data_for_run in pmodata["detected_microhaplotypes"]:
-            bioid = data_for_run["bioinformatics_run_id"]
-            if (
-                bioinformatics_run_ids is not None
-                and bioid not in bioinformatics_run_ids
-            ):
-                continue
-            for sample_data in data_for_run["library_samples"]:
-                sample_name = pmodata["library_sample_info"][
-                    sample_data["library_sample_id"]
-                ]["library_sample_name"]
-                if (
-                    library_sample_names is not None
-                    and sample_name not in library_sample_names
-                ):
-                    continue
-                for target_data in sample_data["target_results"]:
-                    target_id = pmodata["representative_microhaplotypes"]["targets"][
-                        target_data["mhaps_target_id"]
-                    ]["target_id"]
-                    target = pmodata["target_info"][target_id]["target_name"]
-                    if target_names is not None and target not in target_names:
-                        continue
-                    for microhapid in target_data["mhaps"]:
-                        mhap_id = microhapid["mhap_id"]
-                        allele_counts[bioid][target][mhap_id] += 1
-                        target_totals[bioid][target] += 1
-
-        # Flatten into list of rows
-        rows = []
-        for bioid, targets in allele_counts.items():
-            for target, mhap_counts in targets.items():
-                total = target_totals[bioid][target]
-                for mhap_id, count in mhap_counts.items():
-                    freq = count / total if total > 0 else 0.0
-                    rows.append(
-                        {
-                            "bioinformatics_run_id": bioid,
-                            "target_name": target,
-                            "mhap_id": mhap_id,
-                            "count": count,
-                            "freq": freq,
-                            "total_haps_per_target": total,
-                        }
+    @staticmethod
+    def _allele_counts_freq_table(
+        key_columns: dict[str, tuple[np.ndarray, np.ndarray]],
+        mhap_ids: np.ndarray,
+        counts: np.ndarray = None,
+        group_by_fields: list[str] = None,
+        collapse_across_runs: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Count the alleles within each combination of key values, the counting step of extract_allele_counts_freq_from_pmo
+        :param key_columns: key column name to (the code of each row, the sorted values the codes refer to), in the order of the output columns, target_name last
+        :param mhap_ids: the mhap_id of each row
+        :param counts: the count of each row if the rows are already partly counted, otherwise each row counts once
+        :param group_by_fields: the key columns that are group by fields
+        :param collapse_across_runs: whether the key columns lack the bioinformatics_run_id, which selects the output columns
+        :return: the allele counts and frequencies, see extract_allele_counts_freq_from_pmo
+        """
+        group_by_fields = [] if group_by_fields is None else list(group_by_fields)
+        dims = tuple(max(len(values), 1) for _, values in key_columns.values())
+        target_keys = np.ravel_multi_index(
+            tuple(codes for codes, _ in key_columns.values()), dims
+        )
+        mhap_dim = int(mhap_ids.max()) + 1 if len(mhap_ids) > 0 else 1
+        if counts is None:
+            allele_keys, count = np.unique(
+                target_keys * mhap_dim + mhap_ids, return_counts=True
+            )
+        else:
+            allele_keys, allele_index = np.unique(
+                target_keys * mhap_dim + mhap_ids, return_inverse=True
+            )
+            count = np.bincount(allele_index, weights=counts).astype(np.int64)
+        allele_target_keys = allele_keys // mhap_dim
+        _, allele_target_index = np.unique(allele_target_keys, return_inverse=True)
+        target_total = np.bincount(allele_target_index, weights=count).astype(np.int64)[
+            allele_target_index
+        ]
+
+        key_values = np.unravel_index(allele_target_keys, dims)
+        ret = pd.DataFrame(
+            {
+                **{
+                    name: np.asarray(values)[codes]
+                    for (name, (_, values)), codes in zip(
+                        key_columns.items(), key_values
                     )
-        ret = pd.DataFrame(rows)
-
+                },
+                "mhap_id": allele_keys % mhap_dim,
+                "count": count,
+                "freq": count / target_total,
+                "total_haps_per_target": target_total,
+            }
+        )
         if collapse_across_runs:
-            # Aggregate counts across runs
-            collapsed = ret.groupby(["target_name", "mhap_id"], as_index=False)[
-                "count"
-            ].sum()
-            # Recalculate target_total as sum of counts per target
-            total_counts = (
-                collapsed.groupby("target_name", as_index=False)["count"]
-                .sum()
-                .rename(columns={"count": "target_total"})
-            )
-            collapsed = collapsed.merge(total_counts, on="target_name", how="left")
-            collapsed["freq"] = collapsed["count"] / collapsed["target_total"]
+            ret = ret.rename(columns={"total_haps_per_target": "target_total"})
+            return ret[
+                group_by_fields
+                + ["target_name", "mhap_id", "count", "freq", "target_total"]
+            ]
+        return ret
 
-            # Sort output
-            return collapsed.sort_values(["target_name", "mhap_id"]).reset_index(
-                drop=True
-            )[["target_name", "mhap_id", "count", "freq", "target_total"]]
+    @staticmethod
+    def calc_pairwise_distances(
+        pmodata,
+        metric: str = "jaccard",
+        min_reads: float = 0.0,
+        min_within_target_freq: float = 0.0,
+        output_fnp: str | os.PathLike[str] = None,
+        square: bool = False,
+        threads: int = 1,
+        block_size: int = 256,
+        pmo_index: PMOIndex = None,
+    ) -> np.ndarray:
+        """
+        Compute the pairwise genetic distances between all the library samples of a PMO from the alleles each has detected, see PairwiseDistance for the metrics.
+        The rows are the library samples in the order of library_sample_info, alleles detected in any bioinformatics run count
 
-        return ret.sort_values(
-            ["bioinformatics_run_id", "target_name", "mhap_id"]
-        ).reset_index(drop=True)
+        :param pmodata: the loaded PMO
+        :param metric: the distance metric, one of jaccard, allele_sharing or ibs
+        :param min_reads: only count microhaplotypes with at least this many reads
+        :param min_within_target_freq: only count microhaplotypes with at least this fraction of the reads of their target within their library sample
+        :param output_fnp: if given, the distances are written to this .npy file through a memory map rather than held in memory
+        :param square: if True, output the full square matrix, otherwise the condensed upper triangle in the order of scipy.spatial.distance.pdist
+        :param threads: the number of worker processes to compute the distances in
+        :param block_size: the number of library samples to compute the distances of at once
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :return: the distances, a numpy.memmap of output_fnp if given
+        """
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        pmo_frame = PMOProcessor.get_pmo_frame(pmodata, pmo_index)
+        passing = PMOProcessor._passing_microhaplotypes(
+            pmo_frame, min_reads, min_within_target_freq
+        )
+        allele_matrix = AlleleMatrix.from_columns(
+            pmo_frame.library_sample_id[passing],
+            pmo_frame.mhaps_target_id[passing],
+            pmo_frame.mhap_id[passing],
+            pmo_frame.reads[passing],
+            pmo_index.library_sample_names,
+            pmo_index.representative_target_names,
+            "presence",
+        )
+        return PairwiseDistance.calc_distances(
+            allele_matrix,
+            metric=metric,
+            output_fnp=output_fnp,
+            square=square,
+            threads=threads,
+            block_size=block_size,
+        )
 
     @staticmethod
-    def filter_pmo_by_library_sample_ids(pmodata, library_sample_ids: set[int]):
+    def get_population_diversity(
+        pmodata,
+        group_by_fields: list[str],
+        min_reads: float = 0.0,
+        min_within_target_freq: float = 0.0,
+        pmo_index: PMOIndex = None,
+    ) -> PopulationDiversity:
+        """
+        Count the alleles of every population defined by group_by_fields in one pass over the detected microhaplotypes, to calculate
+        the per target diversity and the pairwise Fst of all the populations from, see PopulationDiversity.
+        Alleles detected in more than one bioinformatics run of a library sample are counted once per run
+
+        :param pmodata: the loaded PMO
+        :param group_by_fields: fields of library_sample_info or specimen_info (e.g. collection_country, collection_year or project_name) whose combined values define the populations
+        :param min_reads: only count microhaplotypes with at least this many reads
+        :param min_within_target_freq: only count microhaplotypes with at least this fraction of the reads of their target within their library sample
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :return: the PopulationDiversity of the populations
+        """
+        allele_counts = PMOProcessor.extract_allele_counts_freq_from_pmo(
+            pmodata,
+            collapse_across_runs=True,
+            pmo_index=pmo_index,
+            group_by_fields=group_by_fields,
+            min_reads=min_reads,
+            min_within_target_freq=min_within_target_freq,
+        )
+        return PopulationDiversity(allele_counts, group_by_fields)
+
+    @staticmethod
+    def _taker(share_unchanged: bool):
+        """
+        Get the function used to bring an unchanged section or record into a filtered PMO
+        :param share_unchanged: whether to share the object with the source PMO rather than deep copy it
+        :return: a function taking the object and returning either it or a deep copy of it
+        """
+        if share_unchanged:
+            return lambda obj: obj
+        return copy.deepcopy
+
+    @staticmethod
+    def _updating_taker(share_unchanged: bool):
+        """
+        Get the function used to bring a record with updated fields into a filtered PMO without modifying the source record
+        :param share_unchanged: whether to only copy the top level of the record, sharing its nested values with the source PMO, rather than deep copy it
+        :return: a function taking the record and the updated fields as keyword arguments and returning the new record
+        """
+        if share_unchanged:
+            return lambda record, **updates: {**record, **updates}
+
+        def deep_copy_with_updates(record, **updates):
+            ret = {
+                key: updates[key] if key in updates else copy.deepcopy(value)
+                for key, value in record.items()
+            }
+            ret.update(updates)
+            return ret
+
+        return deep_copy_with_updates
+
+    @staticmethod
+    def filter_pmo_by_library_sample_ids(
+        pmodata, library_sample_ids: set[int], share_unchanged: bool = False
+    ):
         """
         Extract out of a load PMO the data associated with select library_sample_ids
         :param pmodata:the loaded PMO
         :param library_sample_ids: the library_sample_ids to extract the info for
+        :param share_unchanged: if True, unchanged sections and records are shared with pmodata rather than deep copied, so the result only costs memory in proportion to what was changed, but then neither PMO should be modified in place (copy.deepcopy the result first if it needs modifying)
         :return: a new PMO with only the data associated with the supplied library_sample_ids
         """
 
@@ -579,24 +931,22 @@ class PMOProcessor:
         if len(warnings) > 0:
             raise Exception("\n".join(warnings))
 
+        take = PMOProcessor._taker(share_unchanged)
+        take_with_update = PMOProcessor._updating_taker(share_unchanged)
         pmo_out = {
-            "pmo_header": copy.deepcopy(pmodata["pmo_header"]),
-            "panel_info": copy.deepcopy(pmodata["panel_info"]),
-            "sequencing_info": copy.deepcopy(pmodata["sequencing_info"]),
-            "target_info": copy.deepcopy(pmodata["target_info"]),
-            "targeted_genomes": copy.deepcopy(pmodata["targeted_genomes"]),
-            "representative_microhaplotypes": copy.deepcopy(
+            "pmo_header": take(pmodata["pmo_header"]),
+            "panel_info": take(pmodata["panel_info"]),
+            "sequencing_info": take(pmodata["sequencing_info"]),
+            "target_info": take(pmodata["target_info"]),
+            "targeted_genomes": take(pmodata["targeted_genomes"]),
+            "representative_microhaplotypes": take(
                 pmodata["representative_microhaplotypes"]
             ),
-            "bioinformatics_methods_info": copy.deepcopy(
-                pmodata["bioinformatics_methods_info"]
-            ),
-            "bioinformatics_run_info": copy.deepcopy(
-                pmodata["bioinformatics_run_info"]
-            ),
+            "bioinformatics_methods_info": take(pmodata["bioinformatics_methods_info"]),
+            "bioinformatics_run_info": take(pmodata["bioinformatics_run_info"]),
             "specimen_info": [],
             "library_sample_info": [],
-            "project_info": copy.deepcopy(pmodata["project_info"]),
+            "project_info": take(pmodata["project_info"]),
             "detected_microhaplotypes": [],
         }
         if "read_counts_by_stage" in pmodata:
@@ -613,9 +963,7 @@ class PMOProcessor:
             )
         for specimen_id in specimen_ids:
             specimen_id_index_key[specimen_id] = len(pmo_out["specimen_info"])
-            pmo_out["specimen_info"].append(
-                copy.deepcopy(pmodata["specimen_info"][specimen_id])
-            )
+            pmo_out["specimen_info"].append(take(pmodata["specimen_info"][specimen_id]))
 
         # library_sample_info
         library_id_index_key = {}
@@ -623,15 +971,15 @@ class PMOProcessor:
             library_id_index_key[library_sample_id] = len(
                 pmo_out["library_sample_info"]
             )
+            # update specimen_id
             pmo_out["library_sample_info"].append(
-                copy.deepcopy(pmodata["library_sample_info"][library_sample_id])
+                take_with_update(
+                    pmodata["library_sample_info"][library_sample_id],
+                    specimen_id=specimen_id_index_key[
+                        pmodata["library_sample_info"][library_sample_id]["specimen_id"]
+                    ],
+                )
             )
-            # update specimen_id
-            pmo_out["library_sample_info"][len(pmo_out["library_sample_info"]) - 1][
-                "specimen_id"
-            ] = specimen_id_index_key[
-                pmodata["library_sample_info"][library_sample_id]["specimen_id"]
-            ]
 
         # detected_microhaplotypes
         for detected_microhaplotypes in pmodata["detected_microhaplotypes"]:
@@ -643,15 +991,15 @@ class PMOProcessor:
             }
             for sample in detected_microhaplotypes["library_samples"]:
                 if sample["library_sample_id"] in library_sample_ids:
+                    # update library_sample_id
                     new_detected_microhaplotypes["library_samples"].append(
-                        copy.deepcopy(sample)
+                        take_with_update(
+                            sample,
+                            library_sample_id=library_id_index_key[
+                                sample["library_sample_id"]
+                            ],
+                        )
                     )
-                    # update library_sample_id
-                    new_detected_microhaplotypes["library_samples"][
-                        len(new_detected_microhaplotypes["library_samples"]) - 1
-                    ]["library_sample_id"] = library_id_index_key[
-                        sample["library_sample_id"]
-                    ]
             pmo_out["detected_microhaplotypes"].append(new_detected_microhaplotypes)
         # read_counts_by_stage
         if "read_counts_by_stage" in pmodata:
@@ -662,42 +1010,53 @@ class PMOProcessor:
                 }
                 for sample in read_count["read_counts_by_library_sample_by_stage"]:
                     if sample["library_sample_id"] in library_sample_ids:
-                        new_read_count["read_counts_by_library_sample_by_stage"].append(
-                            copy.deepcopy(sample)
-                        )
                         # update library_sample_id
-                        new_read_count["read_counts_by_library_sample_by_stage"][
-                            len(
-                                new_read_count["read_counts_by_library_sample_by_stage"]
+                        new_read_count["read_counts_by_library_sample_by_stage"].append(
+                            take_with_update(
+                                sample,
+                                library_sample_id=library_id_index_key[
+                                    sample["library_sample_id"]
+                                ],
                             )
-                            - 1
-                        ]["library_sample_id"] = library_id_index_key[
-                            sample["library_sample_id"]
-                        ]
+                        )
         return pmo_out
 
     @staticmethod
-    def filter_pmo_by_library_sample_names(pmodata, library_sample_names: set[str]):
+    def filter_pmo_by_library_sample_names(
+        pmodata,
+        library_sample_names: set[str],
+        pmo_index: PMOIndex = None,
+        share_unchanged: bool = False,
+    ):
         """
         Filters pmodata by library sample names
         :param pmodata: the pmodata object
         :param library_sample_names: set of library sample names, will be converted into indexes to extract out
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :param share_unchanged: if True, share unchanged sections and records with pmodata rather than deep copying them
         :return: filtered pmodata object containing only the indexes
         """
         library_sample_names_list = sorted(list(library_sample_names))
         library_sample_ids_list = PMOProcessor.get_index_of_library_sample_names(
-            pmodata, library_sample_names_list
+            pmodata, library_sample_names_list, pmo_index
         )
         return PMOProcessor.filter_pmo_by_library_sample_ids(
-            pmodata, set(library_sample_ids_list)
+            pmodata, set(library_sample_ids_list), share_unchanged
         )
 
     @staticmethod
-    def filter_pmo_by_specimen_ids(pmodata, specimen_ids: set[int]):
+    def filter_pmo_by_specimen_ids(
+        pmodata,
+        specimen_ids: set[int],
+        pmo_index: PMOIndex = None,
+        share_unchanged: bool = False,
+    ):
         """
         Extract out of a load PMO the data associated with select specimen_ids
         :param pmodata:the loaded PMO
         :param specimen_ids: the specimen_ids to extract the info for
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :param share_unchanged: if True, share unchanged sections and records with pmodata rather than deep copying them
         :return: a new PMO with only the data associated with the supplied specimen_ids
         """
         # check to make sure the supplied specimens actually exist within the data
@@ -711,7 +1070,9 @@ class PMOProcessor:
         if len(warnings) > 0:
             raise Exception("\n".join(warnings))
         library_sample_ids_for_specimen_ids = (
-            PMOProcessor.get_library_ids_for_specimen_ids(pmodata, specimen_ids)
+            PMOProcessor.get_library_ids_for_specimen_ids(
+                pmodata, specimen_ids, pmo_index
+            )
         )
         all_library_sample_ids = {
             exp_samp
@@ -719,29 +1080,45 @@ class PMOProcessor:
             for exp_samp in spec
         }
         return PMOProcessor.filter_pmo_by_library_sample_ids(
-            pmodata, all_library_sample_ids
+            pmodata, all_library_sample_ids, share_unchanged
         )
 
     @staticmethod
-    def filter_pmo_by_specimen_names(pmodata, specimen_names: set[str]):
+    def filter_pmo_by_specimen_names(
+        pmodata,
+        specimen_names: set[str],
+        pmo_index: PMOIndex = None,
+        share_unchanged: bool = False,
+    ):
         """
         Extract out of a load PMO the data associated with select specimen_ids
         :param pmodata:the loaded PMO
         :param specimen_names: the specimen_names to extract the info for
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :param share_unchanged: if True, share unchanged sections and records with pmodata rather than deep copying them
         :return: a new PMO with only the data associated with the supplied specimen_names
         """
         specimen_names_list = sorted(list(specimen_names))
         specimen_ids_list = PMOProcessor.get_index_of_specimen_names(
-            pmodata, specimen_names_list
+            pmodata, specimen_names_list, pmo_index
+        )
+        return PMOProcessor.filter_pmo_by_specimen_ids(
+            pmodata, set(specimen_ids_list), pmo_index, share_unchanged
         )
-        return PMOProcessor.filter_pmo_by_specimen_ids(pmodata, set(specimen_ids_list))
 
     @staticmethod
-    def filter_pmo_by_target_ids(pmodata, target_ids: set[int]):
+    def filter_pmo_by_target_ids(
+        pmodata,
+        target_ids: set[int],
+        pmo_index: PMOIndex = None,
+        share_unchanged: bool = False,
+    ):
         """
         Extract out data from the PMO for only select target IDs
         :param pmodata: the pmo to extract data from
         :param target_ids: the target_ids to extract
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :param share_unchanged: if True, unchanged sections and records are shared with pmodata rather than deep copied, so the result only costs memory in proportion to what was changed, but then neither PMO should be modified in place (copy.deepcopy the result first if it needs modifying)
         :return: a new pmo with the data for only the targets supplied
         """
         # create a new pmo out
@@ -753,9 +1130,9 @@ class PMOProcessor:
                 warnings.append(
                     f"{target_id} out of range of target_info, length is {len(pmodata['target_info'])}"
                 )
-        target_ids_in_representative_microhaplotypes = []
-        for target in pmodata["representative_microhaplotypes"]["targets"]:
-            target_ids_in_representative_microhaplotypes.append(target["target_id"])
+        target_ids_in_representative_microhaplotypes = PMOIndex.for_pmo(
+            pmodata, pmo_index
+        ).target_id_representative_index
         for target_id in target_ids:
             if target_id not in target_ids_in_representative_microhaplotypes:
                 warnings.append(
@@ -765,19 +1142,17 @@ class PMOProcessor:
         if len(warnings) > 0:
             raise Exception("\n".join(warnings))
 
+        take = PMOProcessor._taker(share_unchanged)
+        take_with_update = PMOProcessor._updating_taker(share_unchanged)
         pmo_out = {
-            "pmo_header": copy.deepcopy(pmodata["pmo_header"]),
-            "sequencing_info": copy.deepcopy(pmodata["sequencing_info"]),
-            "specimen_info": copy.deepcopy(pmodata["specimen_info"]),
-            "project_info": copy.deepcopy(pmodata["project_info"]),
-            "library_sample_info": copy.deepcopy(pmodata["library_sample_info"]),
-            "bioinformatics_methods_info": copy.deepcopy(
-                pmodata["bioinformatics_methods_info"]
-            ),
-            "bioinformatics_run_info": copy.deepcopy(
-                pmodata["bioinformatics_run_info"]
-            ),
-            "targeted_genomes": copy.deepcopy(pmodata["targeted_genomes"]),
+            "pmo_header": take(pmodata["pmo_header"]),
+            "sequencing_info": take(pmodata["sequencing_info"]),
+            "specimen_info": take(pmodata["specimen_info"]),
+            "project_info": take(pmodata["project_info"]),
+            "library_sample_info": take(pmodata["library_sample_info"]),
+            "bioinformatics_methods_info": take(pmodata["bioinformatics_methods_info"]),
+            "bioinformatics_run_info": take(pmodata["bioinformatics_run_info"]),
+            "targeted_genomes": take(pmodata["targeted_genomes"]),
             "target_info": [],
         }
         # function will update target_info, panel_info, representative_microhaplotypes, detected_microhaplotypes, read_counts_by_stage based
@@ -791,7 +1166,7 @@ class PMOProcessor:
         for target_info_id, target_info in enumerate(pmodata["target_info"]):
             if target_info_id in target_ids:
                 target_info_index_key[target_info_id] = len(pmo_out["target_info"])
-                pmo_out["target_info"].append(copy.deepcopy(target_info))
+                pmo_out["target_info"].append(take(target_info))
 
         # panel_info
         pmo_out["panel_info"] = []
@@ -822,11 +1197,11 @@ class PMOProcessor:
                     pmo_out["representative_microhaplotypes"]["targets"]
                 )
                 # update new target_id index
-                microhap_info["target_id"] = target_info_index_key[
-                    microhap_info["target_id"]
-                ]
                 pmo_out["representative_microhaplotypes"]["targets"].append(
-                    copy.deepcopy(microhap_info)
+                    take_with_update(
+                        microhap_info,
+                        target_id=target_info_index_key[microhap_info["target_id"]],
+                    )
                 )
         # representative_microhaplotypes
         pmo_out["detected_microhaplotypes"] = []
@@ -845,10 +1220,14 @@ class PMOProcessor:
                 for target in sample["target_results"]:
                     if target["mhaps_target_id"] in mhaps_target_id_new_key:
                         # update with new mhaps_target_id id
-                        target["mhaps_target_id"] = mhaps_target_id_new_key[
-                            target["mhaps_target_id"]
-                        ]
-                        new_sample["target_results"].append(copy.deepcopy(target))
+                        new_sample["target_results"].append(
+                            take_with_update(
+                                target,
+                                mhaps_target_id=mhaps_target_id_new_key[
+                                    target["mhaps_target_id"]
+                                ],
+                            )
+                        )
                 new_detected_microhaplotypes["library_samples"].append(new_sample)
             pmo_out["detected_microhaplotypes"].append(new_detected_microhaplotypes)
 
@@ -874,11 +1253,13 @@ class PMOProcessor:
                         for target in sample["read_counts_for_targets"]:
                             if target["target_id"] in target_ids:
                                 # update with new target_id index
-                                target["target_id"] = target_info_index_key[
-                                    target["target_id"]
-                                ]
                                 new_samples["read_counts_for_targets"].append(
-                                    copy.deepcopy(target)
+                                    take_with_update(
+                                        target,
+                                        target_id=target_info_index_key[
+                                            target["target_id"]
+                                        ],
+                                    )
                                 )
                     new_read_counts_by_bioid[
                         "read_counts_by_library_sample_by_stage"
@@ -887,26 +1268,34 @@ class PMOProcessor:
         return pmo_out
 
     @staticmethod
-    def filter_pmo_by_target_names(pmodata, target_names: set[str]):
+    def filter_pmo_by_target_names(
+        pmodata,
+        target_names: set[str],
+        pmo_index: PMOIndex = None,
+        share_unchanged: bool = False,
+    ):
         """
         Extract out data from the PMO for only select target IDs
         :param pmodata: the pmo to extract data from
         :param target_names: the target_names to extract
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :param share_unchanged: if True, share unchanged sections and records with pmodata rather than deep copying them
         :return: a new pmo with the data for only the targets supplied
         """
         target_names_list = sorted(list(target_names))
         target_ids_list = PMOProcessor.get_index_of_target_names(
-            pmodata, target_names_list
+            pmodata, target_names_list, pmo_index
+        )
+        return PMOProcessor.filter_pmo_by_target_ids(
+            pmodata, set(target_ids_list), pmo_index, share_unchanged
         )
-        return PMOProcessor.filter_pmo_by_target_ids(pmodata, set(target_ids_list))
 
     @staticmethod
-    def extract_from_pmo_samples_with_meta_groupings(pmodata, meta_fields_values: str):
+    def parse_meta_fields_values(meta_fields_values: str) -> dict:
         """
-        Extract out of a PMO the data associated with specimens that belong to specific meta data groupings
-        :param pmodata: the PMO to extract from
-        :param meta_fields_values: Meta Fields to include, should either be a table with columns field, values (comma separated values) (and optionally group) or supplied command line as field1=value1,value2,value3:field2=value1,value2;field1=value5,value6, where each group is separated by a semicolon
-        :return: a pmodata with the input meta
+        Parse meta field criteria into groups of criteria
+        :param meta_fields_values: Meta Fields to include, should either be a table with columns field, values (comma separated values) (and optionally group) or supplied command line as field1=value1,value2,value3:field2=value1,value2;field1=value5,value6, where each group is separated by a semicolon. A value given as low..high selects a numeric or date range, see SpecimenMetaIndex
+        :return: key1: group, key2: field, val: the accepted values of the field
         """
         selected_meta_groups = {}
         # parse meta values
@@ -944,13 +1333,24 @@ class PMOProcessor:
                     values_toks = field_values_toks[1].split(",")
                     group_criteria[field_values_toks[0]] = values_toks
                 selected_meta_groups[idx] = group_criteria
+        return selected_meta_groups
 
-        # get count of fields
-        fields_counts = PMOProcessor.count_specimen_per_meta_fields(pmodata)
-
+    @staticmethod
+    def check_meta_fields_present(
+        pmodata, selected_meta_groups: dict, pmo_index: PMOIndex = None
+    ):
+        """
+        Check that the fields in parsed meta criteria are present in the specimen_info of a PMO, throws an exception listing any that are missing
+        :param pmodata: the PMO to check
+        :param selected_meta_groups: the parsed meta criteria, see parse_meta_fields_values
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :return: nothing
+        """
         # check to see if the fields supplied actually exit
         warnings = []
-        fields_found = fields_counts["field"].tolist()
+        fields_found = set(
+            PMOIndex.for_pmo(pmodata, pmo_index).specimen_meta_index.fields
+        )
         for group in selected_meta_groups.values():
             for field in group.keys():
                 if field not in fields_found:
@@ -958,19 +1358,35 @@ class PMOProcessor:
         if len(warnings) > 0:
             raise Exception("\n".join(warnings))
 
-        group_counts = defaultdict(int)
-        all_specimen_names = []
-        for specimen in pmodata["specimen_info"]:
-            for group_name, meta in selected_meta_groups.items():
-                passes_criteria = True
-                for field, values in meta.items():
-                    if not (field in specimen and str(specimen[field]) in values):
-                        passes_criteria = False
-                        break
-                if passes_criteria:
-                    group_counts[group_name] += 1
-                    specimen_name = specimen["specimen_name"]
-                    all_specimen_names.append(specimen_name)
+    @staticmethod
+    def extract_from_pmo_samples_with_meta_groupings(
+        pmodata,
+        meta_fields_values: str,
+        pmo_index: PMOIndex = None,
+        share_unchanged: bool = False,
+    ):
+        """
+        Extract out of a PMO the data associated with specimens that belong to specific meta data groupings
+        :param pmodata: the PMO to extract from
+        :param meta_fields_values: Meta Fields to include, should either be a table with columns field, values (comma separated values) (and optionally group) or supplied command line as field1=value1,value2,value3:field2=value1,value2;field1=value5,value6, where each group is separated by a semicolon
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :param share_unchanged: if True, share unchanged sections and records with pmodata rather than deep copying them
+        :return: a pmodata with the input meta
+        """
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        selected_meta_groups = PMOProcessor.parse_meta_fields_values(meta_fields_values)
+        PMOProcessor.check_meta_fields_present(pmodata, selected_meta_groups, pmo_index)
+
+        group_specimens = pmo_index.specimen_meta_index.select_groups(
+            selected_meta_groups
+        )
+        group_counts = {
+            group_name: specimens.bit_count()
+            for group_name, specimens in group_specimens.items()
+        }
+        all_specimens = 0
+        for specimens in group_specimens.values():
+            all_specimens |= specimens
         # Convert selected_meta_groups to a DataFrame
         group_counts_df = pd.DataFrame.from_dict(selected_meta_groups, orient="index")
 
@@ -984,52 +1400,50 @@ class PMOProcessor:
         )
         group_counts_df.index.name = "group"
 
-        all_specimen_ids = set(
-            PMOProcessor.get_index_of_specimen_names(pmodata, all_specimen_names)
-        )
+        all_specimen_ids = set(SpecimenMetaIndex.bitset_to_ids(all_specimens))
 
-        pmo_out = PMOProcessor.filter_pmo_by_specimen_ids(pmodata, all_specimen_ids)
+        pmo_out = PMOProcessor.filter_pmo_by_specimen_ids(
+            pmodata, all_specimen_ids, pmo_index, share_unchanged
+        )
 
         return pmo_out, group_counts_df
 
     @staticmethod
-    def extract_from_pmo_with_read_filter(pmodata, read_filter: float):
+    def extract_from_pmo_with_read_filter(
+        pmodata, read_filter: float, share_unchanged: bool = False
+    ):
         """
         Extract out data from the PMO with inconclusive read filter
         :param pmodata: the pmo to extract data from
         :param read_filter: the read filter to use, inconclusive filter
+        :param share_unchanged: if True, unchanged sections and records are shared with pmodata rather than deep copied, so the result only costs memory in proportion to what was changed, but then neither PMO should be modified in place (copy.deepcopy the result first if it needs modifying)
         :return: a new pmodata with the data only with detected microhaplotypes above this read filter
         """
         # create a new pmo out
         # majority will be the same, just filtering detected microhaplotypes based on read counts
         # @todo consider updating representative_microhaplotypes if certain microhaplotypes are no longer detected in any sample with the given filter
+        take = PMOProcessor._taker(share_unchanged)
         pmo_out = {
-            "pmo_header": copy.deepcopy(pmodata["pmo_header"]),
-            "panel_info": copy.deepcopy(pmodata["panel_info"]),
-            "sequencing_info": copy.deepcopy(pmodata["sequencing_info"]),
-            "target_info": copy.deepcopy(pmodata["target_info"]),
-            "specimen_info": copy.deepcopy(pmodata["specimen_info"]),
-            "library_sample_info": copy.deepcopy(pmodata["library_sample_info"]),
-            "project_info": copy.deepcopy(pmodata["project_info"]),
-            "targeted_genomes": copy.deepcopy(pmodata["targeted_genomes"]),
-            "representative_microhaplotypes": copy.deepcopy(
+            "pmo_header": take(pmodata["pmo_header"]),
+            "panel_info": take(pmodata["panel_info"]),
+            "sequencing_info": take(pmodata["sequencing_info"]),
+            "target_info": take(pmodata["target_info"]),
+            "specimen_info": take(pmodata["specimen_info"]),
+            "library_sample_info": take(pmodata["library_sample_info"]),
+            "project_info": take(pmodata["project_info"]),
+            "targeted_genomes": take(pmodata["targeted_genomes"]),
+            "representative_microhaplotypes": take(
                 pmodata["representative_microhaplotypes"]
             ),
-            "bioinformatics_methods_info": copy.deepcopy(
-                pmodata["bioinformatics_methods_info"]
-            ),
-            "bioinformatics_run_info": copy.deepcopy(
-                pmodata["bioinformatics_run_info"]
-            ),
+            "bioinformatics_methods_info": take(pmodata["bioinformatics_methods_info"]),
+            "bioinformatics_run_info": take(pmodata["bioinformatics_run_info"]),
             "detected_microhaplotypes": [],
         }
         # if has optional read_counts_by_stage then add as well
         # if does contain, @todo consider updating with new counts now that a filter has been applied
 
         if "read_counts_by_stage" in pmodata:
-            pmo_out["read_counts_by_stage"] = copy.deepcopy(
-                pmodata["read_counts_by_stage"]
-            )
+            pmo_out["read_counts_by_stage"] = take(pmodata["read_counts_by_stage"])
 
         # detected_microhaplotypes
         for detected_microhaplotypes in pmodata["detected_microhaplotypes"]:
@@ -1048,7 +1462,7 @@ class PMOProcessor:
                     microhaps_for_target = []
                     for microhap in target["mhaps"]:
                         if microhap["reads"] >= read_filter:
-                            microhaps_for_target.append(copy.deepcopy(microhap))
+                            microhaps_for_target.append(take(microhap))
                     if len(microhaps_for_target) > 0:
                         targets_for_samples["target_results"].append(
                             {
@@ -1062,3 +1476,678 @@ class PMOProcessor:
                     )
             pmo_out["detected_microhaplotypes"].append(extracted_microhaps_for_id)
         return pmo_out
+
+    @staticmethod
+    def filter_pmo(
+        pmodata,
+        filter_spec: PMOFilterSpec,
+        pmo_index: PMOIndex = None,
+        share_unchanged: bool = False,
+    ):
+        """
+        Extract out of a PMO the data passing all the selections of a filter spec, building the new PMO in one pass instead of chaining the filter_pmo_by_* and extract_from_pmo_* functions
+        :param pmodata: the PMO to extract from
+        :param filter_spec: the selections to apply
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :param share_unchanged: if True, share unchanged sections and records with pmodata rather than deep copying them
+        :return: a new PMO with only the data passing the selections, when microhaplotypes are filtered by reads any target or library sample left without microhaplotypes is dropped
+        """
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        take = PMOProcessor._taker(share_unchanged)
+        take_with_update = PMOProcessor._updating_taker(share_unchanged)
+
+        # determine the library samples to keep, None means keep all
+        warnings = []
+        library_sample_ids = None
+        if filter_spec.specimen_names is not None:
+            specimen_library_sample_ids = pmo_index.specimen_library_sample_ids
+            selected = set()
+            for specimen_name in filter_spec.specimen_names:
+                if specimen_name not in pmo_index.specimen_name_index:
+                    warnings.append(f"{specimen_name} not in specimen_info")
+                    continue
+                selected.update(
+                    specimen_library_sample_ids.get(
+                        pmo_index.specimen_name_index[specimen_name], []
+                    )
+                )
+            library_sample_ids = selected
+        if filter_spec.library_sample_names is not None:
+            selected = set()
+            for library_sample_name in filter_spec.library_sample_names:
+                if library_sample_name not in pmo_index.library_sample_name_index:
+                    warnings.append(f"{library_sample_name} not in library_sample_info")
+                    continue
+                selected.add(pmo_index.library_sample_name_index[library_sample_name])
+            library_sample_ids = (
+                selected
+                if library_sample_ids is None
+                else library_sample_ids & selected
+            )
+        if filter_spec.meta_fields_values is not None:
+            selected_meta_groups = PMOProcessor.parse_meta_fields_values(
+                filter_spec.meta_fields_values
+            )
+            PMOProcessor.check_meta_fields_present(
+                pmodata, selected_meta_groups, pmo_index
+            )
+            selected_specimens = 0
+            for specimens in pmo_index.specimen_meta_index.select_groups(
+                selected_meta_groups
+            ).values():
+                selected_specimens |= specimens
+            selected = set()
+            for library_sample_id, specimen_id in enumerate(
+                pmo_index.library_sample_specimen_ids
+            ):
+                if selected_specimens >> specimen_id & 1:
+                    selected.add(library_sample_id)
+            library_sample_ids = (
+                selected
+                if library_sample_ids is None
+                else library_sample_ids & selected
+            )
+
+        # determine the targets to keep, None means keep all
+        target_ids = None
+        if filter_spec.target_names is not None:
+            target_ids = set()
+            for target_name in filter_spec.target_names:
+                if target_name not in pmo_index.target_name_index:
+                    warnings.append(f"{target_name} not in target_info")
+                elif (
+                    pmo_index.target_name_index[target_name]
+                    not in pmo_index.target_id_representative_index
+                ):
+                    warnings.append(
+                        f'{target_name} not in pmodata["representative_microhaplotypes"]'
+                    )
+                else:
+                    target_ids.add(pmo_index.target_name_index[target_name])
+        if len(warnings) > 0:
+            raise Exception("\n".join(warnings))
+
+        pmo_out = {
+            "pmo_header": take(pmodata["pmo_header"]),
+            "sequencing_info": take(pmodata["sequencing_info"]),
+            "targeted_genomes": take(pmodata["targeted_genomes"]),
+            "bioinformatics_methods_info": take(pmodata["bioinformatics_methods_info"]),
+            "bioinformatics_run_info": take(pmodata["bioinformatics_run_info"]),
+            "project_info": take(pmodata["project_info"]),
+        }
+
+        # specimen_info, library_sample_info
+        # key=old library_sample_id, value=new library_sample_id
+        library_id_index_key = None
+        if library_sample_ids is None:
+            pmo_out["specimen_info"] = take(pmodata["specimen_info"])
+            pmo_out["library_sample_info"] = take(pmodata["library_sample_info"])
+        else:
+            specimen_id_index_key = {
+                specimen_id: idx
+                for idx, specimen_id in enumerate(
+                    sorted(
+                        {
+                            pmo_index.library_sample_specimen_ids[library_sample_id]
+                            for library_sample_id in library_sample_ids
+                        }
+                    )
+                )
+            }
+            pmo_out["specimen_info"] = [
+                take(pmodata["specimen_info"][specimen_id])
+                for specimen_id in specimen_id_index_key
+            ]
+            library_id_index_key = {
+                library_sample_id: idx
+                for idx, library_sample_id in enumerate(sorted(library_sample_ids))
+            }
+            pmo_out["library_sample_info"] = [
+                take_with_update(
+                    pmodata["library_sample_info"][library_sample_id],
+                    specimen_id=specimen_id_index_key[
+                        pmo_index.library_sample_specimen_ids[library_sample_id]
+                    ],
+                )
+                for library_sample_id in library_id_index_key
+            ]
+
+        # target_info, panel_info, representative_microhaplotypes
+        # key=old target_id, value=new target_id
+        target_info_index_key = None
+        # key=old mhaps_target_id, value=new mhaps_target_id
+        mhaps_target_id_new_key = None
+        if target_ids is None:
+            pmo_out["target_info"] = take(pmodata["target_info"])
+            pmo_out["panel_info"] = take(pmodata["panel_info"])
+            pmo_out["representative_microhaplotypes"] = take(
+                pmodata["representative_microhaplotypes"]
+            )
+        else:
+            target_info_index_key = {
+                target_id: idx for idx, target_id in enumerate(sorted(target_ids))
+            }
+            pmo_out["target_info"] = [
+                take(pmodata["target_info"][target_id])
+                for target_id in target_info_index_key
+            ]
+            pmo_out["panel_info"] = []
+            for panel_info in pmodata["panel_info"]:
+                new_reactions = []
+                for reaction in panel_info["reactions"]:
+                    panel_targets = [
+                        target_info_index_key[panel_target_id]
+                        for panel_target_id in reaction["panel_targets"]
+                        if panel_target_id in target_info_index_key
+                    ]
+                    if len(panel_targets) > 0:
+                        new_reactions.append(
+                            take_with_update(reaction, panel_targets=panel_targets)
+                        )
+                pmo_out["panel_info"].append(
+                    take_with_update(panel_info, reactions=new_reactions)
+                )
+            mhaps_target_id_new_key = {}
+            representative_targets = []
+            for microhap_info_index, microhap_info in enumerate(
+                pmodata["representative_microhaplotypes"]["targets"]
+            ):
+                if microhap_info["target_id"] in target_info_index_key:
+                    mhaps_target_id_new_key[microhap_info_index] = len(
+                        representative_targets
+                    )
+                    representative_targets.append(
+                        take_with_update(
+                            microhap_info,
+                            target_id=target_info_index_key[microhap_info["target_id"]],
+                        )
+                    )
+            pmo_out["representative_microhaplotypes"] = take_with_update(
+                pmodata["representative_microhaplotypes"],
+                targets=representative_targets,
+            )
+
+        # detected_microhaplotypes
+        filters_microhaplotypes = filter_spec.filters_microhaplotypes()
+        pmo_out["detected_microhaplotypes"] = []
+        for detected_microhaplotypes in pmodata["detected_microhaplotypes"]:
+            new_library_samples = []
+            for sample in detected_microhaplotypes["library_samples"]:
+                sample_updates = {}
+                if library_id_index_key is not None:
+                    if sample["library_sample_id"] not in library_id_index_key:
+                        continue
+                    sample_updates["library_sample_id"] = library_id_index_key[
+                        sample["library_sample_id"]
+                    ]
+                if mhaps_target_id_new_key is None and not filters_microhaplotypes:
+                    new_library_samples.append(
+                        take_with_update(sample, **sample_updates)
+                    )
+                    continue
+                new_target_results = []
+                for target in sample["target_results"]:
+                    target_updates = {}
+                    if mhaps_target_id_new_key is not None:
+                        if target["mhaps_target_id"] not in mhaps_target_id_new_key:
+                            continue
+                        target_updates["mhaps_target_id"] = mhaps_target_id_new_key[
+                            target["mhaps_target_id"]
+                        ]
+                    if filters_microhaplotypes:
+                        min_target_reads = filter_spec.min_within_target_freq * sum(
+                            microhap["reads"] for microhap in target["mhaps"]
+                        )
+                        target_updates["mhaps"] = [
+                            take(microhap)
+                            for microhap in target["mhaps"]
+                            if microhap["reads"] >= filter_spec.min_reads
+                            and microhap["reads"] >= min_target_reads
+                        ]
+                        if len(target_updates["mhaps"]) == 0:
+                            continue
+                    new_target_results.append(
+                        take_with_update(target, **target_updates)
+                    )
+                if filters_microhaplotypes and len(new_target_results) == 0:
+                    continue
+                sample_updates["target_results"] = new_target_results
+                new_library_samples.append(take_with_update(sample, **sample_updates))
+            pmo_out["detected_microhaplotypes"].append(
+                take_with_update(
+                    detected_microhaplotypes, library_samples=new_library_samples
+                )
+            )
+
+        # read_counts_by_stage
+        if "read_counts_by_stage" in pmodata:
+            if library_id_index_key is None and target_info_index_key is None:
+                pmo_out["read_counts_by_stage"] = take(pmodata["read_counts_by_stage"])
+            else:
+                pmo_out["read_counts_by_stage"] = []
+                for read_count in pmodata["read_counts_by_stage"]:
+                    new_samples = []
+                    for sample in read_count["read_counts_by_library_sample_by_stage"]:
+                        sample_updates = {}
+                        if library_id_index_key is not None:
+                            if sample["library_sample_id"] not in library_id_index_key:
+                                continue
+                            sample_updates["library_sample_id"] = library_id_index_key[
+                                sample["library_sample_id"]
+                            ]
+                        if (
+                            target_info_index_key is not None
+                            and "read_counts_for_targets" in sample
+                        ):
+                            sample_updates["read_counts_for_targets"] = [
+                                take_with_update(
+                                    target,
+                                    target_id=target_info_index_key[
+                                        target["target_id"]
+                                    ],
+                                )
+                                for target in sample["read_counts_for_targets"]
+                                if target["target_id"] in target_info_index_key
+                            ]
+                        new_samples.append(take_with_update(sample, **sample_updates))
+                    pmo_out["read_counts_by_stage"].append(
+                        take_with_update(
+                            read_count,
+                            read_counts_by_library_sample_by_stage=new_samples,
+                        )
+                    )
+        # keep the section order and any additional sections of the input
+        return {
+            key: pmo_out[key] if key in pmo_out else take(value)
+            for key, value in pmodata.items()
+        }
+
+    @staticmethod
+    def partition_library_samples(
+        pmodata,
+        n_shards: int = None,
+        group_by_field: str = None,
+        pmo_index: PMOIndex = None,
+    ) -> dict[str, list[int]]:
+        """
+        Partition the library samples of a PMO into shards, the library samples of a specimen are always kept in the same shard
+        :param pmodata: the PMO to partition
+        :param n_shards: split into this many shards balanced by the number of detected microhaplotypes, named shard_0, shard_1, etc., shards that would be empty are left out
+        :param group_by_field: split into one shard per value of this specimen meta field, named by the value, specimens without the field go into the NA shard, project_name groups by the project of the specimens
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :return: key: shard name, val: the library_sample_ids of the shard in increasing order
+        """
+        if (n_shards is None) == (group_by_field is None):
+            raise Exception("Need to supply exactly one of n_shards or group_by_field")
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        specimen_library_sample_ids = pmo_index.specimen_library_sample_ids
+
+        if group_by_field is not None:
+            if (
+                group_by_field == "project_name"
+                and group_by_field not in pmo_index.specimen_meta_index.fields
+            ):
+                specimen_groups = [
+                    pmodata["project_info"][specimen["project_id"]]["project_name"]
+                    for specimen in pmodata["specimen_info"]
+                ]
+            else:
+                specimen_groups = [
+                    str(specimen.get(group_by_field, "NA"))
+                    for specimen in pmodata["specimen_info"]
+                ]
+            ret = defaultdict(list)
+            for specimen_id, group in enumerate(specimen_groups):
+                if specimen_id in specimen_library_sample_ids:
+                    ret[group].extend(specimen_library_sample_ids[specimen_id])
+            return {group: sorted(ids) for group, ids in ret.items()}
+
+        if n_shards < 1:
+            raise Exception("n_shards must be at least 1, not " + str(n_shards))
+        # weigh each library sample by its number of detected microhaplotypes, plus 1 so ones without any still spread out
+        library_sample_weights = (
+            np.bincount(
+                PMOProcessor.get_pmo_frame(pmodata, pmo_index).library_sample_id,
+                minlength=len(pmodata["library_sample_info"]),
+            )
+            + 1
+        )
+        specimen_weights = sorted(
+            (
+                (-int(library_sample_weights[library_sample_ids].sum()), specimen_id)
+                for specimen_id, library_sample_ids in specimen_library_sample_ids.items()
+            )
+        )
+        # place the heaviest specimens first, each onto the currently lightest shard
+        shard_loads = [(0, shard) for shard in range(n_shards)]
+        shards = [[] for _ in range(n_shards)]
+        for negative_weight, specimen_id in specimen_weights:
+            load, shard = heapq.heappop(shard_loads)
+            shards[shard].extend(specimen_library_sample_ids[specimen_id])
+            heapq.heappush(shard_loads, (load - negative_weight, shard))
+        return {
+            f"shard_{shard}": sorted(library_sample_ids)
+            for shard, library_sample_ids in enumerate(shards)
+            if len(library_sample_ids) > 0
+        }
+
+    @staticmethod
+    def split_pmo(
+        pmodata,
+        shard_library_sample_ids: dict[str, list[int]],
+        pmo_index: PMOIndex = None,
+        share_unchanged: bool = False,
+    ) -> dict[str, dict]:
+        """
+        Split a PMO into shards of library samples in one pass over its detected_microhaplotypes and read_counts_by_stage,
+        rather than filtering the whole PMO once per shard. Each shard is pruned with prune_unused_references so it only
+        holds the panels, targets, representative microhaplotypes, bioinformatics runs and projects it uses
+        :param pmodata: the PMO to split
+        :param shard_library_sample_ids: key: shard name, val: the library_sample_ids of the shard, see partition_library_samples
+        :param pmo_index: an optional PMOIndex of pmodata to reuse
+        :param share_unchanged: if True, share unchanged sections and records with pmodata rather than deep copying them
+        :return: key: shard name, val: the PMO of the shard
+        """
+        pmo_index = PMOIndex.for_pmo(pmodata, pmo_index)
+        # the shards are built sharing records with pmodata, prune_unused_references then copies them if needed
+        take = PMOProcessor._taker(True)
+        take_with_update = PMOProcessor._updating_taker(True)
+
+        # key=old library_sample_id, value=(shard position, new library_sample_id)
+        library_id_shard_key = {}
+        warnings = []
+        for shard, library_sample_ids in enumerate(shard_library_sample_ids.values()):
+            for new_id, library_sample_id in enumerate(sorted(library_sample_ids)):
+                if library_sample_id >= len(pmodata["library_sample_info"]):
+                    warnings.append(
+                        f"{library_sample_id} id is beyond the length of library_sample_info: "
+                        + str(len(pmodata["library_sample_info"]))
+                    )
+                elif library_sample_id in library_id_shard_key:
+                    warnings.append(
+                        f"{library_sample_id} library_sample_id is in more than one shard"
+                    )
+                else:
+                    library_id_shard_key[library_sample_id] = (shard, new_id)
+        if len(warnings) > 0:
+            raise Exception("\n".join(warnings))
+
+        shards = []
+        for library_sample_ids in shard_library_sample_ids.values():
+            library_sample_ids = sorted(library_sample_ids)
+            specimen_id_index_key = {
+                specimen_id: idx
+                for idx, specimen_id in enumerate(
+                    sorted(
+                        {
+                            pmo_index.library_sample_specimen_ids[library_sample_id]
+                            for library_sample_id in library_sample_ids
+                        }
+                    )
+                )
+            }
+            shards.append(
+                {
+                    "specimen_info": [
+                        take(pmodata["specimen_info"][specimen_id])
+                        for specimen_id in specimen_id_index_key
+                    ],
+                    "library_sample_info": [
+                        take_with_update(
+                            pmodata["library_sample_info"][library_sample_id],
+                            specimen_id=specimen_id_index_key[
+                                pmo_index.library_sample_specimen_ids[library_sample_id]
+                            ],
+                        )
+                        for library_sample_id in library_sample_ids
+                    ],
+                    "detected_microhaplotypes": [],
+                }
+            )
+
+        # detected_microhaplotypes and read_counts_by_stage, each library sample is sent to its shard in one pass
+        sections = [("detected_microhaplotypes", "library_samples")]
+        if "read_counts_by_stage" in pmodata:
+            sections.append(
+                ("read_counts_by_stage", "read_counts_by_library_sample_by_stage")
+            )
+            for shard_out in shards:
+                shard_out["read_counts_by_stage"] = []
+        for section, samples_key in sections:
+            for block in pmodata[section]:
+                shard_samples = [[] for _ in shards]
+                for sample in block[samples_key]:
+                    if sample["library_sample_id"] not in library_id_shard_key:
+                        continue
+                    shard, new_id = library_id_shard_key[sample["library_sample_id"]]
+                    shard_samples[shard].append(
+                        take_with_update(sample, library_sample_id=new_id)
+                    )
+                for shard_out, samples in zip(shards, shard_samples):
+                    shard_out[section].append(
+                        take_with_update(block, **{samples_key: samples})
+                    )
+
+        ret = {}
+        for shard_name, shard_out in zip(shard_library_sample_ids, shards):
+            # keep the section order and any additional sections of the input
+            shard_pmo = {
+                key: shard_out[key] if key in shard_out else value
+                for key, value in pmodata.items()
+            }
+            ret[shard_name] = PMOProcessor.prune_unused_references(
+                shard_pmo, share_unchanged
+            )
+        return ret
+
+    @staticmethod
+    def prune_unused_references(pmodata, share_unchanged: bool = False):
+        """
+        Remove the panels, targets, representative microhaplotypes, bioinformatics runs (and their methods) and projects
+        that nothing in the PMO refers to anymore, e.g. after extracting a subset of its library samples, and update the ids that refer to them.
+        Kept panels keep all their targets, empty detected_microhaplotypes and read_counts_by_stage blocks are removed
+        :param pmodata: the PMO to prune
+        :param share_unchanged: if True, share unchanged sections and records with pmodata rather than deep copying them
+        :return: a new pruned PMO
+        """
+        take = PMOProcessor._taker(share_unchanged)
+        take_with_update = PMOProcessor._updating_taker(share_unchanged)
+
+        def new_index_key(used_ids) -> dict[int, int]:
+            return {old_id: idx for idx, old_id in enumerate(sorted(used_ids))}
+
+        detected_blocks = [
+            block
+            for block in pmodata["detected_microhaplotypes"]
+            if len(block["library_samples"]) > 0
+        ]
+        read_count_blocks = [
+            block
+            for block in pmodata.get("read_counts_by_stage", [])
+            if len(block["read_counts_by_library_sample_by_stage"]) > 0
+        ]
+
+        # the ids in use
+        run_id_key = new_index_key(
+            {block["bioinformatics_run_id"] for block in detected_blocks}
+            | {block["bioinformatics_run_id"] for block in read_count_blocks}
+        )
+        methods_id_key = new_index_key(
+            {
+                pmodata["bioinformatics_run_info"][run_id]["bioinformatics_methods_id"]
+                for run_id in run_id_key
+            }
+        )
+        panel_id_key = new_index_key(
+            {
+                library_sample["panel_id"]
+                for library_sample in pmodata["library_sample_info"]
+            }
+        )
+        project_id_key = new_index_key(
+            {specimen["project_id"] for specimen in pmodata["specimen_info"]}
+        )
+        # key1: mhaps_target_id, key2: the mhap_ids detected for it
+        used_mhap_ids = defaultdict(set)
+        for block in detected_blocks:
+            for sample in block["library_samples"]:
+                for target in sample["target_results"]:
+                    mhap_ids = used_mhap_ids[target["mhaps_target_id"]]
+                    for microhap in target["mhaps"]:
+                        mhap_ids.add(microhap["mhap_id"])
+        mhaps_target_id_key = new_index_key(used_mhap_ids)
+        representative_targets = pmodata["representative_microhaplotypes"]["targets"]
+        used_target_ids = {
+            representative_targets[mhaps_target_id]["target_id"]
+            for mhaps_target_id in mhaps_target_id_key
+        }
+        for panel_id in panel_id_key:
+            for reaction in pmodata["panel_info"][panel_id]["reactions"]:
+                used_target_ids.update(reaction["panel_targets"])
+        for block in read_count_blocks:
+            for sample in block["read_counts_by_library_sample_by_stage"]:
+                for target in sample.get("read_counts_for_targets", []):
+                    used_target_ids.add(target["target_id"])
+        target_id_key = new_index_key(used_target_ids)
+        # key1: mhaps_target_id, key2: old mhap_id, val: new mhap_id, None when all of the target's microhaplotypes are used
+        mhap_id_keys = {
+            mhaps_target_id: None
+            if len(mhap_ids)
+            == len(representative_targets[mhaps_target_id]["microhaplotypes"])
+            else new_index_key(mhap_ids)
+            for mhaps_target_id, mhap_ids in used_mhap_ids.items()
+        }
+
+        pmo_out = {
+            "library_sample_info": [
+                take_with_update(
+                    library_sample, panel_id=panel_id_key[library_sample["panel_id"]]
+                )
+                for library_sample in pmodata["library_sample_info"]
+            ],
+            "specimen_info": [
+                take_with_update(
+                    specimen, project_id=project_id_key[specimen["project_id"]]
+                )
+                for specimen in pmodata["specimen_info"]
+            ],
+            "project_info": [
+                take(pmodata["project_info"][project_id])
+                for project_id in project_id_key
+            ],
+            "bioinformatics_methods_info": [
+                take(pmodata["bioinformatics_methods_info"][methods_id])
+                for methods_id in methods_id_key
+            ],
+            "bioinformatics_run_info": [
+                take_with_update(
+                    pmodata["bioinformatics_run_info"][run_id],
+                    bioinformatics_methods_id=methods_id_key[
+                        pmodata["bioinformatics_run_info"][run_id][
+                            "bioinformatics_methods_id"
+                        ]
+                    ],
+                )
+                for run_id in run_id_key
+            ],
+            "target_info": [
+                take(pmodata["target_info"][target_id]) for target_id in target_id_key
+            ],
+            "panel_info": [
+                take_with_update(
+                    pmodata["panel_info"][panel_id],
+                    reactions=[
+                        take_with_update(
+                            reaction,
+                            panel_targets=[
+                                target_id_key[target_id]
+                                for target_id in reaction["panel_targets"]
+                            ],
+                        )
+                        for reaction in pmodata["panel_info"][panel_id]["reactions"]
+                    ],
+                )
+                for panel_id in panel_id_key
+            ],
+        }
+
+        new_representative_targets = []
+        for mhaps_target_id in mhaps_target_id_key:
+            representative_target = representative_targets[mhaps_target_id]
+            target_updates = {
+                "target_id": target_id_key[representative_target["target_id"]]
+            }
+            if mhap_id_keys[mhaps_target_id] is not None:
+                target_updates["microhaplotypes"] = [
+                    take(representative_target["microhaplotypes"][mhap_id])
+                    for mhap_id in mhap_id_keys[mhaps_target_id]
+                ]
+            new_representative_targets.append(
+                take_with_update(representative_target, **target_updates)
+            )
+        pmo_out["representative_microhaplotypes"] = take_with_update(
+            pmodata["representative_microhaplotypes"],
+            targets=new_representative_targets,
+        )
+
+        pmo_out["detected_microhaplotypes"] = []
+        for block in detected_blocks:
+            new_library_samples = []
+            for sample in block["library_samples"]:
+                new_target_results = []
+                for target in sample["target_results"]:
+                    target_updates = {
+                        "mhaps_target_id": mhaps_target_id_key[
+                            target["mhaps_target_id"]
+                        ]
+                    }
+                    mhap_id_key = mhap_id_keys[target["mhaps_target_id"]]
+                    if mhap_id_key is not None:
+                        target_updates["mhaps"] = [
+                            take_with_update(
+                                microhap, mhap_id=mhap_id_key[microhap["mhap_id"]]
+                            )
+                            for microhap in target["mhaps"]
+                        ]
+                    new_target_results.append(
+                        take_with_update(target, **target_updates)
+                    )
+                new_library_samples.append(
+                    take_with_update(sample, target_results=new_target_results)
+                )
+            pmo_out["detected_microhaplotypes"].append(
+                take_with_update(
+                    block,
+                    bioinformatics_run_id=run_id_key[block["bioinformatics_run_id"]],
+                    library_samples=new_library_samples,
+                )
+            )
+
+        if "read_counts_by_stage" in pmodata:
+            pmo_out["read_counts_by_stage"] = []
+            for block in read_count_blocks:
+                new_samples = []
+                for sample in block["read_counts_by_library_sample_by_stage"]:
+                    sample_updates = {}
+                    if "read_counts_for_targets" in sample:
+                        sample_updates["read_counts_for_targets"] = [
+                            take_with_update(
+                                target, target_id=target_id_key[target["target_id"]]
+                            )
+                            for target in sample["read_counts_for_targets"]
+                        ]
+                    new_samples.append(take_with_update(sample, **sample_updates))
+                pmo_out["read_counts_by_stage"].append(
+                    take_with_update(
+                        block,
+                        bioinformatics_run_id=run_id_key[
+                            block["bioinformatics_run_id"]
+                        ],
+                        read_counts_by_library_sample_by_stage=new_samples,
+                    )
+                )
+        # keep the section order and any additional sections of the input
+        return {
+            key: pmo_out[key] if key in pmo_out else take(value)
+            for key, value in pmodata.items()
+        }
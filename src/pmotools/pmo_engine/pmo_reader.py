@@ -3,10 +3,14 @@ import copy
 import datetime
 import json
 import gzip
+import itertools
 import os
 import sys
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 from pmotools import __version__ as __pmotools_version__
+from pmotools.pmo_engine.pmo_cache import PMOCache
+from pmotools.pmo_engine.pmo_stream_reader import CombinedPMOSection
 
 
 class PMOReader:
@@ -15,41 +19,146 @@ class PMOReader:
     """
 
     @staticmethod
-    def read_in_pmo(fnp: str | os.PathLike[str]):
+    def read_in_pmo(
+        fnp: str | os.PathLike[str], cache_dir: str | os.PathLike[str] = None
+    ):
         """
         Read in a PMO file, can either be compressed(.gz) or uncompressed
         :param fnp: the file name path of the PMO file to read in
+        :param cache_dir: a directory to cache the parsed PMO in, see PMOCache, by default the PMOTOOLS_CACHE_DIR environment variable if set, otherwise the PMO isn't cached
         :return: a PMO like object
         """
         if "STDIN" == fnp:
-            pmo_data = json.load(sys.stdin)
+            return json.load(sys.stdin)
+        cache_dir = PMOCache.get_cache_dir(cache_dir)
+        if cache_dir is not None:
+            # taken before parsing so the entry is keyed on the file as it was when read
+            cache_header = PMOCache.file_header(fnp)
+            pmo_data = PMOCache.load(cache_header, cache_dir)
+            if pmo_data is not None:
+                return pmo_data
+        if str(fnp).endswith(".gz"):
+            with gzip.open(fnp) as f:
+                pmo_data = json.load(f)
         else:
-            if fnp.endswith(".gz"):
-                with gzip.open(fnp) as f:
-                    pmo_data = json.load(f)
-            else:
-                with open(fnp) as f:
-                    pmo_data = json.load(f)
+            with open(fnp) as f:
+                pmo_data = json.load(f)
+        if cache_dir is not None:
+            PMOCache.store(cache_header, pmo_data, cache_dir)
         return pmo_data
 
     @staticmethod
-    def read_in_pmos(fnps: list[str] | list[os.PathLike[str]]):
+    def iter_in_pmos(
+        fnps: list[str] | list[os.PathLike[str]],
+        threads: int = 1,
+        max_in_flight: int = None,
+    ):
+        """
+        Read in PMO files one after another, can either be compressed(.gz) or uncompressed.
+        With more than 1 thread the files are decompressed and parsed in a process pool
+        :param fnps: the file name paths of the PMO files to read in
+        :param threads: the number of worker processes to read the files with
+        :param max_in_flight: the maximum number of files being read or waiting to be consumed at once, defaults to 2 x threads
+        :return: a generator of PMO like objects in the same order as fnps
+        """
+        if threads <= 1:
+            for fnp in fnps:
+                yield PMOReader.read_in_pmo(fnp)
+            return
+        if "STDIN" in fnps:
+            raise Exception("Cannot read STDIN in parallel with other PMO files")
+        if max_in_flight is None:
+            max_in_flight = 2 * threads
+        if max_in_flight < 1:
+            raise Exception(
+                "max_in_flight must be at least 1, not " + str(max_in_flight)
+            )
+        fnps_iter = iter(fnps)
+        with ProcessPoolExecutor(max_workers=threads) as executor:
+            # futures kept in input order so the PMOs come back in the order requested
+            in_flight = deque(
+                executor.submit(PMOReader.read_in_pmo, fnp)
+                for fnp in itertools.islice(fnps_iter, max_in_flight)
+            )
+            while in_flight:
+                pmo = in_flight.popleft().result()
+                next_fnp = next(fnps_iter, None)
+                if next_fnp is not None:
+                    in_flight.append(executor.submit(PMOReader.read_in_pmo, next_fnp))
+                yield pmo
+
+    @staticmethod
+    def read_in_pmos(
+        fnps: list[str] | list[os.PathLike[str]],
+        threads: int = 1,
+        max_in_flight: int = None,
+    ):
         """
         Read in a PMO file, can either be compressed(.gz) or uncompressed
         :param fnps: the file name path of the PMO file to read in
+        :param threads: the number of worker processes to read the files with, files are read in one at a time if 1
+        :param max_in_flight: the maximum number of files being read in parallel at once, defaults to 2 x threads
         :return: a list of PMO like object
         """
-        ret = []
-        for fnp in fnps:
-            ret.append(PMOReader.read_in_pmo(fnp))
+        return list(PMOReader.iter_in_pmos(fnps, threads, max_in_flight))
+
+    @staticmethod
+    def _take_ownership(record):
+        """
+        Used in place of copy.deepcopy when combining PMOs whose records can be moved rather than copied
+        :param record: the record being moved into the combined PMO
+        :return: the same record
+        """
+        return record
+
+    @staticmethod
+    def append_pmo(
+        pmo,
+        new_pmos: list[dict],
+        consume_inputs: bool = False,
+        return_new_microhaplotype_counts: bool = False,
+    ):
+        """
+        Append new PMOs (e.g. from a new sequencing run) onto an existing, possibly previously combined, PMO.
+        The existing PMO's records are moved into the output as is rather than copied, only the look-ups of its names and sequences are built
+        so the new records can be checked for duplicates and have their ids updated before being appended
+        :param pmo: the existing PMO to append to, its records are moved into the returned PMO so it is emptied
+        :param new_pmos: the PMOs to append
+        :param consume_inputs: if True, the new PMOs' records are moved rather than copied and the new PMOs are emptied
+        :param return_new_microhaplotype_counts: if True, also return a list with the number of representative microhaplotype sequences the existing PMO and each new PMO added
+        :return: the PMO with the new PMOs appended, or a tuple of it and the new microhaplotype counts if return_new_microhaplotype_counts is True
+        """
+        if len(new_pmos) == 0:
+            raise Exception("No new PMOs were supplied to append")
+        ret = PMOReader.combine_multiple_pmos(
+            [pmo] + list(new_pmos),
+            consume_inputs=consume_inputs,
+            return_new_microhaplotype_counts=return_new_microhaplotype_counts,
+            consume_first_input=True,
+        )
+        pmo_out = ret[0] if return_new_microhaplotype_counts else ret
+        pmo_out["pmo_header"]["generation_method"][
+            "program_name"
+        ] = "pmotools-python.PMOReader.append_pmo"
         return ret
 
     @staticmethod
-    def combine_multiple_pmos(pmos: list[dict]):
+    def combine_multiple_pmos(
+        pmos: list[dict],
+        consume_inputs: bool = False,
+        return_new_microhaplotype_counts: bool = False,
+        consume_first_input: bool = False,
+    ):
         """
-        Combine multiple PMOs into one pmo
+        Combine multiple PMOs into one pmo.
+        PMOs read in with PMOStreamReader.read_in_pmo_lazily can be combined out-of-core, only their metadata is merged up front and
+        the combined detected_microhaplotypes and read_counts_by_stage are streamed from the input files with their ids updated when iterated over (e.g. by PMOWriter.write_out_pmo)
         :param pmos: a list of PMO objects
-        :return: a combined PMO
+        :param consume_inputs: if True, records are moved into the combined PMO and their ids updated in place rather than being copied,
+        this lowers memory and time usage but the input PMOs are emptied and should not be used afterwards
+        :param return_new_microhaplotype_counts: if True, also return a list with the number of representative microhaplotype sequences each input PMO added to the combined PMO
+        :param consume_first_input: if True, the first PMO's records are moved into the combined PMO even if consume_inputs is False, the first PMO is emptied
+        :return: a combined PMO, or a tuple of the combined PMO and the new microhaplotype counts if return_new_microhaplotype_counts is True
         """
         if len(pmos) <= 1:
             raise Exception(
@@ -57,6 +166,9 @@ class PMOReader:
                 + str(len(pmos))
                 + " but multiple PMO objects were expected"
             )
+        # either take ownership of records as is or work on copies so the inputs are left untouched
+        take = PMOReader._take_ownership if consume_inputs else copy.deepcopy
+        take_first = PMOReader._take_ownership if consume_first_input else take
         # create new pmo out
         pmo_out = {}
         # create new pmo_header
@@ -72,7 +184,7 @@ class PMOReader:
         }
 
         # combine targeted_genomes fields
-        pmo_out["targeted_genomes"] = copy.deepcopy(pmos[0]["targeted_genomes"])
+        pmo_out["targeted_genomes"] = take_first(pmos[0]["targeted_genomes"])
         # key: genome name + _ + genome_version, val: index
         targeted_genomes_out_index_key = {}
         for genome_info_index, genome in enumerate(pmos[0]["targeted_genomes"]):
@@ -90,12 +202,12 @@ class PMOReader:
                     ] = targeted_genomes_out_index_key[genome_id]
                 else:
                     new_index = len(pmo_out["targeted_genomes"])
-                    pmo_out["targeted_genomes"].append(copy.deepcopy(genome))
+                    pmo_out["targeted_genomes"].append(take(genome))
                     targeted_genomes_out_index_key[genome_id] = new_index
                     targeted_genomes_old_index_key[pmo_index][genome_index] = new_index
 
         # combine target_info fields
-        pmo_out["target_info"] = copy.deepcopy(pmos[0]["target_info"])
+        pmo_out["target_info"] = take_first(pmos[0]["target_info"])
         # key: target_name, val: index
         target_info_out_index_key = {}
         for target_info_index, target_info in enumerate(pmos[0]["target_info"]):
@@ -110,7 +222,7 @@ class PMOReader:
                     ] = target_info_out_index_key[target["target_name"]]
                 else:
                     new_index = len(pmo_out["target_info"])
-                    target_copy = copy.deepcopy(target)
+                    target_copy = take(target)
                     # update genome_id if adding new target
                     if len(pmo_out["targeted_genomes"]) > 1:
                         if "insert_location" in target_copy:
@@ -140,7 +252,7 @@ class PMOReader:
 
         # combine panel_info
         # todo, more extensive testing than just panel name, make sure reactions and targets are the same
-        pmo_out["panel_info"] = copy.deepcopy(pmos[0]["panel_info"])
+        pmo_out["panel_info"] = take_first(pmos[0]["panel_info"])
         # key: panel_name, val: index
         panel_info_out_index_key = {}
         for panel_info_index, panel_info in enumerate(pmos[0]["panel_info"]):
@@ -149,7 +261,7 @@ class PMOReader:
         panel_info_old_index_key = defaultdict(dict)
         for pmo_index, pmo in enumerate(pmos[1:], start=1):
             for panel_index, panel in enumerate(pmo["panel_info"]):
-                panel_copy = copy.deepcopy(panel)
+                panel_copy = take(panel)
                 if panel_copy["panel_name"] in panel_info_out_index_key:
                     panel_info_old_index_key[pmo_index][
                         panel_index
@@ -173,7 +285,7 @@ class PMOReader:
         # just concatenate sequencing infos. Only way this could have happened is if files were split into different
         # pmos and then rejoined but even if we concatenate sequencing_info of the same, they will still properly
         # have the right info per library
-        pmo_out["sequencing_info"] = copy.deepcopy(pmos[0]["sequencing_info"])
+        pmo_out["sequencing_info"] = take_first(pmos[0]["sequencing_info"])
         # key1 pmo_index, key2 old_index, val new_index
         sequencing_info_old_index_key = defaultdict(dict)
         for pmo_index, pmo in enumerate(pmos[1:], start=1):
@@ -181,64 +293,67 @@ class PMOReader:
                 pmo["sequencing_info"]
             ):
                 new_index = len(pmo_out["sequencing_info"])
-                pmo_out["sequencing_info"].append(copy.deepcopy(sequencing_info))
+                pmo_out["sequencing_info"].append(take(sequencing_info))
                 sequencing_info_old_index_key[pmo_index][
                     sequencing_info_index
                 ] = new_index
 
         # combine project_info
         # could be possible to be combining PMOs across one project so check if project already exists
-        pmo_out["project_info"] = copy.deepcopy(pmos[0]["project_info"])
+        pmo_out["project_info"] = take_first(pmos[0]["project_info"])
+        # key: project_name, val: index
+        project_info_out_index_key = {}
+        for project_info_index, project_info in enumerate(pmo_out["project_info"]):
+            project_info_out_index_key[
+                project_info["project_name"]
+            ] = project_info_index
+        # key1 pmo_index, key2 old_index, val new_index
         project_info_old_index_key = defaultdict(dict)
         for pmo_index, pmo in enumerate(pmos[1:], start=1):
             for project_info_index, project_info in enumerate(pmo["project_info"]):
                 # check to see if project already exists
-                found_project_info = False
-                for current_project_id, current_project_info in enumerate(
-                    pmo_out["project_info"]
-                ):
+                if project_info["project_name"] in project_info_out_index_key:
+                    current_project_id = project_info_out_index_key[
+                        project_info["project_name"]
+                    ]
                     if (
-                        current_project_info["project_name"]
-                        == project_info["project_name"]
+                        pmo_out["project_info"][current_project_id][
+                            "project_description"
+                        ]
+                        != project_info["project_description"]
                     ):
-                        if (
-                            current_project_info["project_description"]
-                            != project_info["project_description"]
-                        ):
-                            raise Exception(
-                                "Project description mismatch for project_name: "
-                                + project_info["project_name"]
-                            )
-                        else:
-                            project_info_old_index_key[pmo_index][
-                                project_info_index
-                            ] = current_project_id
-                            found_project_info = True
-                if not found_project_info:
+                        raise Exception(
+                            "Project description mismatch for project_name: "
+                            + project_info["project_name"]
+                        )
+                    project_info_old_index_key[pmo_index][
+                        project_info_index
+                    ] = current_project_id
+                else:
                     new_index = len(pmo_out["project_info"])
-                    pmo_out["project_info"].append(copy.deepcopy(project_info))
+                    pmo_out["project_info"].append(take(project_info))
+                    project_info_out_index_key[project_info["project_name"]] = new_index
                     project_info_old_index_key[pmo_index][
                         project_info_index
                     ] = new_index
 
         # combine specimen_info and library_sample_info
         # update project_id
-        pmo_out["specimen_info"] = copy.deepcopy(pmos[0]["specimen_info"])
-        specimen_names = []
+        pmo_out["specimen_info"] = take_first(pmos[0]["specimen_info"])
+        # key: specimen_name, val: index
         specimen_index_key = {}
         duplicate_specimen_names = []
-        for specimen in pmo_out["specimen_info"]:
-            if specimen["specimen_name"] in specimen_names:
+        for specimen_index, specimen in enumerate(pmo_out["specimen_info"]):
+            if specimen["specimen_name"] in specimen_index_key:
                 duplicate_specimen_names.append(specimen["specimen_name"])
-            specimen_index_key[specimen["specimen_name"]] = len(specimen_names)
-            specimen_names.append(specimen["specimen_name"])
+            specimen_index_key[specimen["specimen_name"]] = specimen_index
 
         # key1 pmo_index, key2 old_index, val new_index
         specimen_info_old_index_key = defaultdict(dict)
         for pmo_index, pmo in enumerate(pmos[1:], start=1):
             for specimen_info_index, specimen_info in enumerate(pmo["specimen_info"]):
                 # checkin for duplicates
-                if specimen_info["specimen_name"] in specimen_names:
+                if specimen_info["specimen_name"] in specimen_index_key:
                     # if specimen is exactly the same, then no issues
                     # @todo allow merging of info and as long as the meta present in both are the same then it should be fine
                     if (
@@ -257,13 +372,10 @@ class PMOReader:
                             specimen_info_index
                         ] = specimen_index_key[specimen_info["specimen_name"]]
                 else:
-                    specimen_index_key[specimen_info["specimen_name"]] = len(
-                        specimen_names
-                    )
-                    specimen_names.append(specimen_info["specimen_name"])
                     new_index = len(pmo_out["specimen_info"])
+                    specimen_index_key[specimen_info["specimen_name"]] = new_index
                     # update project_id
-                    specimen_info_copy = copy.deepcopy(specimen_info)
+                    specimen_info_copy = take(specimen_info)
                     specimen_info_copy["project_id"] = project_info_old_index_key[
                         pmo_index
                     ][specimen_info_copy["project_id"]]
@@ -273,18 +385,18 @@ class PMOReader:
                     ] = new_index
 
         ## library_sample_info
-        pmo_out["library_sample_info"] = copy.deepcopy(pmos[0]["library_sample_info"])
+        pmo_out["library_sample_info"] = take_first(pmos[0]["library_sample_info"])
         # key1 pmo_index, key2 old_index, val new_index
         library_sample_info_old_index_key = defaultdict(dict)
         duplicate_library_sample_names = []
-        library_sample_names = []
+        library_sample_names = set()
         # have to add the library_sample_names already added in the first PMO
         for library_sample in pmo_out["library_sample_info"]:
             if library_sample["library_sample_name"] in library_sample_names:
                 duplicate_library_sample_names.append(
                     library_sample["library_sample_name"]
                 )
-            library_sample_names.append(library_sample["library_sample_name"])
+            library_sample_names.add(library_sample["library_sample_name"])
         for pmo_index, pmo in enumerate(pmos[1:], start=1):
             for library_sample_info_index, library_sample_info in enumerate(
                 pmo["library_sample_info"]
@@ -294,9 +406,9 @@ class PMOReader:
                     duplicate_library_sample_names.append(
                         library_sample_info["library_sample_name"]
                     )
-                library_sample_names.append(library_sample_info["library_sample_name"])
+                library_sample_names.add(library_sample_info["library_sample_name"])
                 # update indexes
-                library_sample_info_copy = copy.deepcopy(library_sample_info)
+                library_sample_info_copy = take(library_sample_info)
                 library_sample_info_copy["specimen_id"] = specimen_info_old_index_key[
                     pmo_index
                 ][library_sample_info_copy["specimen_id"]]
@@ -331,7 +443,7 @@ class PMOReader:
 
         # update bioinformatics_methods_info
         # the different bioinformatics_methods_info might be the same but there's no easy way to perfectly match up right now
-        pmo_out["bioinformatics_methods_info"] = copy.deepcopy(
+        pmo_out["bioinformatics_methods_info"] = take_first(
             pmos[0]["bioinformatics_methods_info"]
         )
         # key1 pmo_index, key2 old_index, val new_index
@@ -343,14 +455,14 @@ class PMOReader:
             ) in enumerate(pmo["bioinformatics_methods_info"]):
                 new_index = len(pmo_out["bioinformatics_methods_info"])
                 pmo_out["bioinformatics_methods_info"].append(
-                    copy.deepcopy(bioinformatics_methods_info)
+                    take(bioinformatics_methods_info)
                 )
                 bioinformatics_methods_info_old_index_key[pmo_index][
                     bioinformatics_methods_info_index
                 ] = new_index
 
         # update bioinformatics_run_info
-        pmo_out["bioinformatics_run_info"] = copy.deepcopy(
+        pmo_out["bioinformatics_run_info"] = take_first(
             pmos[0]["bioinformatics_run_info"]
         )
         # key1 pmo_index, key2 old_index, val new_index
@@ -359,11 +471,11 @@ class PMOReader:
             for bioinformatics_run_info_index, bioinformatics_run_info in enumerate(
                 pmo["bioinformatics_run_info"]
             ):
-                bioinformatics_run_info_copy = copy.deepcopy(bioinformatics_run_info)
+                bioinformatics_run_info_copy = take(bioinformatics_run_info)
                 bioinformatics_run_info_copy[
                     "bioinformatics_methods_id"
                 ] = bioinformatics_methods_info_old_index_key[pmo_index][
-                    bioinformatics_run_info_index
+                    bioinformatics_run_info_copy["bioinformatics_methods_id"]
                 ]
                 new_index = len(pmo_out["bioinformatics_run_info"])
                 pmo_out["bioinformatics_run_info"].append(bioinformatics_run_info_copy)
@@ -372,11 +484,16 @@ class PMOReader:
                 ] = new_index
 
         # update representative_microhaplotypes
-        pmo_out["representative_microhaplotypes"] = pmos[0][
-            "representative_microhaplotypes"
-        ]
+        pmo_out["representative_microhaplotypes"] = take_first(
+            pmos[0]["representative_microhaplotypes"]
+        )
+        # the number of microhaplotype sequences added to the combined PMO by each input PMO
+        new_microhaplotype_counts = [0] * len(pmos)
         # key: target_name (not index), val: index in representative_microhaplotypes
         representative_microhaplotypes_out_index_key = {}
+        # index: index in representative_microhaplotypes, key: seq, val: mhap_id
+        # kept for the whole merge so each incoming microhaplotype is matched without scanning the target's microhaplotypes
+        representative_microhaplotypes_seq_index_key = []
         for (
             representative_microhaplotypes_index,
             representative_microhaplotypes,
@@ -386,6 +503,15 @@ class PMOReader:
                     "target_name"
                 ]
             ] = representative_microhaplotypes_index
+            seq_index_key = {}
+            for mhap_index, microhap in enumerate(
+                representative_microhaplotypes["microhaplotypes"]
+            ):
+                seq_index_key.setdefault(microhap["seq"], mhap_index)
+            representative_microhaplotypes_seq_index_key.append(seq_index_key)
+            new_microhaplotype_counts[0] += len(
+                representative_microhaplotypes["microhaplotypes"]
+            )
         # key1: pmo_index, key2: old_mhaps_target_id, val: new_mhaps_target_id
         representative_microhaplotypes_old_index_key = defaultdict(dict)
         # key1: pmo_index, key2: old_mhaps_target_id, key3: old_mhap_id, val: new_mhap_id
@@ -397,175 +523,222 @@ class PMOReader:
                 representative_microhaplotypes_index,
                 representative_microhaplotypes,
             ) in enumerate(pmo["representative_microhaplotypes"]["targets"]):
-                if (
-                    pmo["target_info"][representative_microhaplotypes["target_id"]][
-                        "target_name"
+                target_name = pmo["target_info"][
+                    representative_microhaplotypes["target_id"]
+                ]["target_name"]
+                mhap_id_old_index_key = (
+                    representative_microhaplotypes_hmap_for_target_index_old_index_key[
+                        pmo_index
+                    ][representative_microhaplotypes_index]
+                )
+                if target_name in representative_microhaplotypes_out_index_key:
+                    out_index = representative_microhaplotypes_out_index_key[
+                        target_name
                     ]
-                    in representative_microhaplotypes_out_index_key
-                ):
                     representative_microhaplotypes_old_index_key[pmo_index][
                         representative_microhaplotypes_index
-                    ] = representative_microhaplotypes_out_index_key[
-                        pmo["target_info"][representative_microhaplotypes["target_id"]][
-                            "target_name"
-                        ]
+                    ] = out_index
+                    out_microhaplotypes = pmo_out["representative_microhaplotypes"][
+                        "targets"
+                    ][out_index]["microhaplotypes"]
+                    seq_index_key = representative_microhaplotypes_seq_index_key[
+                        out_index
                     ]
                     # now update per microhaplotype
                     for adding_microhap_index, adding_microhap in enumerate(
                         representative_microhaplotypes["microhaplotypes"]
                     ):
-                        found = False
-                        # print(pmo_out["representative_microhaplotypes"]["targets"][representative_microhaplotypes_out_index_key[pmo["target_info"][representative_microhaplotypes["target_id"]]["target_name"]]]["microhaplotypes"])
-                        # print("\n\n\n")
-                        for (
-                            already_have_microhap_index,
-                            already_have_microhap,
-                        ) in enumerate(
-                            pmo_out["representative_microhaplotypes"]["targets"][
-                                representative_microhaplotypes_out_index_key[
-                                    pmo["target_info"][
-                                        representative_microhaplotypes["target_id"]
-                                    ]["target_name"]
-                                ]
-                            ]["microhaplotypes"]
-                        ):
-                            # print(already_have_microhap)
-                            # print("\n")
-                            if adding_microhap["seq"] == already_have_microhap["seq"]:
-                                representative_microhaplotypes_hmap_for_target_index_old_index_key[
-                                    pmo_index
-                                ][representative_microhaplotypes_index][
-                                    adding_microhap_index
-                                ] = already_have_microhap_index
-                                found = True
-                                break
-                        if not found:
-                            new_index = len(
-                                pmo_out["representative_microhaplotypes"]["targets"][
-                                    representative_microhaplotypes_out_index_key[
-                                        pmo["target_info"][
-                                            representative_microhaplotypes["target_id"]
-                                        ]["target_name"]
-                                    ]
-                                ]["microhaplotypes"]
-                            )
-                            pmo_out["representative_microhaplotypes"]["targets"][
-                                representative_microhaplotypes_out_index_key[
-                                    pmo["target_info"][
-                                        representative_microhaplotypes["target_id"]
-                                    ]["target_name"]
-                                ]
-                            ]["microhaplotypes"].append(copy.deepcopy(adding_microhap))
-                            representative_microhaplotypes_hmap_for_target_index_old_index_key[
-                                pmo_index
-                            ][representative_microhaplotypes_index][
+                        if adding_microhap["seq"] in seq_index_key:
+                            mhap_id_old_index_key[
                                 adding_microhap_index
-                            ] = new_index
+                            ] = seq_index_key[adding_microhap["seq"]]
+                        else:
+                            new_index = len(out_microhaplotypes)
+                            out_microhaplotypes.append(take(adding_microhap))
+                            seq_index_key[adding_microhap["seq"]] = new_index
+                            mhap_id_old_index_key[adding_microhap_index] = new_index
+                            new_microhaplotype_counts[pmo_index] += 1
                 else:
                     # if not currently in representative_microhaplotypes, update keys and look-ups
                     new_mhaps_target_index = len(
                         pmo_out["representative_microhaplotypes"]["targets"]
                     )
+                    representative_microhaplotypes_copy = take(
+                        representative_microhaplotypes
+                    )
+                    # update target_id to point to the target's index in the combined target_info
+                    representative_microhaplotypes_copy[
+                        "target_id"
+                    ] = target_info_old_index_key[pmo_index][
+                        representative_microhaplotypes_copy["target_id"]
+                    ]
                     pmo_out["representative_microhaplotypes"]["targets"].append(
-                        copy.deepcopy(representative_microhaplotypes)
+                        representative_microhaplotypes_copy
                     )
                     representative_microhaplotypes_old_index_key[pmo_index][
                         representative_microhaplotypes_index
                     ] = new_mhaps_target_index
                     representative_microhaplotypes_out_index_key[
-                        pmo["target_info"][representative_microhaplotypes["target_id"]][
-                            "target_name"
-                        ]
+                        target_name
                     ] = new_mhaps_target_index
+                    seq_index_key = {}
                     for adding_microhap_index, adding_microhap in enumerate(
-                        representative_microhaplotypes["microhaplotypes"]
+                        representative_microhaplotypes_copy["microhaplotypes"]
                     ):
-                        representative_microhaplotypes_hmap_for_target_index_old_index_key[
-                            pmo_index
-                        ][representative_microhaplotypes_index][
+                        seq_index_key.setdefault(
+                            adding_microhap["seq"], adding_microhap_index
+                        )
+                        mhap_id_old_index_key[
                             adding_microhap_index
                         ] = adding_microhap_index
-        # print(representative_microhaplotypes_hmap_for_target_index_old_index_key)
+                    representative_microhaplotypes_seq_index_key.append(seq_index_key)
+                    new_microhaplotype_counts[pmo_index] += len(
+                        representative_microhaplotypes_copy["microhaplotypes"]
+                    )
+
         # update detected_microhaplotypes
-        pmo_out["detected_microhaplotypes"] = copy.deepcopy(
-            pmos[0]["detected_microhaplotypes"]
+        def remap_detected_microhaplotypes_library_sample(pmo_index, library_sample):
+            for target_result in library_sample["target_results"]:
+                for hap in target_result["mhaps"]:
+                    hap[
+                        "mhap_id"
+                    ] = representative_microhaplotypes_hmap_for_target_index_old_index_key[
+                        pmo_index
+                    ][target_result["mhaps_target_id"]][hap["mhap_id"]]
+                target_result[
+                    "mhaps_target_id"
+                ] = representative_microhaplotypes_old_index_key[pmo_index][
+                    target_result["mhaps_target_id"]
+                ]
+            library_sample["library_sample_id"] = library_sample_info_old_index_key[
+                pmo_index
+            ][library_sample["library_sample_id"]]
+            return library_sample
+
+        def remap_detected_microhaplotypes(pmo_index, detected_microhaplotypes):
+            detected_microhaplotypes[
+                "bioinformatics_run_id"
+            ] = bioinformatics_run_info_old_index_key[pmo_index][
+                detected_microhaplotypes["bioinformatics_run_id"]
+            ]
+            if isinstance(detected_microhaplotypes["library_samples"], list):
+                for library_sample in detected_microhaplotypes["library_samples"]:
+                    remap_detected_microhaplotypes_library_sample(
+                        pmo_index, library_sample
+                    )
+            else:
+                # streamed library samples are updated as they are read in
+                detected_microhaplotypes["library_samples"] = (
+                    remap_detected_microhaplotypes_library_sample(
+                        pmo_index, library_sample
+                    )
+                    for library_sample in detected_microhaplotypes["library_samples"]
+                )
+            return detected_microhaplotypes
+
+        # if any of the PMOs were read in lazily, the combined sections are streamed from them when iterated over (e.g. when written out)
+        lazy_sections = any(
+            not isinstance(pmo[section], list)
+            for pmo in pmos
+            for section in ["detected_microhaplotypes", "read_counts_by_stage"]
+            if section in pmo
         )
-        for pmo_index, pmo in enumerate(pmos[1:], start=1):
-            # update indexes
-            for detected_microhaplotypes in pmo["detected_microhaplotypes"]:
-                detected_microhaplotypes_copy = copy.deepcopy(detected_microhaplotypes)
-                for library_sample in detected_microhaplotypes_copy["library_samples"]:
-                    for target_result in library_sample["target_results"]:
-                        for hap in target_result["mhaps"]:
-                            hap[
-                                "mhap_id"
-                            ] = representative_microhaplotypes_hmap_for_target_index_old_index_key[
-                                pmo_index
-                            ][target_result["mhaps_target_id"]][hap["mhap_id"]]
-                        target_result[
-                            "mhaps_target_id"
-                        ] = representative_microhaplotypes_old_index_key[pmo_index][
-                            target_result["mhaps_target_id"]
-                        ]
-                    library_sample[
-                        "library_sample_id"
-                    ] = library_sample_info_old_index_key[pmo_index][
-                        library_sample["library_sample_id"]
+        if lazy_sections:
+            pmo_out["detected_microhaplotypes"] = CombinedPMOSection(
+                [pmo["detected_microhaplotypes"] for pmo in pmos],
+                remap_detected_microhaplotypes,
+            )
+        else:
+            pmo_out["detected_microhaplotypes"] = take_first(
+                pmos[0]["detected_microhaplotypes"]
+            )
+            for pmo_index, pmo in enumerate(pmos[1:], start=1):
+                for detected_microhaplotypes in pmo["detected_microhaplotypes"]:
+                    # append after the indexes have been updated
+                    pmo_out["detected_microhaplotypes"].append(
+                        remap_detected_microhaplotypes(
+                            pmo_index, take(detected_microhaplotypes)
+                        )
+                    )
+
+        # update read_counts_by_stage
+        def remap_read_counts_by_library_sample_by_stage(
+            pmo_index, read_counts_by_library_sample_by_stage
+        ):
+            if "read_counts_for_targets" in read_counts_by_library_sample_by_stage:
+                for read_counts_for_target in read_counts_by_library_sample_by_stage[
+                    "read_counts_for_targets"
+                ]:
+                    read_counts_for_target["target_id"] = target_info_old_index_key[
+                        pmo_index
+                    ][read_counts_for_target["target_id"]]
+            read_counts_by_library_sample_by_stage[
+                "library_sample_id"
+            ] = library_sample_info_old_index_key[pmo_index][
+                read_counts_by_library_sample_by_stage["library_sample_id"]
+            ]
+            return read_counts_by_library_sample_by_stage
+
+        def remap_read_counts_by_stage(pmo_index, read_counts_by_stage):
+            read_counts_by_stage[
+                "bioinformatics_run_id"
+            ] = bioinformatics_run_info_old_index_key[pmo_index][
+                read_counts_by_stage["bioinformatics_run_id"]
+            ]
+            if isinstance(
+                read_counts_by_stage["read_counts_by_library_sample_by_stage"], list
+            ):
+                for read_counts_by_library_sample_by_stage in read_counts_by_stage[
+                    "read_counts_by_library_sample_by_stage"
+                ]:
+                    remap_read_counts_by_library_sample_by_stage(
+                        pmo_index, read_counts_by_library_sample_by_stage
+                    )
+            else:
+                # streamed records are updated as they are read in
+                read_counts_by_stage["read_counts_by_library_sample_by_stage"] = (
+                    remap_read_counts_by_library_sample_by_stage(
+                        pmo_index, read_counts_by_library_sample_by_stage
+                    )
+                    for read_counts_by_library_sample_by_stage in read_counts_by_stage[
+                        "read_counts_by_library_sample_by_stage"
                     ]
-                detected_microhaplotypes_copy[
-                    "bioinformatics_run_id"
-                ] = bioinformatics_run_info_old_index_key[pmo_index][
-                    detected_microhaplotypes_copy["bioinformatics_run_id"]
-                ]
-                # append after the indexes have been updated
-                pmo_out["detected_microhaplotypes"].append(
-                    detected_microhaplotypes_copy
                 )
+            return read_counts_by_stage
 
         pmo_indexes_with_read_counts_by_stage = []
         for pmo_index, pmo in enumerate(pmos):
             if "read_counts_by_stage" in pmo:
                 pmo_indexes_with_read_counts_by_stage.append(pmo_index)
-        if 0 not in pmo_indexes_with_read_counts_by_stage:
-            pmo_out["read_counts_by_stage"] = []
-        for pmo_index in pmo_indexes_with_read_counts_by_stage:
-            # if read_counts_by_stage is in pmos[0] then no indexes need to be updated
-            if 0 == pmo_index:
-                pmo_out["read_counts_by_stage"] = copy.deepcopy(
-                    pmos[pmo_index]["read_counts_by_stage"]
-                )
-            else:
-                # update index and then append to out
-                for read_counts_by_stage in pmos[pmo_index]["read_counts_by_stage"]:
-                    read_counts_by_stage_copy = copy.deepcopy(read_counts_by_stage)
-                    for (
-                        read_counts_by_library_sample_by_stage
-                    ) in read_counts_by_stage_copy[
-                        "read_counts_by_library_sample_by_stage"
-                    ]:
-                        if (
-                            "read_counts_for_targets"
-                            in read_counts_by_library_sample_by_stage
-                        ):
-                            for (
-                                read_counts_for_target
-                            ) in read_counts_by_library_sample_by_stage[
-                                "read_counts_for_targets"
-                            ]:
-                                read_counts_for_target[
-                                    "target_id"
-                                ] = target_info_old_index_key[pmo_index][
-                                    read_counts_for_target["target_id"]
-                                ]
-                        read_counts_by_library_sample_by_stage[
-                            "library_sample_id"
-                        ] = library_sample_info_old_index_key[pmo_index][
-                            read_counts_by_library_sample_by_stage["library_sample_id"]
-                        ]
-                    read_counts_by_stage_copy[
-                        "bioinformatics_run_id"
-                    ] = bioinformatics_run_info_old_index_key[pmo_index][
-                        read_counts_by_stage_copy["bioinformatics_run_id"]
-                    ]
-                    pmo_out["read_counts_by_stage"].append(read_counts_by_stage_copy)
+        if lazy_sections:
+            # keep the pmo_index of each section by using an empty section for PMOs without read_counts_by_stage
+            pmo_out["read_counts_by_stage"] = CombinedPMOSection(
+                [pmo.get("read_counts_by_stage", []) for pmo in pmos],
+                remap_read_counts_by_stage,
+            )
+        else:
+            if 0 not in pmo_indexes_with_read_counts_by_stage:
+                pmo_out["read_counts_by_stage"] = []
+            for pmo_index in pmo_indexes_with_read_counts_by_stage:
+                # if read_counts_by_stage is in pmos[0] then no indexes need to be updated
+                if 0 == pmo_index:
+                    pmo_out["read_counts_by_stage"] = take_first(
+                        pmos[pmo_index]["read_counts_by_stage"]
+                    )
+                else:
+                    # update index and then append to out
+                    for read_counts_by_stage in pmos[pmo_index]["read_counts_by_stage"]:
+                        pmo_out["read_counts_by_stage"].append(
+                            remap_read_counts_by_stage(
+                                pmo_index, take(read_counts_by_stage)
+                            )
+                        )
+        if consume_inputs:
+            # everything needed has been moved into pmo_out, drop the inputs' references to it
+            for pmo in pmos:
+                pmo.clear()
+        elif consume_first_input:
+            pmos[0].clear()
+        if return_new_microhaplotype_counts:
+            return pmo_out, new_microhaplotype_counts
         return pmo_out
@@ -0,0 +1,658 @@
+#!/usr/bin/env python3
+import csv
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
+from pmotools.utils.small_utils import Utils
+
+
+class PMOSqlite:
+    """
+    Convert a PMO to and from a SQLite database of relational tables, so it can be queried with indexed SQL rather than loaded into memory.
+
+    Each list of records (specimen_info, library_sample_info, target_info, panel_info etc.) is a table whose primary key is the record's
+    position, named by the *_id fields that refer to it (e.g. specimen_id), with a column for each field that only holds single
+    values and the whole record as JSON in record_json. panel_targets lists the targets of each reaction of each panel.
+
+    The representative microhaplotypes are the representative_targets and representative_microhaplotypes tables, and the per
+    bioinformatics run sections are one table per level of nesting:
+        detected_microhaplotypes: detected_runs, detected_library_samples, detected_target_results, detected_microhaplotypes
+        read_counts_by_stage: read_counts_runs, read_counts_library_samples, read_counts_targets, read_counts_stages
+    where each row has a row_id and the row_id of the record it belongs to (parent_row_id), along with the *_id fields of all the
+    records above it, so e.g. detected_microhaplotypes can be queried by bioinformatics_run_id, library_sample_id and mhaps_target_id directly.
+    Any other fields of those records are kept as JSON in extra_json. Columns named *_id reference the table of the records they
+    refer to and are indexed once all the rows are loaded.
+
+    load_pmo_database loads a PMO file into these tables, in memory or cached on disk by the hash of the file, to run queries against.
+    """
+
+    # the sections that are lists of records, key: section, val: the name of the *_id fields referring to its records
+    record_sections = {
+        "pmo_header": None,
+        "targeted_genomes": "genome_id",
+        "target_info": "target_id",
+        "panel_info": "panel_id",
+        "sequencing_info": "sequencing_info_id",
+        "project_info": "project_id",
+        "specimen_info": "specimen_id",
+        "library_sample_info": "library_sample_id",
+        "bioinformatics_methods_info": "bioinformatics_methods_id",
+        "bioinformatics_run_info": "bioinformatics_run_id",
+    }
+
+    # the per bioinformatics run sections, a table per level of nesting: (table, the key of the level's records in the level above, the fields stored in columns)
+    nested_sections = {
+        "detected_microhaplotypes": [
+            ("detected_runs", None, ["bioinformatics_run_id"]),
+            ("detected_library_samples", "library_samples", ["library_sample_id"]),
+            ("detected_target_results", "target_results", ["mhaps_target_id"]),
+            ("detected_microhaplotypes", "mhaps", ["mhap_id", "reads", "umis"]),
+        ],
+        "read_counts_by_stage": [
+            ("read_counts_runs", None, ["bioinformatics_run_id"]),
+            (
+                "read_counts_library_samples",
+                "read_counts_by_library_sample_by_stage",
+                ["library_sample_id", "total_raw_count"],
+            ),
+            ("read_counts_targets", "read_counts_for_targets", ["target_id"]),
+            ("read_counts_stages", "stages", ["stage", "reads"]),
+        ],
+    }
+
+    @staticmethod
+    def _quote(name: str) -> str:
+        """
+        Quote a name for use as a SQL identifier
+        :param name: the name
+        :return: the quoted name
+        """
+        return '"' + name.replace('"', '""') + '"'
+
+    @staticmethod
+    def _to_json(value) -> str:
+        return json.dumps(value, separators=(",", ":"))
+
+    @staticmethod
+    def _is_column_value(value) -> bool:
+        """
+        Whether a value can be stored in a column and read back unchanged, bools are kept as JSON as SQLite would store them as 0/1
+        :param value: the value
+        :return: True if the value is an int, float or str
+        """
+        return type(value) in (int, float, str)
+
+    @staticmethod
+    def _column_definition(name: str, sql_type: str) -> str:
+        """
+        Get the definition of a column, columns named after the *_id fields reference the table of the records they refer to
+        :param name: the column name
+        :param sql_type: the type of the column
+        :return: the definition for CREATE TABLE
+        """
+        ret = PMOSqlite._quote(name) + " " + sql_type
+        if name == "mhaps_target_id":
+            ret += " REFERENCES representative_targets(mhaps_target_id)"
+        for section, id_name in PMOSqlite.record_sections.items():
+            if name == id_name:
+                ret += f" REFERENCES {section}({id_name})"
+        return ret
+
+    @staticmethod
+    def _record_columns(records: list[dict], id_name: str) -> dict[str, str]:
+        """
+        Get the fields of a list of records that only hold single values, to store as columns
+        :param records: the records
+        :param id_name: the name of the primary key column, not used for a field
+        :return: key: field, val: the SQL type of its column
+        """
+        field_types = {}
+        not_columns = {id_name, "record_json"}
+        for record in records:
+            for key, value in record.items():
+                if key in not_columns:
+                    continue
+                if value is not None and not PMOSqlite._is_column_value(value):
+                    not_columns.add(key)
+                    field_types.pop(key, None)
+                elif value is not None:
+                    field_types.setdefault(key, set()).add(type(value))
+                else:
+                    field_types.setdefault(key, set())
+        ret = {}
+        for key, types in field_types.items():
+            if types == {int}:
+                ret[key] = "INTEGER"
+            elif types <= {int, float} and types:
+                ret[key] = "REAL"
+            elif types == {str}:
+                ret[key] = "TEXT"
+            else:
+                ret[key] = ""
+        return ret
+
+    @staticmethod
+    def pmo_to_sqlite(
+        pmodata,
+        db_fnp: str | os.PathLike[str],
+        overwrite: bool = False,
+        batch_size: int = 100000,
+        create_indexes: bool = True,
+    ):
+        """
+        Write a PMO to a new SQLite database, see PMOSqlite for the tables. The rows are inserted batch_size at a time, each batch
+        in its own transaction, and the indexes are created after all the rows are loaded
+        :param pmodata: the PMO to write, can be a lazily read PMO (PMOStreamReader.read_in_pmo_lazily) as the per bioinformatics run sections are only iterated over once
+        :param db_fnp: the database file to create
+        :param overwrite: whether to replace the database file if it exists
+        :param batch_size: the number of rows to insert per transaction
+        :param create_indexes: whether to index the *_id columns
+        :return: nothing
+        """
+        if batch_size < 1:
+            raise Exception("batch_size must be at least 1, not " + str(batch_size))
+        Utils.outputfile_check(str(db_fnp), overwrite)
+        if os.path.exists(db_fnp):
+            os.remove(db_fnp)
+        connection = sqlite3.connect(db_fnp)
+        try:
+            # a new file is being built, nothing to recover if the load fails part way
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            PMOSqlite._write_tables(pmodata, connection, batch_size, create_indexes)
+            connection.commit()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _write_tables(
+        pmodata, connection: sqlite3.Connection, batch_size: int, create_indexes: bool
+    ):
+        """
+        Create and fill the tables of a PMO, see pmo_to_sqlite
+        """
+        index_columns = []
+        connection.execute(
+            "CREATE TABLE pmo_sections (position INTEGER PRIMARY KEY, section TEXT UNIQUE NOT NULL, record_json TEXT)"
+        )
+        for position, (section, value) in enumerate(pmodata.items()):
+            record_json = None
+            if section == "representative_microhaplotypes":
+                record_json = PMOSqlite._to_json({**value, "targets": None})
+                index_columns += PMOSqlite._write_representative_microhaplotypes(
+                    value["targets"], connection, batch_size
+                )
+            elif section in PMOSqlite.nested_sections:
+                index_columns += PMOSqlite._write_nested_section(
+                    value, PMOSqlite.nested_sections[section], connection, batch_size
+                )
+            elif section in PMOSqlite.record_sections and isinstance(value, list):
+                index_columns += PMOSqlite._write_record_section(
+                    section, value, connection
+                )
+            else:
+                # anything else, e.g. the pmo_header, is kept as is
+                record_json = PMOSqlite._to_json(value)
+            connection.execute(
+                "INSERT INTO pmo_sections VALUES (?, ?, ?)",
+                (position, section, record_json),
+            )
+        connection.commit()
+        if create_indexes:
+            for table, column in index_columns:
+                connection.execute(
+                    f"CREATE INDEX {PMOSqlite._quote('idx_' + table + '_' + column)} ON {table}({PMOSqlite._quote(column)})"
+                )
+            connection.commit()
+
+    @staticmethod
+    def _write_record_section(
+        section: str, records: list[dict], connection: sqlite3.Connection
+    ) -> list[tuple[str, str]]:
+        """
+        Write a list of records to a table of its own, with panel_info's reactions also written to panel_targets
+        :param section: the section name, the table name
+        :param records: the records
+        :param connection: the database
+        :return: the (table, column) of the columns to index
+        """
+        id_name = PMOSqlite.record_sections[section]
+        columns = PMOSqlite._record_columns(records, id_name)
+        connection.execute(
+            f"CREATE TABLE {section} ("
+            + ", ".join(
+                [f"{id_name} INTEGER PRIMARY KEY"]
+                + [
+                    PMOSqlite._column_definition(column, sql_type)
+                    for column, sql_type in columns.items()
+                ]
+                + ["record_json TEXT NOT NULL"]
+            )
+            + ")"
+        )
+        connection.executemany(
+            f"INSERT INTO {section} VALUES ({', '.join(['?'] * (len(columns) + 2))})",
+            (
+                [position]
+                + [
+                    record.get(column)
+                    if PMOSqlite._is_column_value(record.get(column))
+                    else None
+                    for column in columns
+                ]
+                + [PMOSqlite._to_json(record)]
+                for position, record in enumerate(records)
+            ),
+        )
+        index_columns = [
+            (section, column)
+            for column in columns
+            if column.endswith("_id") and column in PMOSqlite.record_sections.values()
+        ]
+        if section == "panel_info":
+            connection.execute(
+                "CREATE TABLE panel_targets (panel_id INTEGER REFERENCES panel_info(panel_id), reaction_name TEXT, target_id INTEGER REFERENCES target_info(target_id))"
+            )
+            connection.executemany(
+                "INSERT INTO panel_targets VALUES (?, ?, ?)",
+                (
+                    (panel_id, reaction.get("reaction_name"), target_id)
+                    for panel_id, panel in enumerate(records)
+                    for reaction in panel.get("reactions", [])
+                    for target_id in reaction.get("panel_targets", [])
+                ),
+            )
+            index_columns += [
+                ("panel_targets", "panel_id"),
+                ("panel_targets", "target_id"),
+            ]
+        return index_columns
+
+    @staticmethod
+    def _write_representative_microhaplotypes(
+        targets: list[dict], connection: sqlite3.Connection, batch_size: int
+    ) -> list[tuple[str, str]]:
+        """
+        Write the representative microhaplotypes of each target
+        :param targets: the representative_microhaplotypes targets
+        :param connection: the database
+        :param batch_size: the number of microhaplotypes to insert per transaction
+        :return: the (table, column) of the columns to index
+        """
+        connection.execute(
+            "CREATE TABLE representative_targets (mhaps_target_id INTEGER PRIMARY KEY, target_id INTEGER REFERENCES target_info(target_id), microhaplotypes_count INTEGER, record_json TEXT NOT NULL)"
+        )
+        connection.execute(
+            "CREATE TABLE representative_microhaplotypes (mhaps_target_id INTEGER REFERENCES representative_targets(mhaps_target_id), mhap_id INTEGER, seq TEXT, extra_json TEXT, PRIMARY KEY (mhaps_target_id, mhap_id))"
+        )
+        connection.executemany(
+            "INSERT INTO representative_targets VALUES (?, ?, ?, ?)",
+            (
+                (
+                    mhaps_target_id,
+                    target.get("target_id"),
+                    len(target["microhaplotypes"]),
+                    PMOSqlite._to_json({**target, "microhaplotypes": None}),
+                )
+                for mhaps_target_id, target in enumerate(targets)
+            ),
+        )
+        batch = []
+        for mhaps_target_id, target in enumerate(targets):
+            for mhap_id, microhaplotype in enumerate(target["microhaplotypes"]):
+                seq = microhaplotype.get("seq")
+                extra = (
+                    None
+                    if len(microhaplotype) == 1 and PMOSqlite._is_column_value(seq)
+                    else PMOSqlite._to_json(microhaplotype)
+                )
+                batch.append((mhaps_target_id, mhap_id, seq, extra))
+                if len(batch) == batch_size:
+                    connection.executemany(
+                        "INSERT INTO representative_microhaplotypes VALUES (?, ?, ?, ?)",
+                        batch,
+                    )
+                    connection.commit()
+                    batch = []
+        connection.executemany(
+            "INSERT INTO representative_microhaplotypes VALUES (?, ?, ?, ?)", batch
+        )
+        connection.commit()
+        return [("representative_targets", "target_id")]
+
+    @staticmethod
+    def _write_nested_section(
+        blocks,
+        levels: list[tuple[str, str, list[str]]],
+        connection: sqlite3.Connection,
+        batch_size: int,
+    ) -> list[tuple[str, str]]:
+        """
+        Write a per bioinformatics run section to a table per level of nesting, walking the section once
+        :param blocks: the section, can be a StreamedPMOSection
+        :param levels: the tables of the levels, see nested_sections
+        :param connection: the database
+        :param batch_size: the number of rows to insert per transaction
+        :return: the (table, column) of the columns to index
+        """
+        # the columns of each level, its own fields and the *_id fields of the levels above
+        level_columns = []
+        inherited_ids = []
+        for level, (table, _, fields) in enumerate(levels):
+            level_columns.append(inherited_ids + fields)
+            child_key = levels[level + 1][1] if level + 1 < len(levels) else None
+            connection.execute(
+                f"CREATE TABLE {table} ("
+                + ", ".join(
+                    ["row_id INTEGER PRIMARY KEY"]
+                    + (
+                        []
+                        if level == 0
+                        else [
+                            f"parent_row_id INTEGER REFERENCES {levels[level - 1][0]}(row_id)"
+                        ]
+                    )
+                    + [
+                        PMOSqlite._column_definition(
+                            column, "TEXT" if column == "stage" else "INTEGER"
+                        )
+                        for column in inherited_ids + fields
+                    ]
+                    + ([f"{child_key}_count INTEGER"] if child_key is not None else [])
+                    + ["extra_json TEXT"]
+                )
+                + ")"
+            )
+            inherited_ids = inherited_ids + [
+                field for field in fields if field.endswith("_id")
+            ]
+
+        batches = [[] for _ in levels]
+        inserts = [
+            f"INSERT INTO {table} VALUES ({', '.join(['?'] * (len(level_columns[level]) + (level > 0) + (level + 1 < len(levels)) + 2))})"
+            for level, (table, _, _) in enumerate(levels)
+        ]
+        row_counts = [0 for _ in levels]
+
+        def add_row(level: int, row: tuple):
+            batches[level].append(row)
+            if len(batches[level]) == batch_size:
+                connection.executemany(inserts[level], batches[level])
+                connection.commit()
+                batches[level].clear()
+
+        def walk(level: int, record: dict, parent_row_id: int, ids: list):
+            row_id = row_counts[level]
+            row_counts[level] += 1
+            fields = levels[level][2]
+            known_keys = set(fields)
+            values = []
+            extra = {}
+            for field in fields:
+                value = record.get(field)
+                if field in record and not PMOSqlite._is_column_value(value):
+                    # e.g. explicit nulls
+                    extra[field] = value
+                    value = None
+                values.append(value)
+            child_count = None
+            if level + 1 < len(levels):
+                child_key = levels[level + 1][1]
+                known_keys.add(child_key)
+                if child_key in record:
+                    child_ids = ids + [
+                        value
+                        for field, value in zip(fields, values)
+                        if field.endswith("_id")
+                    ]
+                    child_count = 0
+                    for child in record[child_key]:
+                        walk(level + 1, child, row_id, child_ids)
+                        child_count += 1
+            if len(record) > len(known_keys) or not known_keys.issuperset(record):
+                extra.update(
+                    (key, value)
+                    for key, value in record.items()
+                    if key not in known_keys
+                )
+            add_row(
+                level,
+                tuple(
+                    [row_id]
+                    + ([] if level == 0 else [parent_row_id])
+                    + ids
+                    + values
+                    + ([child_count] if level + 1 < len(levels) else [])
+                    + [PMOSqlite._to_json(extra) if extra else None]
+                ),
+            )
+
+        for block in blocks:
+            walk(0, block, None, [])
+        for level, batch in enumerate(batches):
+            connection.executemany(inserts[level], batch)
+        connection.commit()
+
+        index_columns = []
+        for level, (table, _, _) in enumerate(levels):
+            if level > 0:
+                index_columns.append((table, "parent_row_id"))
+            index_columns += [
+                (table, column)
+                for column in level_columns[level]
+                if column.endswith("_id")
+                and not (level + 1 == len(levels) and column == "mhap_id")
+            ]
+        return index_columns
+
+    @staticmethod
+    def sqlite_to_pmo(db_fnp: str | os.PathLike[str]) -> dict:
+        """
+        Read a PMO back from a SQLite database written by pmo_to_sqlite
+        :param db_fnp: the database file
+        :return: the PMO, equal to the one written
+        """
+        if not os.path.exists(db_fnp):
+            raise FileNotFoundError(db_fnp)
+        connection = sqlite3.connect(db_fnp)
+        try:
+            tables = {
+                row[0]
+                for row in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )
+            }
+            if "pmo_sections" not in tables:
+                raise Exception(
+                    f"{db_fnp} is not a PMO database, no pmo_sections table"
+                )
+            ret = {}
+            for section, record_json in connection.execute(
+                "SELECT section, record_json FROM pmo_sections ORDER BY position"
+            ).fetchall():
+                if section == "representative_microhaplotypes":
+                    ret[section] = json.loads(record_json)
+                    ret[section][
+                        "targets"
+                    ] = PMOSqlite._read_representative_microhaplotypes(connection)
+                elif section in PMOSqlite.nested_sections and record_json is None:
+                    ret[section] = PMOSqlite._read_nested_section(
+                        connection, PMOSqlite.nested_sections[section]
+                    )
+                elif section in PMOSqlite.record_sections and record_json is None:
+                    id_name = PMOSqlite.record_sections[section]
+                    ret[section] = [
+                        json.loads(row[0])
+                        for row in connection.execute(
+                            f"SELECT record_json FROM {section} ORDER BY {id_name}"
+                        )
+                    ]
+                else:
+                    ret[section] = json.loads(record_json)
+            return ret
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _read_representative_microhaplotypes(
+        connection: sqlite3.Connection,
+    ) -> list[dict]:
+        """
+        Rebuild the representative_microhaplotypes targets
+        :param connection: the database
+        :return: the targets
+        """
+        targets = []
+        for record_json in connection.execute(
+            "SELECT record_json FROM representative_targets ORDER BY mhaps_target_id"
+        ):
+            target = json.loads(record_json[0])
+            target["microhaplotypes"] = []
+            targets.append(target)
+        for mhaps_target_id, seq, extra_json in connection.execute(
+            "SELECT mhaps_target_id, seq, extra_json FROM representative_microhaplotypes ORDER BY mhaps_target_id, mhap_id"
+        ):
+            targets[mhaps_target_id]["microhaplotypes"].append(
+                {"seq": seq} if extra_json is None else json.loads(extra_json)
+            )
+        return targets
+
+    @staticmethod
+    def _read_nested_section(
+        connection: sqlite3.Connection, levels: list[tuple[str, str, list[str]]]
+    ) -> list[dict]:
+        """
+        Rebuild a per bioinformatics run section from its table per level of nesting
+        :param connection: the database
+        :param levels: the tables of the levels, see nested_sections
+        :return: the section
+        """
+        ret = []
+        parents = None
+        for level, (table, key, fields) in enumerate(levels):
+            child_key = levels[level + 1][1] if level + 1 < len(levels) else None
+            columns = (
+                ["row_id"]
+                + ([] if level == 0 else ["parent_row_id"])
+                + fields
+                + ([child_key + "_count"] if child_key is not None else [])
+                + ["extra_json"]
+            )
+            records = {}
+            for row in connection.execute(
+                f"SELECT {', '.join(PMOSqlite._quote(column) for column in columns)} FROM {table} ORDER BY row_id"
+            ):
+                values = row[2:] if level > 0 else row[1:]
+                record = {
+                    field: value
+                    for field, value in zip(fields, values)
+                    if value is not None
+                }
+                if child_key is not None and values[len(fields)] is not None:
+                    record[child_key] = []
+                if row[-1] is not None:
+                    record.update(json.loads(row[-1]))
+                if child_key is not None:
+                    records[row[0]] = record
+                if level == 0:
+                    ret.append(record)
+                else:
+                    parents[row[1]][key].append(record)
+            parents = records
+        return ret
+
+    @staticmethod
+    def file_hash(fnp: str | os.PathLike[str]) -> str:
+        """
+        Hash the contents of a file
+        :param fnp: the file
+        :return: the sha256 hex digest of the file's bytes
+        """
+        hasher = hashlib.sha256()
+        with open(fnp, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def load_pmo_database(
+        pmo_fnp: str | os.PathLike[str],
+        cache_dir: str | os.PathLike[str] = None,
+        batch_size: int = 100000,
+    ) -> sqlite3.Connection:
+        """
+        Load a PMO file into a read only SQLite database of the tables of pmo_to_sqlite, to run queries against.
+        The detected_microhaplotypes and read_counts_by_stage are streamed in rather than read in whole
+        :param pmo_fnp: the PMO file, can be gzipped
+        :param cache_dir: if given, the database is kept in this directory named by the hash of the PMO file's contents, and later loads of the same contents reuse it rather than loading the PMO again, otherwise the database is in memory
+        :param batch_size: the number of rows to insert per transaction
+        :return: a connection to the database, only queries that don't write are allowed
+        """
+        if not os.path.exists(pmo_fnp):
+            raise FileNotFoundError(pmo_fnp)
+        if cache_dir is None:
+            connection = sqlite3.connect(":memory:")
+            PMOSqlite._write_tables(
+                PMOStreamReader.read_in_pmo_lazily(pmo_fnp),
+                connection,
+                batch_size,
+                True,
+            )
+        else:
+            os.makedirs(cache_dir, exist_ok=True)
+            db_fnp = os.path.join(cache_dir, PMOSqlite.file_hash(pmo_fnp) + ".sqlite")
+            if not os.path.exists(db_fnp):
+                # build under a temporary name so other processes never see a partly loaded database
+                tmp_db_fnp = db_fnp + "." + str(os.getpid()) + ".tmp"
+                try:
+                    PMOSqlite.pmo_to_sqlite(
+                        PMOStreamReader.read_in_pmo_lazily(pmo_fnp),
+                        tmp_db_fnp,
+                        overwrite=True,
+                        batch_size=batch_size,
+                    )
+                    os.replace(tmp_db_fnp, db_fnp)
+                finally:
+                    if os.path.exists(tmp_db_fnp):
+                        os.remove(tmp_db_fnp)
+            connection = sqlite3.connect(
+                pathlib.Path(db_fnp).absolute().as_uri() + "?mode=ro", uri=True
+            )
+        connection.execute("PRAGMA query_only = ON")
+        return connection
+
+    @staticmethod
+    def write_query_results(
+        connection: sqlite3.Connection,
+        sql: str,
+        output_fnp: str,
+        sep: str = "\t",
+        header: bool = True,
+        chunk_size: int = 10000,
+    ) -> int:
+        """
+        Run a query and write its rows to a delimited file as they are fetched, chunk_size rows at a time
+        :param connection: the database, e.g. from load_pmo_database
+        :param sql: a single SQL statement that returns rows, e.g. a SELECT
+        :param output_fnp: the output file, STDOUT or ending in .gz to gzip it
+        :param sep: the delimiter
+        :param header: whether to write the column names as the first line
+        :param chunk_size: the number of rows to fetch at a time
+        :return: the number of rows written
+        """
+        cursor = connection.execute(sql)
+        if cursor.description is None:
+            raise Exception("The SQL statement doesn't return any rows: " + sql)
+        row_count = 0
+        with Utils.smart_open_write(output_fnp) as f:
+            writer = csv.writer(f, delimiter=sep, lineterminator="\n")
+            if header:
+                writer.writerow(column[0] for column in cursor.description)
+            while rows := cursor.fetchmany(chunk_size):
+                writer.writerows(rows)
+                row_count += len(rows)
+        return row_count
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+import copy
+import gzip
+import json
+import os
+import re
+import sys
+from contextlib import contextmanager
+from typing import Iterator
+
+# whitespace allowed between JSON tokens
+_JSON_WS = re.compile(r"[ \t\n\r]*")
+# the characters that change the nesting depth while skipping over a value
+_JSON_STRUCTURAL = re.compile(r'["\[\]{}]')
+# the remainder of a JSON string after its opening quote, including the closing quote
+_JSON_STRING_REMAINDER = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+
+
+class _JSONStreamParser:
+    """
+    A minimal pull parser that walks a JSON document held in a file handle while only keeping a window of the text in memory
+    """
+
+    def __init__(self, handle, chunk_size: int):
+        self._handle = handle
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _read_more(self, size: int = None) -> bool:
+        """
+        Drop the already consumed text and read in the next chunk of the file
+        :param size: how many characters to read, defaults to the chunk size
+        :return: False if the end of the file has been reached
+        """
+        if self._eof:
+            return False
+        if self._pos > 0:
+            self._buf = self._buf[self._pos :]
+            self._pos = 0
+        chunk = self._handle.read(size if size is not None else self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf += chunk
+        return True
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next character without consuming it
+        :return: the next character or an empty string at the end of the file
+        """
+        while True:
+            self._pos = _JSON_WS.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) or not self._read_more():
+                break
+        return self._buf[self._pos] if self._pos < len(self._buf) else ""
+
+    def expect(self, token: str):
+        """
+        Consume the next character, raising if it isn't the expected token
+        :param token: the expected character
+        """
+        found = self.peek()
+        if found != token:
+            raise ValueError(
+                f"Malformed PMO, expected '{token}' but found '{found or 'end of file'}'"
+            )
+        self._pos += 1
+
+    def read_value(self):
+        """
+        Decode the next complete JSON value
+        :return: the decoded value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # grow geometrically so very large values aren't re-decoded many times
+                if not self._read_more(
+                    max(self._chunk_size, len(self._buf) - self._pos)
+                ):
+                    raise
+                continue
+            # a number might continue into the next chunk, only trust it if more text follows it
+            if end == len(self._buf) and self._read_more():
+                continue
+            self._pos = end
+            return value
+
+    def skip_value(self):
+        """
+        Move past the next JSON value without building it
+        """
+        if self.peek() not in ("[", "{"):
+            self.read_value()
+            return
+        depth = 0
+        while True:
+            match = _JSON_STRUCTURAL.search(self._buf, self._pos)
+            if match is None:
+                self._pos = len(self._buf)
+                if not self._read_more():
+                    raise ValueError("Malformed PMO, unexpected end of file")
+                continue
+            if '"' == match.group():
+                string_end = _JSON_STRING_REMAINDER.match(self._buf, match.end())
+                if string_end is None:
+                    # string continues into the next chunk, keep it in the buffer
+                    self._pos = match.start()
+                    if not self._read_more():
+                        raise ValueError("Malformed PMO, unterminated string")
+                    continue
+                self._pos = string_end.end()
+            elif match.group() in ("[", "{"):
+                depth += 1
+                self._pos = match.end()
+            else:
+                depth -= 1
+                self._pos = match.end()
+                if 0 == depth:
+                    return
+
+    def iter_object_keys(self) -> Iterator[str]:
+        """
+        Iterate over the keys of the next JSON object, the value of each key has to be consumed (read, skipped or iterated) before advancing
+        :return: a generator of the object's keys
+        """
+        self.expect("{")
+        if "}" == self.peek():
+            self._pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            if "}" == self.peek():
+                self._pos += 1
+                return
+            self.expect(",")
+
+    def iter_array(self) -> Iterator[None]:
+        """
+        Iterate over the elements of the next JSON array, each element has to be consumed before advancing
+        :return: a generator that yields once per element
+        """
+        self.expect("[")
+        if "]" == self.peek():
+            self._pos += 1
+            return
+        while True:
+            yield
+            if "]" == self.peek():
+                self._pos += 1
+                return
+            self.expect(",")
+
+
+class StreamedPMOSection:
+    """
+    A re-iterable, file backed stand-in for one of the large per bioinformatics run sections of a PMO (detected_microhaplotypes or read_counts_by_stage).
+    Every iteration re-reads the file and yields one dictionary per bioinformatics run whose record list is a generator, so records have to be consumed in order.
+    """
+
+    def __init__(self, fnp: str | os.PathLike[str], section: str, chunk_size: int):
+        self.fnp = fnp
+        self.section = section
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        return PMOStreamReader.iter_section_blocks(
+            self.fnp, self.section, self.chunk_size
+        )
+
+
+class CombinedPMOSection:
+    """
+    A re-iterable concatenation of the same section from several PMOs, where some of the sections can be StreamedPMOSection objects.
+    Every block after the first PMO's is passed through a remapping function as it is iterated over so nothing is held in memory.
+    """
+
+    def __init__(self, sections: list, remap_block):
+        """
+        :param sections: the section (a list of blocks or a StreamedPMOSection) from each PMO
+        :param remap_block: a function taking the PMO index and a block it owns, and returning the block with its ids updated
+        """
+        self.sections = sections
+        self.remap_block = remap_block
+
+    def __iter__(self):
+        for pmo_index, section in enumerate(self.sections):
+            for block in section:
+                if 0 == pmo_index:
+                    yield block
+                elif isinstance(section, list):
+                    # blocks held in memory have to be copied since the section can be iterated over again
+                    yield self.remap_block(pmo_index, copy.deepcopy(block))
+                else:
+                    yield self.remap_block(pmo_index, block)
+
+
+class PMOStreamReader:
+    """
+    A class for reading in PMO files incrementally, without loading the whole document into memory
+    """
+
+    # the sections that hold per sample data, key: section name, val: the key of the list of records per bioinformatics run
+    streamed_sections = {
+        "detected_microhaplotypes": "library_samples",
+        "read_counts_by_stage": "read_counts_by_library_sample_by_stage",
+    }
+
+    default_chunk_size = 1024 * 1024
+
+    @staticmethod
+    @contextmanager
+    def _open_parser(fnp: str | os.PathLike[str], chunk_size: int):
+        """
+        Open a PMO file, can either be compressed(.gz) or uncompressed, for incremental parsing
+        :param fnp: the file name path of the PMO file to read in
+        :param chunk_size: how many characters to read in at a time
+        :return: a parser positioned at the start of the document
+        """
+        if "STDIN" == fnp:
+            yield _JSONStreamParser(sys.stdin, chunk_size)
+        elif str(fnp).endswith(".gz"):
+            with gzip.open(fnp, "rt", encoding="utf-8") as f:
+                yield _JSONStreamParser(f, chunk_size)
+        else:
+            with open(fnp, encoding="utf-8") as f:
+                yield _JSONStreamParser(f, chunk_size)
+
+    @staticmethod
+    def read_in_pmo_sections(
+        fnp: str | os.PathLike[str],
+        sections: list[str] = None,
+        skip_sections: list[str] = None,
+        chunk_size: int = default_chunk_size,
+    ) -> dict:
+        """
+        Read in only some of the top level sections of a PMO, the other sections are scanned over without being built
+        :param fnp: the file name path of the PMO file to read in
+        :param sections: the sections to read in, if None all sections not in skip_sections are read in
+        :param skip_sections: the sections to skip over
+        :param chunk_size: how many characters to read in at a time
+        :return: a dictionary of the sections read in
+        """
+        ret = {}
+        with PMOStreamReader._open_parser(fnp, chunk_size) as parser:
+            for key in parser.iter_object_keys():
+                if (sections is None or key in sections) and (
+                    skip_sections is None or key not in skip_sections
+                ):
+                    ret[key] = parser.read_value()
+                else:
+                    parser.skip_value()
+        return ret
+
+    @staticmethod
+    def _iter_records(parser: _JSONStreamParser) -> Iterator[dict]:
+        for _ in parser.iter_array():
+            yield parser.read_value()
+
+    @staticmethod
+    def iter_section_blocks(
+        fnp: str | os.PathLike[str],
+        section: str = "detected_microhaplotypes",
+        chunk_size: int = default_chunk_size,
+    ) -> Iterator[dict]:
+        """
+        Iterate over the per bioinformatics run blocks of detected_microhaplotypes or read_counts_by_stage.
+        Each block is yielded as soon as its bioinformatics_run_id is known and its list of records is a generator reading from the file,
+        if a block lists its records before its bioinformatics_run_id the records for that block are read in whole instead
+        :param fnp: the file name path of the PMO file to read in
+        :param section: the section to iterate over, either detected_microhaplotypes or read_counts_by_stage
+        :param chunk_size: how many characters to read in at a time
+        :return: a generator of dictionaries, one per block in the section
+        """
+        if section not in PMOStreamReader.streamed_sections:
+            raise Exception(
+                "Can only stream the sections "
+                + ",".join(PMOStreamReader.streamed_sections.keys())
+                + ", not "
+                + section
+            )
+        records_key = PMOStreamReader.streamed_sections[section]
+        with PMOStreamReader._open_parser(fnp, chunk_size) as parser:
+            for key in parser.iter_object_keys():
+                if key != section:
+                    parser.skip_value()
+                    continue
+                for _ in parser.iter_array():
+                    block = {}
+                    yielded = False
+                    for block_key in parser.iter_object_keys():
+                        if (
+                            records_key == block_key
+                            and "bioinformatics_run_id" in block
+                        ):
+                            records = PMOStreamReader._iter_records(parser)
+                            block[records_key] = records
+                            yield block
+                            yielded = True
+                            # consume whatever the caller didn't so the parser is past the records
+                            for _ in records:
+                                pass
+                        else:
+                            block[block_key] = parser.read_value()
+                    if not yielded:
+                        yield block
+
+    @staticmethod
+    def iter_detected_microhaplotypes(
+        fnp: str | os.PathLike[str], chunk_size: int = default_chunk_size
+    ) -> Iterator[tuple[int, dict]]:
+        """
+        Iterate over the detected microhaplotypes of a PMO one library sample at a time
+        :param fnp: the file name path of the PMO file to read in
+        :param chunk_size: how many characters to read in at a time
+        :return: a generator of tuples of bioinformatics_run_id and the library sample's entry (library_sample_id and target_results)
+        """
+        for block in PMOStreamReader.iter_section_blocks(
+            fnp, "detected_microhaplotypes", chunk_size
+        ):
+            for library_sample in block["library_samples"]:
+                yield block["bioinformatics_run_id"], library_sample
+
+    @staticmethod
+    def iter_target_results(
+        fnp: str | os.PathLike[str], chunk_size: int = default_chunk_size
+    ) -> Iterator[tuple[int, int, dict]]:
+        """
+        Iterate over the detected microhaplotypes of a PMO one target result at a time
+        :param fnp: the file name path of the PMO file to read in
+        :param chunk_size: how many characters to read in at a time
+        :return: a generator of tuples of bioinformatics_run_id, library_sample_id and the target result (mhaps_target_id and mhaps)
+        """
+        for (
+            bioinformatics_run_id,
+            library_sample,
+        ) in PMOStreamReader.iter_detected_microhaplotypes(fnp, chunk_size):
+            for target_result in library_sample["target_results"]:
+                yield (
+                    bioinformatics_run_id,
+                    library_sample["library_sample_id"],
+                    target_result,
+                )
+
+    @staticmethod
+    def read_in_pmo_lazily(
+        fnp: str | os.PathLike[str], chunk_size: int = default_chunk_size
+    ) -> dict:
+        """
+        Read in a PMO with all sections loaded except detected_microhaplotypes and read_counts_by_stage, which are replaced by
+        StreamedPMOSection objects that re-read the file each time they are iterated over.
+        Functions that only loop over those sections (rather than index into them) can use this in place of a fully loaded PMO
+        :param fnp: the file name path of the PMO file to read in, cannot be STDIN since the file is re-read
+        :param chunk_size: how many characters to read in at a time
+        :return: a PMO like object
+        """
+        if "STDIN" == fnp:
+            raise Exception("Cannot lazily read a PMO from STDIN")
+        ret = {}
+        with PMOStreamReader._open_parser(fnp, chunk_size) as parser:
+            for key in parser.iter_object_keys():
+                if key in PMOStreamReader.streamed_sections:
+                    parser.skip_value()
+                    ret[key] = StreamedPMOSection(fnp, key, chunk_size)
+                else:
+                    ret[key] = parser.read_value()
+        return ret
@@ -5,6 +5,7 @@ import json
 import gzip
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 from pmotools.utils.small_utils import Utils
 
@@ -14,6 +15,9 @@ class PMOWriter:
     A class for writing a PMO to file
     """
 
+    # the same encoder json.dump(indent=2) uses
+    _json_encoder = json.JSONEncoder(indent=2)
+
     @staticmethod
     def write_out_pmo(pmo, fnp: str | os.PathLike[str], overwrite: bool = False):
         """
@@ -25,13 +29,99 @@ class PMOWriter:
         """
         Utils.outputfile_check(fnp, overwrite)
         if fnp == "STDOUT":
-            json.dump(pmo, sys.stdout, indent=2)
+            PMOWriter.dump_pmo(pmo, sys.stdout)
         elif fnp.endswith(".gz"):
             with gzip.open(fnp, "wt", encoding="utf-8") as zipfile:
-                json.dump(pmo, zipfile, indent=2)
+                PMOWriter.dump_pmo(pmo, zipfile)
         else:
             with open(fnp, "w", encoding="utf-8") as f:
-                json.dump(pmo, f, indent=2)
+                PMOWriter.dump_pmo(pmo, f)
+
+    @staticmethod
+    def write_out_pmos(
+        pmos: dict[str, dict], overwrite: bool = False, threads: int = 1
+    ):
+        """
+        Write out multiple PMOs (e.g. the shards from PMOProcessor.split_pmo), each is written to zip file if its output fnp name ends with .gz.
+        With more than 1 thread the PMOs are serialized and written in a process pool
+        :param pmos: key: the output filename path, val: the PMO to write to it
+        :param overwrite: whether to overwrite output files if they exist
+        :param threads: the number of worker processes to write the files with
+        :return: nothing
+        """
+        if "STDOUT" in pmos and len(pmos) > 1:
+            raise Exception("Cannot write multiple PMOs to STDOUT")
+        # check all the outputs up front so nothing is written if any of them can't be
+        for fnp in pmos:
+            Utils.outputfile_check(fnp, overwrite)
+        if threads <= 1 or len(pmos) <= 1:
+            for fnp, pmo in pmos.items():
+                PMOWriter.write_out_pmo(pmo, fnp, overwrite)
+            return
+        with ProcessPoolExecutor(max_workers=threads) as executor:
+            futures = [
+                executor.submit(PMOWriter.write_out_pmo, pmo, fnp, overwrite)
+                for fnp, pmo in pmos.items()
+            ]
+            for future in futures:
+                future.result()
+
+    @staticmethod
+    def _is_lazy(value) -> bool:
+        """
+        Whether a value is an iterable that should be written out as a JSON array as it is iterated over (e.g. a generator or a StreamedPMOSection)
+        :param value: the value to check
+        :return: True if the value is a lazy iterable
+        """
+        return not isinstance(
+            value, (str, bytes, dict, list, tuple, int, float, bool, type(None))
+        ) and hasattr(value, "__iter__")
+
+    @staticmethod
+    def _iter_json_chunks(value, level: int = 0):
+        """
+        Generate the text of a JSON value formatted exactly as json.dump(indent=2) would, iterating over any lazy iterables it holds
+        :param value: the value to serialize
+        :param level: the nesting level of the value
+        :return: a generator of chunks of text
+        """
+        indent = "\n" + "  " * (level + 1)
+        if PMOWriter._is_lazy(value):
+            first = True
+            for element in value:
+                yield ("[" if first else ",") + indent
+                yield from PMOWriter._iter_json_chunks(element, level + 1)
+                first = False
+            yield "[]" if first else "\n" + "  " * level + "]"
+        elif (
+            isinstance(value, dict)
+            and value
+            and any(PMOWriter._is_lazy(element) for element in value.values())
+        ):
+            first = True
+            for key, element in value.items():
+                yield ("{" if first else ",") + indent + json.dumps(key) + ": "
+                yield from PMOWriter._iter_json_chunks(element, level + 1)
+                first = False
+            yield "\n" + "  " * level + "}"
+        elif 0 == level:
+            yield from PMOWriter._json_encoder.iterencode(value)
+        else:
+            # JSON strings can't hold raw new lines so re-indenting every new line is safe
+            for chunk in PMOWriter._json_encoder.iterencode(value):
+                yield chunk.replace("\n", indent[:-2])
+
+    @staticmethod
+    def dump_pmo(pmo, handle):
+        """
+        Write a PMO to an open file handle formatted the same as json.dump(indent=2).
+        Any section held as a lazy iterable (e.g. read in with PMOStreamReader or combined from lazily read PMOs) is streamed to the handle rather than built in memory
+        :param pmo: the PMO to write
+        :param handle: the file handle to write to
+        :return: nothing
+        """
+        for chunk in PMOWriter._iter_json_chunks(pmo):
+            handle.write(chunk)
 
     @staticmethod
     def add_pmo_extension_as_needed(output_fnp, gzip: bool = True):
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+
+
+class PopulationDiversity:
+    """
+    Population level diversity statistics from a table of allele counts per population, e.g. the output of
+    PMOProcessor.extract_allele_counts_freq_from_pmo with collapse_across_runs=True and group_by_fields set to the specimen meta
+    fields defining the populations (e.g. collection_country and collection_year).
+
+    The counts are held as flat arrays sorted by population, target and allele, so every statistic is computed from the one
+    table with vectorized sums per (population, target) rather than a pass over the samples per population or pair of populations.
+    The allele counts are the number of library samples each allele was detected in and N, the target_total, their sum.
+
+    Per population and target
+        expected_heterozygosity: N / (N - 1) x (1 - sum of p^2), NaN when N < 2
+        effective_allele_number: 1 / sum of p^2
+        allele_richness: the expected number of alleles in a random subsample of g of the N, sum of 1 - C(N - Ni, g) / C(N, g), NaN when N < g
+    Per pair of populations
+        fst: Hudson's Fst, 1 - sum of Hw / sum of Hb over the targets with N >= 2 in both, where Hw is the mean of the two
+        expected heterozygosities and Hb = 1 - sum of pA x pB
+    """
+
+    def __init__(self, allele_counts: pd.DataFrame, group_by_fields: list[str]):
+        """
+        :param allele_counts: a table with the group_by_fields and target_name, mhap_id and count columns, one row per allele per population
+        :param group_by_fields: the columns defining the populations
+        """
+        self.group_by_fields = list(group_by_fields)
+        missing = [
+            col
+            for col in self.group_by_fields + ["target_name", "mhap_id", "count"]
+            if col not in allele_counts.columns
+        ]
+        if len(missing) > 0:
+            raise Exception("allele_counts is missing columns: " + ", ".join(missing))
+        if len(self.group_by_fields) > 0:
+            population_codes, self.populations = pd.MultiIndex.from_frame(
+                allele_counts[self.group_by_fields]
+            ).factorize(sort=True)
+        else:
+            # everything is one population
+            population_codes = np.zeros(len(allele_counts), dtype=np.int64)
+            self.populations = pd.Index(["all"])
+        target_codes, self.target_names = pd.factorize(
+            allele_counts["target_name"], sort=True
+        )
+        allele_codes, allele_keys = pd.factorize(
+            pd.MultiIndex.from_arrays(
+                [target_codes, allele_counts["mhap_id"].to_numpy()]
+            ),
+            sort=True,
+        )
+        self.population_number = len(self.populations)
+        self.target_number = len(self.target_names)
+        # the target of each allele, alleles are sorted by target so each target's alleles are a contiguous run
+        self.allele_targets = allele_keys.get_level_values(0).to_numpy()
+        self.target_allele_starts = np.searchsorted(
+            self.allele_targets, np.arange(self.target_number)
+        )
+
+        order = np.lexsort((allele_codes, population_codes))
+        self.population_codes = population_codes[order]
+        self.target_codes = target_codes[order]
+        self.allele_codes = allele_codes[order]
+        self.counts = allele_counts["count"].to_numpy()[order].astype(np.int64)
+        # the (population, target) cell of each row and the totals and allele numbers per cell
+        self.cells = self.population_codes * self.target_number + self.target_codes
+        cell_number = self.population_number * self.target_number
+        self.totals = np.bincount(
+            self.cells, weights=self.counts, minlength=cell_number
+        ).astype(np.int64)
+        self.allele_numbers = np.bincount(self.cells, minlength=cell_number)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.freqs = self.counts / self.totals[self.cells]
+        self.homozygosity = np.bincount(
+            self.cells, weights=self.freqs * self.freqs, minlength=cell_number
+        )
+
+    def expected_heterozygosity(self) -> np.ndarray:
+        """
+        The unbiased expected heterozygosity of each (population, target) cell
+        :return: an array of shape (population_number, target_number), NaN for cells with fewer than 2 observations
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ret = self.totals / (self.totals - 1) * (1 - self.homozygosity)
+        return np.where(self.totals >= 2, ret, np.nan).reshape(
+            self.population_number, self.target_number
+        )
+
+    def allele_richness(self, rarefaction_size: int = None) -> np.ndarray:
+        """
+        The rarefied allele richness of each (population, target) cell
+        :param rarefaction_size: the subsample size g, by default per target the smallest N of the populations the target was observed in
+        :return: an array of shape (population_number, target_number), NaN for cells with N < g or no observations
+        """
+        totals = self.totals.reshape(self.population_number, self.target_number)
+        if rarefaction_size is None:
+            sizes = np.where(totals > 0, totals, np.iinfo(np.int64).max).min(axis=0)
+        else:
+            if rarefaction_size < 1:
+                raise Exception(
+                    "rarefaction_size must be at least 1, not " + str(rarefaction_size)
+                )
+            sizes = np.full(self.target_number, rarefaction_size, dtype=np.int64)
+        # log(n!) for every n up to the largest total, to get the binomial coefficients without overflow
+        log_factorials = np.concatenate(
+            (
+                [0.0],
+                np.cumsum(np.log(np.arange(1, max(int(totals.max(initial=0)), 1) + 1))),
+            )
+        )
+
+        def log_choose(n, k):
+            return log_factorials[n] - log_factorials[k] - log_factorials[n - k]
+
+        row_totals = self.totals[self.cells]
+        row_sizes = sizes[self.target_codes]
+        valid = row_totals >= row_sizes
+        remaining = row_totals - self.counts
+        # the chance the allele is missing from the subsample, 0 when there are fewer than g other observations
+        missing_chance = np.zeros(len(self.counts))
+        drawable = valid & (remaining >= row_sizes)
+        missing_chance[drawable] = np.exp(
+            log_choose(remaining[drawable], row_sizes[drawable])
+            - log_choose(row_totals[drawable], row_sizes[drawable])
+        )
+        ret = np.bincount(
+            self.cells[valid],
+            weights=1 - missing_chance[valid],
+            minlength=len(self.totals),
+        ).reshape(self.population_number, self.target_number)
+        return np.where((totals > 0) & (totals >= sizes[None, :]), ret, np.nan)
+
+    def population_values(self, suffix: str = "") -> dict[str, np.ndarray]:
+        """
+        The group_by_fields values of each population
+        :param suffix: added to the field names
+        :return: a dict of field name + suffix to an array of the value of each population
+        """
+        return {
+            field + suffix: self.populations.get_level_values(level).to_numpy()
+            for level, field in enumerate(self.group_by_fields)
+        }
+
+    def calc_target_diversity(self, rarefaction_size: int = None) -> pd.DataFrame:
+        """
+        Calculate the diversity of each target within each population
+        :param rarefaction_size: the subsample size for the allele richness, see allele_richness
+        :return: a pandas DataFrame, columns = [*group_by_fields, target_name, target_total, allele_number, expected_heterozygosity, effective_allele_number, allele_richness], only the targets observed in each population
+        """
+        observed = self.totals > 0
+        population_index, target_index = np.divmod(
+            np.flatnonzero(observed), self.target_number
+        )
+        return pd.DataFrame(
+            {
+                **{
+                    field: values[population_index]
+                    for field, values in self.population_values().items()
+                },
+                "target_name": np.asarray(self.target_names)[target_index],
+                "target_total": self.totals[observed],
+                "allele_number": self.allele_numbers[observed],
+                "expected_heterozygosity": self.expected_heterozygosity().ravel()[
+                    observed
+                ],
+                "effective_allele_number": 1 / self.homozygosity[observed],
+                "allele_richness": self.allele_richness(rarefaction_size).ravel()[
+                    observed
+                ],
+            }
+        )
+
+    def calc_pairwise_fst(self) -> pd.DataFrame:
+        """
+        Calculate Hudson's Fst between every pair of populations
+        :return: a pandas DataFrame, columns = [*group_by_fields with _1 appended, *group_by_fields with _2 appended, target_number, fst], one row per pair, fst is NaN for pairs without any shared targets
+        """
+        heterozygosity = self.expected_heterozygosity()
+        typed = ~np.isnan(heterozygosity)
+        within = np.nan_to_num(heterozygosity)
+        # dense population x allele frequencies, the products are summed per target with reduceat as each target's alleles are contiguous
+        # and every target has at least one allele
+        freqs = np.zeros((self.population_number, len(self.allele_targets)))
+        freqs[self.population_codes, self.allele_codes] = self.freqs
+
+        pairs = []
+        for first in range(self.population_number - 1):
+            others = np.arange(first + 1, self.population_number)
+            shared = typed[first][None, :] & typed[others]
+            shared_freq = np.zeros((len(others), self.target_number))
+            if self.target_number > 0:
+                shared_freq = np.add.reduceat(
+                    freqs[first][None, :] * freqs[others],
+                    self.target_allele_starts,
+                    axis=1,
+                )
+            between = np.where(shared, 1 - shared_freq, 0).sum(axis=1)
+            within_sum = np.where(
+                shared, (within[first][None, :] + within[others]) / 2, 0
+            ).sum(axis=1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                fst = np.where(between > 0, 1 - within_sum / between, np.nan)
+            pairs.append((np.full(len(others), first), others, shared.sum(axis=1), fst))
+        if len(pairs) > 0:
+            firsts, seconds, target_number, fst = (
+                np.concatenate(column) for column in zip(*pairs)
+            )
+        else:
+            firsts, seconds, target_number, fst = (np.array([], dtype=np.int64),) * 4
+        return pd.DataFrame(
+            {
+                **{
+                    field: values[firsts]
+                    for field, values in self.population_values("_1").items()
+                },
+                **{
+                    field: values[seconds]
+                    for field, values in self.population_values("_2").items()
+                },
+                "target_number": target_number.astype(np.int64),
+                "fst": fst.astype(np.float64),
+            }
+        )
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+import calendar
+import datetime
+import itertools
+import re
+from collections import Counter, defaultdict
+from functools import cached_property
+
+
+class SpecimenMetaIndex:
+    """
+    An index of the meta fields of the specimens in specimen_info, each field's values (as strings) are encoded as a code per specimen.
+    Sets of specimens are held as bitsets, python ints where bit i is set if specimen_id i is in the set, so selections are combined with & and |.
+    The codes of a field are built the first time the field is queried, a bitset is only built for the specimens a selection matches.
+
+    Selections take a list of accepted values per field, any value given as low..high is a range (inclusive, either end can be left empty)
+    and matches numeric values between low and high or dates (YYYY, YYYY-MM or YYYY-MM-DD) that fall completely between the two, e.g.
+    host_age=..5 or collection_date=2018-01..2018
+    """
+
+    range_separator = ".."
+    date_pattern = re.compile(r"(\d{4})(?:-(\d{2})(?:-(\d{2}))?)?")
+
+    def __init__(self, specimen_info: list[dict]):
+        """
+        :param specimen_info: the specimen_info of a PMO
+        """
+        self.specimen_info = specimen_info
+        # key: field, val: the field's values encoded as a code per specimen, see _value_codes, filled in as fields are queried
+        self._field_value_codes = {}
+
+    @property
+    def specimen_count(self) -> int:
+        return len(self.specimen_info)
+
+    @cached_property
+    def all_specimens(self) -> int:
+        """
+        The bitset of all specimens
+        """
+        return (1 << self.specimen_count) - 1
+
+    @cached_property
+    def _field_specimen_counts(self) -> dict[str, int]:
+        """
+        key: field, val: the number of specimens with the field, fields are in the order they are first seen
+        """
+        return dict(Counter(itertools.chain.from_iterable(self.specimen_info)))
+
+    def _value_codes(self, field: str) -> tuple[dict[str, int], list, list[int]]:
+        """
+        Get the values of a field encoded as a code per specimen, built the first time the field is queried.
+        Codes are kept in one flat list rather than a list of specimen_ids per value so building them doesn't allocate an object per value
+        :param field: the meta field
+        :return: the code of each value as a string, the value of each code, and the code of each specimen (-1 if it doesn't have the field)
+        """
+        ret = self._field_value_codes.get(field)
+        if ret is None:
+            codes = {}
+            values = []
+            specimen_codes = []
+            missing = object()
+            for specimen in self.specimen_info:
+                value = specimen.get(field, missing)
+                if value is missing:
+                    specimen_codes.append(-1)
+                    continue
+                value_str = str(value)
+                code = codes.get(value_str)
+                if code is None:
+                    code = codes[value_str] = len(values)
+                    values.append(value)
+                specimen_codes.append(code)
+            ret = self._field_value_codes[field] = (codes, values, specimen_codes)
+        return ret
+
+    @property
+    def fields(self) -> list[str]:
+        """
+        The meta fields found in specimen_info, in the order they are first seen
+        """
+        return list(self._field_specimen_counts)
+
+    def field_specimen_count(self, field: str) -> int:
+        """
+        Get the number of specimens that have a field
+        :param field: the meta field
+        :return: the number of specimens with the field
+        """
+        return self._field_specimen_counts.get(field, 0)
+
+    def _ids_to_bitset(self, specimen_ids) -> int:
+        """
+        Convert specimen_ids into a bitset
+        :param specimen_ids: the ids to convert
+        :return: the bitset
+        """
+        bits = bytearray((self.specimen_count + 7) // 8)
+        for specimen_id in specimen_ids:
+            bits[specimen_id >> 3] |= 1 << (specimen_id & 7)
+        return int.from_bytes(bits, "little")
+
+    @staticmethod
+    def bitset_to_ids(bitset: int) -> list[int]:
+        """
+        Convert a bitset into the specimen_ids it holds
+        :param bitset: the bitset to convert
+        :return: the specimen_ids in increasing order
+        """
+        return [
+            specimen_id
+            for specimen_id, bit in enumerate(reversed(bin(bitset)[2:]))
+            if bit == "1"
+        ]
+
+    @staticmethod
+    def _parse_date(value: str, end: bool) -> datetime.date:
+        """
+        Parse a YYYY, YYYY-MM or YYYY-MM-DD date
+        :param value: the date
+        :param end: if True, the last day of the period of a partial date, otherwise the first day
+        :return: the date, or None if the value isn't a date
+        """
+        match = SpecimenMetaIndex.date_pattern.fullmatch(value.strip())
+        if match is None:
+            return None
+        year = int(match.group(1))
+        month = int(match.group(2)) if match.group(2) else (12 if end else 1)
+        try:
+            if match.group(3):
+                day = int(match.group(3))
+            else:
+                day = calendar.monthrange(year, month)[1] if end else 1
+            return datetime.date(year, month, day)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _parse_number(value) -> float:
+        """
+        Parse a number
+        :param value: the value to parse
+        :return: the number, or None if the value isn't a number
+        """
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return value
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _in_range(value, low: str, high: str) -> bool:
+        """
+        Check whether a meta value falls within a range, numbers are compared as numbers and dates are compared by the whole period they cover
+        :param value: the meta value
+        :param low: the lower bound (inclusive), empty for no lower bound
+        :param high: the upper bound (inclusive), empty for no upper bound
+        :return: True if the value is within the range
+        """
+        if isinstance(value, str) and SpecimenMetaIndex.date_pattern.fullmatch(
+            value.strip()
+        ):
+            value_start = SpecimenMetaIndex._parse_date(value, False)
+            value_end = SpecimenMetaIndex._parse_date(value, True)
+            if value_start is None:
+                return False
+            if low:
+                low_date = SpecimenMetaIndex._parse_date(low, False)
+                if low_date is None or value_start < low_date:
+                    return False
+            if high:
+                high_date = SpecimenMetaIndex._parse_date(high, True)
+                if high_date is None or value_end > high_date:
+                    return False
+            return True
+        number = SpecimenMetaIndex._parse_number(value)
+        if number is None:
+            return False
+        if low:
+            low_number = SpecimenMetaIndex._parse_number(low)
+            if low_number is None or number < low_number:
+                return False
+        if high:
+            high_number = SpecimenMetaIndex._parse_number(high)
+            if high_number is None or number > high_number:
+                return False
+        return True
+
+    def select(self, field: str, values: list[str]) -> int:
+        """
+        Get the specimens with a field matching any of the accepted values
+        :param field: the meta field
+        :param values: the accepted values, compared to the field's value as a string, values given as low..high also select the range
+        :return: the bitset of matching specimens
+        """
+        codes, field_values, specimen_codes = self._value_codes(field)
+        selected = set()
+        for value in values:
+            code = codes.get(value)
+            if code is not None:
+                selected.add(code)
+            if SpecimenMetaIndex.range_separator in value:
+                low, high = value.split(SpecimenMetaIndex.range_separator, 1)
+                # only ranges need to look at all the values of the field
+                for code, field_value in enumerate(field_values):
+                    if SpecimenMetaIndex._in_range(
+                        field_value, low.strip(), high.strip()
+                    ):
+                        selected.add(code)
+        if not selected:
+            return 0
+        return self._ids_to_bitset(
+            specimen_id
+            for specimen_id, code in enumerate(specimen_codes)
+            if code in selected
+        )
+
+    def select_group(self, criteria: dict[str, list[str]]) -> int:
+        """
+        Get the specimens matching all the criteria of a group
+        :param criteria: key: field, val: the accepted values of the field
+        :return: the bitset of matching specimens
+        """
+        ret = self.all_specimens
+        for field, values in criteria.items():
+            ret &= self.select(field, values)
+            if ret == 0:
+                break
+        return ret
+
+    def select_groups(self, selected_meta_groups: dict) -> dict[object, int]:
+        """
+        Get the specimens matching each group of criteria
+        :param selected_meta_groups: key1: group, key2: field, val: the accepted values of the field, see PMOProcessor.parse_meta_fields_values
+        :return: key: group, val: the bitset of matching specimens
+        """
+        return {
+            group_name: self.select_group(criteria)
+            for group_name, criteria in selected_meta_groups.items()
+        }
+
+    def count_by_field_values(
+        self, meta_fields: list[str], missing_value: str = "NA"
+    ) -> dict[tuple, int]:
+        """
+        Count the specimens for each combination of values of meta fields
+        :param meta_fields: the meta fields
+        :param missing_value: the value used when a specimen doesn't have a field, a specimen with this as its value is counted together with the specimens missing the field
+        :return: key: the values of the fields as strings, val: the number of specimens, only combinations with at least one specimen are given
+        """
+        ret = defaultdict(int)
+        for specimen in self.specimen_info:
+            ret[
+                tuple(
+                    str(specimen[field]) if field in specimen else missing_value
+                    for field in meta_fields
+                )
+            ] += 1
+        return dict(ret)
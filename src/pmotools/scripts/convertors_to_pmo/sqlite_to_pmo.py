@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+import argparse
+
+
+from pmotools.pmo_engine.pmo_sqlite import PMOSqlite
+from pmotools.pmo_engine.pmo_writer import PMOWriter
+from pmotools.utils.small_utils import Utils
+
+
+def parse_args_sqlite_to_pmo():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--file",
+        type=str,
+        required=True,
+        help="a SQLite database written by pmo_to_sqlite",
+    )
+    parser.add_argument("--output", type=str, required=True, help="Output PMO file")
+    parser.add_argument(
+        "--overwrite", action="store_true", help="If output file exists, overwrite it"
+    )
+
+    return parser.parse_args()
+
+
+def sqlite_to_pmo():
+    args = parse_args_sqlite_to_pmo()
+
+    # set up output
+    args.output = PMOWriter.add_pmo_extension_as_needed(
+        args.output, args.output.endswith(".gz")
+    )
+    Utils.outputfile_check(args.output, args.overwrite)
+
+    # read in the PMO from the database
+    pmo = PMOSqlite.sqlite_to_pmo(args.file)
+
+    # write
+    PMOWriter.write_out_pmo(pmo, args.output, args.overwrite)
+
+
+if __name__ == "__main__":
+    sqlite_to_pmo()
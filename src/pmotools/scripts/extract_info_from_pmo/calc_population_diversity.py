@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+
+
+from pmotools.pmo_engine.pmo_processor import PMOProcessor
+from pmotools.pmo_engine.pmo_reader import PMOReader
+from pmotools.utils.small_utils import Utils
+
+
+def parse_args_calc_population_diversity():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, required=True, help="PMO file")
+    parser.add_argument(
+        "--group_by_fields",
+        type=str,
+        required=True,
+        help="comma separated fields of library_sample_info or specimen_info whose combined values define the populations, e.g. collection_country,collection_year, use project_name to group by project",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="STDOUT",
+        required=False,
+        help="output file for the per population per target diversity",
+    )
+    parser.add_argument(
+        "--fst_output",
+        type=str,
+        required=False,
+        help="if given, also write the pairwise Fst between the populations to this file",
+    )
+    parser.add_argument(
+        "--delim",
+        default="tab",
+        type=str,
+        required=False,
+        help="the delimiter of the output text file, examples input tab,comma but can also be the actual delimiter",
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="If output file exists, overwrite it"
+    )
+    parser.add_argument(
+        "--read_count_minimum",
+        default=0.0,
+        type=float,
+        required=False,
+        help="the minimum read count (inclusive) for detected haplotypes to be counted",
+    )
+    parser.add_argument(
+        "--within_target_freq_minimum",
+        default=0.0,
+        type=float,
+        required=False,
+        help="the minimum fraction (inclusive) of the reads of its target within its library sample for detected haplotypes to be counted",
+    )
+    parser.add_argument(
+        "--rarefaction_size",
+        type=int,
+        required=False,
+        help="the number of observations to rarefy the allele richness to, by default per target the smallest number observed in any population",
+    )
+
+    return parser.parse_args()
+
+
+def calc_population_diversity():
+    args = parse_args_calc_population_diversity()
+
+    # check files
+    output_delim, output_extension = Utils.process_delimiter_and_output_extension(
+        args.delim, gzip=args.output.endswith(".gz")
+    )
+    args.output = (
+        args.output
+        if "STDOUT" == args.output
+        else Utils.appendStrAsNeeded(args.output, output_extension)
+    )
+    Utils.inputOutputFileCheck(args.file, args.output, args.overwrite)
+    if args.fst_output is not None:
+        args.fst_output = Utils.appendStrAsNeeded(args.fst_output, output_extension)
+        Utils.inputOutputFileCheck(args.file, args.fst_output, args.overwrite)
+
+    # read in PMO
+    pmo = PMOReader.read_in_pmo(args.file)
+
+    # calc, the allele counts of all the populations are gathered once for both tables
+    population_diversity = PMOProcessor.get_population_diversity(
+        pmo,
+        Utils.parse_delimited_input_or_file(args.group_by_fields, ","),
+        args.read_count_minimum,
+        args.within_target_freq_minimum,
+    )
+
+    # write out
+    population_diversity.calc_target_diversity(args.rarefaction_size).to_csv(
+        sys.stdout if "STDOUT" == args.output else args.output,
+        sep=output_delim,
+        index=False,
+    )
+    if args.fst_output is not None:
+        population_diversity.calc_pairwise_fst().to_csv(
+            args.fst_output, sep=output_delim, index=False
+        )
+
+
+if __name__ == "__main__":
+    calc_population_diversity()
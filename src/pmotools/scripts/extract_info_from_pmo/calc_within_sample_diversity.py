@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+
+
+from pmotools.pmo_engine.pmo_processor import PMOProcessor
+from pmotools.pmo_engine.pmo_reader import PMOReader
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
+from pmotools.utils.small_utils import Utils
+
+
+def parse_args_calc_within_sample_diversity():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, required=True, help="PMO file")
+    parser.add_argument(
+        "--output", type=str, default="STDOUT", required=False, help="output file"
+    )
+    parser.add_argument(
+        "--delim",
+        default="tab",
+        type=str,
+        required=False,
+        help="the delimiter of the output text file, examples input tab,comma but can also be the actual delimiter",
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="If output file exists, overwrite it"
+    )
+    parser.add_argument(
+        "--read_count_minimum",
+        default=0.0,
+        type=float,
+        required=False,
+        help="the minimum read count (inclusive) for detected haplotypes to be counted",
+    )
+    parser.add_argument(
+        "--within_target_freq_minimum",
+        default=0.0,
+        type=float,
+        required=False,
+        help="the minimum fraction (inclusive) of the reads of its target within its library sample for detected haplotypes to be counted",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="stream the detected microhaplotypes from the file rather than loading the whole PMO, lowers memory usage for large PMOs",
+    )
+
+    return parser.parse_args()
+
+
+def calc_within_sample_diversity():
+    args = parse_args_calc_within_sample_diversity()
+
+    # check files
+    output_delim, output_extension = Utils.process_delimiter_and_output_extension(
+        args.delim, gzip=args.output.endswith(".gz")
+    )
+    args.output = (
+        args.output
+        if "STDOUT" == args.output
+        else Utils.appendStrAsNeeded(args.output, output_extension)
+    )
+    Utils.inputOutputFileCheck(args.file, args.output, args.overwrite)
+
+    # read in PMO
+    if args.stream:
+        pmo = PMOStreamReader.read_in_pmo_lazily(args.file)
+    else:
+        pmo = PMOReader.read_in_pmo(args.file)
+
+    # calc
+    diversity_df = PMOProcessor.calc_within_sample_diversity(
+        pmo, args.read_count_minimum, args.within_target_freq_minimum
+    )
+
+    # write out
+    diversity_df.to_csv(
+        sys.stdout if "STDOUT" == args.output else args.output,
+        sep=output_delim,
+        index=False,
+    )
+
+
+if __name__ == "__main__":
+    calc_within_sample_diversity()
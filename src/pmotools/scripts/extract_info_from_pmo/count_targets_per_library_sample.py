@@ -5,6 +5,7 @@ import sys
 
 from pmotools.pmo_engine.pmo_processor import PMOProcessor
 from pmotools.pmo_engine.pmo_reader import PMOReader
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
 from pmotools.utils.small_utils import Utils
 
 
@@ -31,6 +32,11 @@ def parse_args_count_targets_per_library_sample():
         required=False,
         help="the minimum read count (inclusive) to be counted as covered by sample",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="stream the detected microhaplotypes from the file rather than loading the whole PMO, lowers memory usage for large PMOs",
+    )
 
     return parser.parse_args()
 
@@ -50,7 +56,10 @@ def count_targets_per_library_sample():
     Utils.inputOutputFileCheck(args.file, args.output, args.overwrite)
 
     # read in PMO
-    pmo = PMOReader.read_in_pmo(args.file)
+    if args.stream:
+        pmo = PMOStreamReader.read_in_pmo_lazily(args.file)
+    else:
+        pmo = PMOReader.read_in_pmo(args.file)
 
     # count
     counts_df = PMOProcessor.count_targets_per_library_sample(
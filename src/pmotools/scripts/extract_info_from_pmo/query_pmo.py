@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import argparse
+import os
+
+
+from pmotools.pmo_engine.pmo_sqlite import PMOSqlite
+from pmotools.utils.small_utils import Utils
+
+
+def parse_args_query_pmo():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, required=True, help="PMO file")
+    parser.add_argument(
+        "--sql",
+        type=str,
+        required=True,
+        help='the SQL query to run, or a file containing it, e.g. --sql "SELECT library_sample_id, COUNT(*) FROM detected_microhaplotypes GROUP BY library_sample_id", '
+        "the tables are listed by --sql \"SELECT name, sql FROM sqlite_master WHERE type = 'table'\"",
+    )
+    parser.add_argument(
+        "--output", type=str, default="STDOUT", required=False, help="output file"
+    )
+    parser.add_argument(
+        "--delim",
+        default="tab",
+        type=str,
+        required=False,
+        help="the delimiter of the output text file, examples input tab,comma but can also be the actual delimiter",
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="If output file exists, overwrite it"
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        required=False,
+        help="a directory to keep the loaded database in, keyed by the hash of the PMO file, so later queries of the same PMO skip loading it, by default the PMO is loaded into memory for each query",
+    )
+    parser.add_argument(
+        "--no_header", action="store_true", help="don't write the column names"
+    )
+
+    return parser.parse_args()
+
+
+def query_pmo():
+    args = parse_args_query_pmo()
+
+    # check files
+    output_delim, output_extension = Utils.process_delimiter_and_output_extension(
+        args.delim, gzip=args.output.endswith(".gz")
+    )
+    args.output = (
+        args.output
+        if "STDOUT" == args.output
+        else Utils.appendStrAsNeeded(args.output, output_extension)
+    )
+    Utils.inputOutputFileCheck(args.file, args.output, args.overwrite)
+
+    # the query can be given in a file
+    sql = args.sql
+    if os.path.isfile(sql):
+        with open(sql) as f:
+            sql = f.read()
+
+    # load the PMO and run the query
+    connection = PMOSqlite.load_pmo_database(args.file, cache_dir=args.cache_dir)
+    try:
+        PMOSqlite.write_query_results(
+            connection, sql, args.output, sep=output_delim, header=not args.no_header
+        )
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    query_pmo()
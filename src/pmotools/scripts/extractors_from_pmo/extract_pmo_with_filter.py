@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import argparse
+
+
+from pmotools.pmo_engine.pmo_filter import PMOFilterSpec
+from pmotools.pmo_engine.pmo_processor import PMOProcessor
+from pmotools.pmo_engine.pmo_reader import PMOReader
+from pmotools.pmo_engine.pmo_writer import PMOWriter
+from pmotools.utils.small_utils import Utils
+
+
+def parse_args_extract_pmo_with_filter():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, required=True, help="PMO file")
+    parser.add_argument(
+        "--output", type=str, required=True, help="Output json file path"
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="If output file exists, overwrite it"
+    )
+    parser.add_argument(
+        "--specimen_names",
+        type=str,
+        help="Keep only these specimens, can either comma separated specimen_names, or a plain text file where each line is a specimen_name",
+    )
+    parser.add_argument(
+        "--library_sample_names",
+        type=str,
+        help="Keep only these library samples, can either comma separated library_sample_names, or a plain text file where each line is a library_sample_name",
+    )
+    parser.add_argument(
+        "--target_names",
+        type=str,
+        help="Keep only these targets, can either comma separated target_names, or a plain text file where each line is a target_name",
+    )
+    parser.add_argument(
+        "--metaFieldsValues",
+        type=str,
+        help="Keep only specimens with these meta values, should either be a table with columns field, values (and optionally group) or supplied command line as field1=value1,value2,value3:field2=value1,value2, a value given as low..high selects a numeric or date range e.g. host_age=..5 or collection_date=2018-01..2018-06",
+    )
+    parser.add_argument(
+        "--read_count_minimum",
+        default=0.0,
+        type=float,
+        help="the minimum read count (inclusive) for detected haplotypes to be kept",
+    )
+    parser.add_argument(
+        "--within_target_freq_minimum",
+        default=0.0,
+        type=float,
+        help="the minimum fraction (inclusive) of the reads of its target within its library sample for detected haplotypes to be kept",
+    )
+    return parser.parse_args()
+
+
+def extract_pmo_with_filter():
+    args = parse_args_extract_pmo_with_filter()
+
+    # check files
+    Utils.inputOutputFileCheck(args.file, args.output, args.overwrite)
+
+    # parse selections
+    filter_spec = PMOFilterSpec(
+        meta_fields_values=args.metaFieldsValues,
+        min_reads=args.read_count_minimum,
+        min_within_target_freq=args.within_target_freq_minimum,
+    )
+    if args.specimen_names is not None:
+        filter_spec.specimen_names = set(
+            Utils.parse_delimited_input_or_file(args.specimen_names)
+        )
+    if args.library_sample_names is not None:
+        filter_spec.library_sample_names = set(
+            Utils.parse_delimited_input_or_file(args.library_sample_names)
+        )
+    if args.target_names is not None:
+        filter_spec.target_names = set(
+            Utils.parse_delimited_input_or_file(args.target_names)
+        )
+
+    # read in pmo
+    pmo = PMOReader.read_in_pmo(args.file)
+
+    # extract
+    pmo_out = PMOProcessor.filter_pmo(pmo, filter_spec, share_unchanged=True)
+
+    # write out the extracted
+    args.output = PMOWriter.add_pmo_extension_as_needed(
+        args.output, args.file.endswith(".gz") or args.output.endswith(".gz")
+    )
+    PMOWriter.write_out_pmo(pmo_out, args.output, args.overwrite)
+
+
+if __name__ == "__main__":
+    extract_pmo_with_filter()
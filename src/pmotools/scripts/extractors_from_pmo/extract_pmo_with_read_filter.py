@@ -38,7 +38,7 @@ def extract_pmo_with_read_filter():
 
     # extract
     pmo_out = PMOProcessor.extract_from_pmo_with_read_filter(
-        pmo, args.read_count_minimum
+        pmo, args.read_count_minimum, share_unchanged=True
     )
 
     # write out the extracted
@@ -47,7 +47,7 @@ def extract_pmo_with_select_library_sample_names():
 
     # extract
     pmo_out = PMOProcessor.filter_pmo_by_library_sample_names(
-        pmo, all_library_sample_names
+        pmo, all_library_sample_names, share_unchanged=True
     )
 
     # write out the extracted
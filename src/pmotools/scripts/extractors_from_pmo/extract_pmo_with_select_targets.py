@@ -44,7 +44,9 @@ def extract_pmo_with_select_targets():
     pmo = PMOReader.read_in_pmo(args.file)
 
     # extract
-    pmo_out = PMOProcessor.filter_pmo_by_target_names(pmo, all_target_names)
+    pmo_out = PMOProcessor.filter_pmo_by_target_names(
+        pmo, all_target_names, share_unchanged=True
+    )
 
     # write out the extracted
     args.output = PMOWriter.add_pmo_extension_as_needed(
@@ -27,7 +27,7 @@ def parse_args_extract_pmo_with_selected_meta():
         "--metaFieldsValues",
         type=str,
         required=True,
-        help="Meta Fields to include, should either be a table with columns field, values (and optionally group) or supplied command line as field1=value1,value2,value3:field2=value1,value2",
+        help="Meta Fields to include, should either be a table with columns field, values (and optionally group) or supplied command line as field1=value1,value2,value3:field2=value1,value2, a value given as low..high selects a numeric or date range e.g. host_age=..5 or collection_date=2018-01..2018-06",
     )
     return parser.parse_args()
 
@@ -43,7 +43,7 @@ def extract_pmo_with_selected_meta():
 
     # extract out of PMO
     pmo_out, group_counts = PMOProcessor.extract_from_pmo_samples_with_meta_groupings(
-        pmo, args.metaFieldsValues
+        pmo, args.metaFieldsValues, share_unchanged=True
     )
 
     # write out the extracted
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import argparse
+
+
+from pmotools.pmo_engine.pairwise_distance import PairwiseDistance
+from pmotools.pmo_engine.pmo_index import PMOIndex
+from pmotools.pmo_engine.pmo_processor import PMOProcessor
+from pmotools.pmo_engine.pmo_reader import PMOReader
+from pmotools.utils.small_utils import Utils
+
+
+def parse_args_calc_pairwise_distances():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, required=True, help="PMO file")
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="output .npy file for the distances, the library_sample_name of each row is written to the same name ending in _library_sample_names.txt",
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="If output files exist, overwrite them"
+    )
+    parser.add_argument(
+        "--metric",
+        type=str,
+        default="jaccard",
+        choices=PairwiseDistance.metrics,
+        help="the distance, jaccard: 1 - shared/union of alleles, allele_sharing: 1 - fraction of shared targets with an allele in common, ibs: 1 - fraction of shared targets with identical alleles",
+    )
+    parser.add_argument(
+        "--read_count_minimum",
+        default=0.0,
+        type=float,
+        help="the minimum read count (inclusive) for detected haplotypes to be counted",
+    )
+    parser.add_argument(
+        "--within_target_freq_minimum",
+        default=0.0,
+        type=float,
+        help="the minimum fraction (inclusive) of the reads of its target within its library sample for detected haplotypes to be counted",
+    )
+    parser.add_argument(
+        "--square",
+        action="store_true",
+        help="write the full square matrix rather than the condensed upper triangle (in the order of scipy.spatial.distance.pdist)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="the number of processes to compute the distances with",
+    )
+    parser.add_argument(
+        "--block_size",
+        type=int,
+        default=256,
+        help="the number of library samples to compute the distances of at once, lower to use less memory",
+    )
+    return parser.parse_args()
+
+
+def calc_pairwise_distances():
+    args = parse_args_calc_pairwise_distances()
+
+    # check files
+    args.output = Utils.appendStrAsNeeded(args.output, ".npy")
+    Utils.inputOutputFileCheck(args.file, args.output, args.overwrite)
+    library_sample_names_output = (
+        args.output[: -len(".npy")] + "_library_sample_names.txt"
+    )
+    Utils.outputfile_check(library_sample_names_output, args.overwrite)
+
+    # read in PMO
+    pmo = PMOReader.read_in_pmo(args.file)
+    pmo_index = PMOIndex(pmo)
+
+    # calc distances, written straight to the output
+    PMOProcessor.calc_pairwise_distances(
+        pmo,
+        metric=args.metric,
+        min_reads=args.read_count_minimum,
+        min_within_target_freq=args.within_target_freq_minimum,
+        output_fnp=args.output,
+        square=args.square,
+        threads=args.threads,
+        block_size=args.block_size,
+        pmo_index=pmo_index,
+    )
+    with open(library_sample_names_output, "w") as f:
+        for library_sample_name in pmo_index.library_sample_names:
+            f.write(library_sample_name + "\n")
+
+
+if __name__ == "__main__":
+    calc_pairwise_distances()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import argparse
+import os
+
+
+from pmotools.pmo_engine.pmo_exporter import PMOExporter
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
+from pmotools.utils.small_utils import Utils
+
+
+def parse_args_export_all_tables():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, required=True, help="PMO file")
+    parser.add_argument(
+        "--output_directory",
+        type=str,
+        required=True,
+        help="the directory to write the tables to, will be created if it doesn't exist",
+    )
+    parser.add_argument(
+        "--prefix",
+        type=str,
+        default="",
+        help="a prefix for the table file names, the files are named PREFIX + TABLE + _table + extension",
+    )
+    parser.add_argument(
+        "--delim",
+        default="tab",
+        type=str,
+        required=False,
+        help="the delimiter of the output text files, examples input tab,comma but can also be the actual delimiter",
+    )
+    parser.add_argument(
+        "--gzip", action="store_true", help="gzip the output table files"
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="If output files exist, overwrite them"
+    )
+    parser.add_argument(
+        "--tables",
+        type=str,
+        required=False,
+        help="only export these tables, comma separated, options are "
+        + ",".join(PMOExporter.meta_table_names),
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="the number of threads to build and write the tables with",
+    )
+
+    return parser.parse_args()
+
+
+def export_all_tables():
+    args = parse_args_export_all_tables()
+
+    # check files
+    if not os.path.exists(args.file):
+        raise FileNotFoundError(args.file)
+
+    # read in PMO once for all the tables, the meta tables don't use the detected_microhaplotypes or read_counts_by_stage so they aren't parsed
+    pmo = PMOStreamReader.read_in_pmo_lazily(args.file)
+
+    # export and write
+    PMOExporter.write_all_tables(
+        pmo,
+        args.output_directory,
+        delim=args.delim,
+        gzip=args.gzip,
+        prefix=args.prefix,
+        overwrite=args.overwrite,
+        table_names=None
+        if args.tables is None
+        else Utils.parse_delimited_input_or_file(args.tables, ","),
+        threads=args.threads,
+    )
+
+
+if __name__ == "__main__":
+    export_all_tables()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import argparse
+
+
+from pmotools.pmo_engine.pmo_exporter import PMOExporter
+from pmotools.pmo_engine.pmo_reader import PMOReader
+from pmotools.utils.small_utils import Utils
+
+
+def parse_args_export_allele_matrix():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, required=True, help="PMO file")
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="output file, a numpy .npz holding the sparse matrix in CSR form (indptr, indices, data) and its labels (library_sample_names, target_names, mhap_ids)",
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="If output file exists, overwrite it"
+    )
+    parser.add_argument(
+        "--value",
+        type=str,
+        default="reads",
+        choices=["reads", "presence"],
+        help="the value of each cell, the reads of the allele or 1 if the allele was detected",
+    )
+    parser.add_argument(
+        "--bioinformatics_run_ids",
+        type=str,
+        required=False,
+        help="only include these bioinformatics_run_ids, comma separated",
+    )
+
+    return parser.parse_args()
+
+
+def export_allele_matrix():
+    args = parse_args_export_allele_matrix()
+
+    # check files
+    args.output = Utils.appendStrAsNeeded(args.output, ".npz")
+    Utils.inputOutputFileCheck(args.file, args.output, args.overwrite)
+
+    # read in PMO
+    pmo = PMOReader.read_in_pmo(args.file)
+
+    # build matrix
+    bioinformatics_run_ids = None
+    if args.bioinformatics_run_ids is not None:
+        bioinformatics_run_ids = [
+            int(bioinformatics_run_id)
+            for bioinformatics_run_id in Utils.parse_delimited_input_or_file(
+                args.bioinformatics_run_ids, ","
+            )
+        ]
+    allele_matrix = PMOExporter.export_allele_matrix(
+        pmo, value=args.value, bioinformatics_run_ids=bioinformatics_run_ids
+    )
+
+    # output
+    allele_matrix.save(args.output)
+
+
+if __name__ == "__main__":
+    export_allele_matrix()
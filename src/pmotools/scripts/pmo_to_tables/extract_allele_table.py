@@ -5,9 +5,9 @@ import json
 import os
 
 from pmotools.pmo_engine.pmo_reader import PMOReader
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
 from pmotools.utils.small_utils import Utils
 from pmotools.pmo_engine.pmo_checker import PMOChecker
-from pmotools.pmo_engine.pmo_processor import PMOProcessor
 from pmotools.pmo_engine.pmo_exporter import PMOExporter
 
 from pmotools import __version__ as __pmotools_version__
@@ -48,6 +48,12 @@ def parse_args_extract_for_allele_table():
         type=str,
         help="if also writing out allele frequencies, write to this file",
     )
+    parser.add_argument(
+        "--allele_freqs_group_by_fields",
+        type=str,
+        required=False,
+        help="compute the allele frequencies within each group of these library sample or specimen meta fields (e.g. collection_country,project_name) rather than across all samples",
+    )
 
     parser.add_argument(
         "--specimen_info_meta_fields",
@@ -80,6 +86,18 @@ def parse_args_extract_for_allele_table():
         default="library_sample_name,target_name,mhap_id",
         help="default base column names, must be length 3",
     )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=100000,
+        required=False,
+        help="the number of rows of the allele table to build and write at a time",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="stream the detected microhaplotypes from the file rather than loading the whole PMO, lowers memory usage for large PMOs but skips validating the PMO against the jsonschema",
+    )
 
     return parser.parse_args()
 
@@ -110,12 +128,15 @@ def extract_for_allele_table():
         )
         Utils.inputOutputFileCheck(args.file, allele_freq_output, args.overwrite)
 
-    pmodata = PMOReader.read_in_pmo(args.file)
-    with open(args.jsonschema, "r") as f:
-        schema_dict = json.load(f)
-        checker = PMOChecker(schema_dict)
-        # make sure PMO is valid
-        checker.validate_pmo_json(pmodata)
+    if args.stream:
+        pmodata = PMOStreamReader.read_in_pmo_lazily(args.file)
+    else:
+        pmodata = PMOReader.read_in_pmo(args.file)
+        with open(args.jsonschema, "r") as f:
+            schema_dict = json.load(f)
+            checker = PMOChecker(schema_dict)
+            # make sure PMO is valid
+            checker.validate_pmo_json(pmodata)
 
     if args.specimen_info_meta_fields is not None:
         args.specimen_info_meta_fields = Utils.parse_delimited_input_or_file(
@@ -134,21 +155,27 @@ def extract_for_allele_table():
             args.representative_haps_fields, ","
         )
 
-    allele_table = PMOExporter.extract_alleles_per_sample_table(
+    if args.allele_freqs_group_by_fields is not None:
+        args.allele_freqs_group_by_fields = Utils.parse_delimited_input_or_file(
+            args.allele_freqs_group_by_fields, ","
+        )
+
+    # write the table a chunk at a time, counting the allele frequencies in the same pass
+    PMOExporter.write_alleles_per_sample_table(
         pmodata,
+        allele_per_sample_table_out_fnp,
+        output_delim,
         additional_specimen_info_fields=args.specimen_info_meta_fields,
         additional_library_sample_info_fields=args.library_sample_info_meta_fields,
         additional_microhap_fields=args.microhap_fields,
         additional_representative_info_fields=args.representative_haps_fields,
         default_base_col_names=args.default_base_col_names.split(","),
+        allele_freqs_fnp=allele_freq_output
+        if args.allele_freqs_output is not None
+        else None,
+        allele_freqs_group_by_fields=args.allele_freqs_group_by_fields,
+        chunk_size=args.chunk_size,
     )
-    with Utils.smart_open_write(allele_per_sample_table_out_fnp) as f:
-        allele_table.to_csv(f, sep=output_delim, index=False)
-
-    if args.allele_freqs_output is not None:
-        allele_freqs = PMOProcessor.extract_allele_counts_freq_from_pmo(pmodata)
-        with Utils.smart_open_write(allele_freq_output) as f:
-            allele_freqs.to_csv(f, sep=output_delim, index=False)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import argparse
+import os
+
+
+from pmotools.pmo_engine.pmo_sqlite import PMOSqlite
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
+
+
+def parse_args_pmo_to_sqlite():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, required=True, help="PMO file")
+    parser.add_argument(
+        "--output", type=str, required=True, help="the SQLite database file to create"
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="If output file exists, overwrite it"
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=100000,
+        help="the number of rows to insert per transaction",
+    )
+    parser.add_argument(
+        "--no_indexes",
+        action="store_true",
+        help="don't index the *_id columns after loading, makes for a faster load and a smaller database but slower queries",
+    )
+
+    return parser.parse_args()
+
+
+def pmo_to_sqlite():
+    args = parse_args_pmo_to_sqlite()
+
+    # check files
+    if not os.path.exists(args.file):
+        raise FileNotFoundError(args.file)
+
+    # the detected_microhaplotypes and read_counts_by_stage are streamed into the database rather than read in whole
+    pmo = PMOStreamReader.read_in_pmo_lazily(args.file)
+
+    # write
+    PMOSqlite.pmo_to_sqlite(
+        pmo,
+        args.output,
+        overwrite=args.overwrite,
+        batch_size=args.batch_size,
+        create_indexes=not args.no_indexes,
+    )
+
+
+if __name__ == "__main__":
+    pmo_to_sqlite()
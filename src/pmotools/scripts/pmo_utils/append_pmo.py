@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sys
+import tempfile
+
+
+from pmotools.pmo_engine.pmo_writer import PMOWriter
+from pmotools.utils.small_utils import Utils
+from pmotools.pmo_engine.pmo_reader import PMOReader
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
+
+
+def parse_args_append_pmo():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--pmo",
+        type=str,
+        required=True,
+        help="an existing (e.g. previously combined) PMO file to append to",
+    )
+    parser.add_argument(
+        "--new_pmo_files",
+        type=str,
+        required=True,
+        help="a list of PMO files to append to the existing PMO (comma separated or a file with one per line), must be from same amplicon panel",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="Output new PMO file, can be the same as --pmo to update it in place (requires --overwrite)",
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="If output file exists, overwrite it"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="only read in the metadata of the PMO files and stream their detected_microhaplotypes and read_counts_by_stage into the output, keeps memory usage low for large PMOs, can't be used with STDIN",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="print how many new representative microhaplotype sequences each new PMO file added",
+    )
+
+    return parser.parse_args()
+
+
+def append_pmo():
+    args = parse_args_append_pmo()
+
+    # set up output
+    args.output = PMOWriter.add_pmo_extension_as_needed(
+        args.output, args.output.endswith(".gz")
+    )
+    Utils.outputfile_check(args.output, args.overwrite)
+
+    # a single PMO file is taken as is rather than as a file listing the PMO files
+    if args.new_pmo_files.endswith((".json", ".json.gz")):
+        new_pmo_files_list = args.new_pmo_files.split(",")
+    else:
+        new_pmo_files_list = Utils.parse_delimited_input_or_file(
+            args.new_pmo_files, ","
+        )
+    if len(new_pmo_files_list) < 1:
+        raise Exception("No new PMO files were supplied to append")
+
+    # read in the PMOs
+    if args.stream:
+        pmo = PMOStreamReader.read_in_pmo_lazily(args.pmo)
+        new_pmos = [
+            PMOStreamReader.read_in_pmo_lazily(pmo_file)
+            for pmo_file in new_pmo_files_list
+        ]
+    else:
+        pmo = PMOReader.read_in_pmo(args.pmo)
+        new_pmos = PMOReader.read_in_pmos(new_pmo_files_list)
+
+    # append, the read in PMOs aren't needed afterwards so let their records be moved rather than copied
+    pmo_out, new_microhaplotype_counts = PMOReader.append_pmo(
+        pmo, new_pmos, consume_inputs=True, return_new_microhaplotype_counts=True
+    )
+    if args.verbose:
+        for pmo_file, new_microhaplotype_count in zip(
+            new_pmo_files_list, new_microhaplotype_counts[1:]
+        ):
+            sys.stderr.write(
+                pmo_file
+                + " added "
+                + str(new_microhaplotype_count)
+                + " new representative microhaplotypes\n"
+            )
+
+    # write
+    if (
+        "STDOUT" != args.output
+        and os.path.exists(args.output)
+        and os.path.samefile(args.output, args.pmo)
+    ):
+        # updating in place, the existing PMO might still be streamed from so write to a temporary file first
+        with tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(os.path.abspath(args.output)),
+            suffix=".json.gz" if args.output.endswith(".gz") else ".json",
+            delete=False,
+        ) as tmp_file:
+            tmp_fnp = tmp_file.name
+        try:
+            PMOWriter.write_out_pmo(pmo_out, tmp_fnp, True)
+            os.replace(tmp_fnp, args.output)
+        finally:
+            if os.path.exists(tmp_fnp):
+                os.remove(tmp_fnp)
+    else:
+        PMOWriter.write_out_pmo(pmo_out, args.output, args.overwrite)
+
+
+if __name__ == "__main__":
+    append_pmo()
@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 import argparse
+import sys
 
 
 from pmotools.pmo_engine.pmo_writer import PMOWriter
 from pmotools.utils.small_utils import Utils
 from pmotools.pmo_engine.pmo_reader import PMOReader
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
 
 
 def parse_args_combine_pmos():
@@ -21,6 +23,22 @@ def parse_args_combine_pmos():
     parser.add_argument(
         "--overwrite", action="store_true", help="If output file exists, overwrite it"
     )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="the number of processes to use to read in the PMO files, can't be used with --stream as the files are then read while writing the output",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="only read in the metadata of the PMO files and stream their detected_microhaplotypes and read_counts_by_stage into the output, keeps memory usage low for large PMOs, can't be used with STDIN",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="print how many new representative microhaplotype sequences each PMO file added",
+    )
 
     return parser.parse_args()
 
@@ -34,6 +52,11 @@ def combine_pmos():
     )
     Utils.outputfile_check(args.output, args.overwrite)
 
+    if args.stream and args.threads > 1:
+        raise Exception(
+            "--threads can't be used with --stream, the streamed PMO files are read one after another while writing the output"
+        )
+
     # check if at least 2 PMO files supplied
     pmo_files_list = Utils.parse_delimited_input_or_file(args.pmo_files, ",")
     if len(pmo_files_list) < 2:
@@ -44,10 +67,29 @@ def combine_pmos():
         )
 
     # read in the PMOs
-    pmos = PMOReader.read_in_pmos(pmo_files_list)
+    if args.stream:
+        pmos = [
+            PMOStreamReader.read_in_pmo_lazily(pmo_file) for pmo_file in pmo_files_list
+        ]
+    else:
+        pmos = PMOReader.read_in_pmos(pmo_files_list, args.threads)
 
-    # combine PMOs
-    pmo_out = PMOReader.combine_multiple_pmos(pmos)
+    # combine PMOs, the read in PMOs aren't needed afterwards so let their records be moved rather than copied
+    pmo_out, new_microhaplotype_counts = PMOReader.combine_multiple_pmos(
+        pmos,
+        consume_inputs=True,
+        return_new_microhaplotype_counts=True,
+    )
+    if args.verbose:
+        for pmo_file, new_microhaplotype_count in zip(
+            pmo_files_list, new_microhaplotype_counts
+        ):
+            sys.stderr.write(
+                pmo_file
+                + " added "
+                + str(new_microhaplotype_count)
+                + " new representative microhaplotypes\n"
+            )
 
     # write
     PMOWriter.write_out_pmo(pmo_out, args.output, args.overwrite)
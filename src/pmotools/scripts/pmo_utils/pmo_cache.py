@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+
+import pandas as pd
+
+from pmotools.pmo_engine.pmo_cache import PMOCache
+
+
+def parse_args_pmo_cache():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        required=False,
+        help="the cache directory, defaults to the "
+        + PMOCache.cache_dir_env_var
+        + " environment variable, which also turns on the cache for reading in PMO files in all other commands",
+    )
+    parser.add_argument(
+        "--clear", action="store_true", help="remove all the cached PMOs"
+    )
+    parser.add_argument(
+        "--max_size",
+        type=str,
+        required=False,
+        help="remove the least recently used cached PMOs until the cache is at most this size, e.g. 500M or 2G",
+    )
+
+    return parser.parse_args()
+
+
+def pmo_cache():
+    args = parse_args_pmo_cache()
+
+    cache_dir = PMOCache.get_cache_dir(args.cache_dir)
+    if cache_dir is None:
+        raise Exception(
+            "No cache directory, supply --cache_dir or set "
+            + PMOCache.cache_dir_env_var
+        )
+
+    # clear or shrink the cache
+    if args.clear or args.max_size is not None:
+        removed, removed_size = PMOCache.evict(
+            cache_dir, 0 if args.clear else args.max_size
+        )
+        sys.stderr.write(
+            "Removed "
+            + str(removed)
+            + " cached PMOs, "
+            + str(removed_size)
+            + " bytes\n"
+        )
+
+    # list what's cached, least recently used first
+    entries = pd.DataFrame(
+        PMOCache.list_entries(cache_dir),
+        columns=["fnp", "size", "entry", "entry_size", "last_used"],
+    )
+    entries.to_csv(sys.stdout, sep="\t", index=False)
+    sys.stderr.write(
+        str(len(entries))
+        + " cached PMOs, "
+        + str(entries["entry_size"].sum())
+        + " bytes of a maximum "
+        + str(PMOCache.get_max_size())
+        + " bytes in "
+        + cache_dir
+        + "\n"
+    )
+
+
+if __name__ == "__main__":
+    pmo_cache()
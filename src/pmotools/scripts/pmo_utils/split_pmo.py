@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import re
+
+
+from pmotools.pmo_engine.pmo_processor import PMOProcessor
+from pmotools.pmo_engine.pmo_reader import PMOReader
+from pmotools.pmo_engine.pmo_writer import PMOWriter
+
+
+def parse_args_split_pmo():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, required=True, help="PMO file")
+    parser.add_argument(
+        "--output_directory",
+        type=str,
+        required=True,
+        help="the directory to write the shard PMO files to, will be created if it doesn't exist",
+    )
+    parser.add_argument(
+        "--prefix",
+        type=str,
+        default="",
+        help="a prefix for the shard file names, the files are named PREFIX + SHARD_NAME + .json(.gz)",
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true", help="If output files exist, overwrite them"
+    )
+    parser.add_argument(
+        "--n_shards",
+        type=int,
+        help="split into this many shards, balanced by the number of detected microhaplotypes",
+    )
+    parser.add_argument(
+        "--group_by_field",
+        type=str,
+        help="split into one shard per value of this specimen meta field (e.g. geo_admin1), use project_name to split by project",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="the number of processes to write the shard files with",
+    )
+    parser.add_argument(
+        "--gzip", action="store_true", help="gzip the output shard files"
+    )
+    return parser.parse_args()
+
+
+def split_pmo():
+    args = parse_args_split_pmo()
+
+    # check files
+    if not os.path.exists(args.file):
+        raise FileNotFoundError(args.file)
+    os.makedirs(args.output_directory, exist_ok=True)
+
+    # read in pmo
+    pmo = PMOReader.read_in_pmo(args.file)
+
+    # split
+    shard_library_sample_ids = PMOProcessor.partition_library_samples(
+        pmo, n_shards=args.n_shards, group_by_field=args.group_by_field
+    )
+    shards = PMOProcessor.split_pmo(pmo, shard_library_sample_ids, share_unchanged=True)
+
+    # write out the shards, group values are made safe to use as file names
+    gzip_output = args.gzip or args.file.endswith(".gz")
+    shard_fnps = {}
+    for shard_name, shard in shards.items():
+        shard_fnp = PMOWriter.add_pmo_extension_as_needed(
+            os.path.join(
+                args.output_directory,
+                args.prefix + re.sub(r"[^A-Za-z0-9._-]", "_", shard_name),
+            ),
+            gzip_output,
+        )
+        if shard_fnp in shard_fnps:
+            raise Exception(
+                "Multiple shards would be written to the same file: " + shard_fnp
+            )
+        shard_fnps[shard_fnp] = shard
+    PMOWriter.write_out_pmos(shard_fnps, args.overwrite, args.threads)
+
+
+if __name__ == "__main__":
+    split_pmo()
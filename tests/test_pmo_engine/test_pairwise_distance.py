@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import itertools
+import os
+import tempfile
+import unittest
+import json
+
+import numpy as np
+
+from pmotools.pmo_engine.allele_matrix import AlleleMatrix
+from pmotools.pmo_engine.pairwise_distance import PairwiseDistance
+from pmotools.pmo_engine.pmo_exporter import PMOExporter
+from pmotools.pmo_engine.pmo_processor import PMOProcessor
+
+
+class TestPairwiseDistance(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = os.path.dirname(os.path.abspath(__file__))
+        self.test_dir = tempfile.TemporaryDirectory()
+        with open(
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/combined_pmo_example.json"
+            )
+        ) as f:
+            self.combined_pmo_data = json.load(f)
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    @staticmethod
+    def brute_force_distance(allele_sets: list[dict], a: int, b: int, metric: str):
+        numerator = 0
+        denominator = 0
+        for target in set(allele_sets[a]) & set(allele_sets[b]):
+            alleles_a = allele_sets[a][target]
+            alleles_b = allele_sets[b][target]
+            if metric == "jaccard":
+                numerator += len(alleles_a & alleles_b)
+                denominator += len(alleles_a | alleles_b)
+            else:
+                denominator += 1
+                if metric == "allele_sharing":
+                    numerator += len(alleles_a & alleles_b) > 0
+                else:
+                    numerator += alleles_a == alleles_b
+        return np.nan if denominator == 0 else 1 - numerator / denominator
+
+    def test_calc_distances(self):
+        allele_matrix = PMOExporter.export_allele_matrix(
+            self.combined_pmo_data, value="presence"
+        )
+        allele_sets = [{} for _ in range(allele_matrix.shape[0])]
+        for row, column in zip(allele_matrix.row_index, allele_matrix.indices):
+            allele_sets[row].setdefault(allele_matrix.target_names[column], set()).add(
+                allele_matrix.mhap_ids[column]
+            )
+        sample_number = allele_matrix.shape[0]
+        for metric in PairwiseDistance.metrics:
+            expected = [
+                self.brute_force_distance(allele_sets, a, b, metric)
+                for a, b in itertools.combinations(range(sample_number), 2)
+            ]
+            condensed = PairwiseDistance.calc_distances(
+                allele_matrix, metric, block_size=3
+            )
+            np.testing.assert_allclose(expected, condensed)
+            square = PairwiseDistance.calc_distances(
+                allele_matrix, metric, square=True, block_size=1, threads=2
+            )
+            np.testing.assert_allclose(np.zeros(sample_number), np.diag(square))
+            np.testing.assert_allclose(square, square.T)
+            np.testing.assert_allclose(
+                condensed, square[np.triu_indices(sample_number, 1)]
+            )
+
+        # samples without shared targets are NaN
+        allele_matrix = AlleleMatrix.from_columns(
+            np.array([0, 0, 1, 2]),
+            np.array([0, 0, 1, 1]),
+            np.array([0, 1, 0, 0]),
+            np.ones(4, dtype=np.int64),
+            ["a", "b", "c"],
+            ["t1", "t2"],
+            "presence",
+        )
+        np.testing.assert_allclose(
+            [np.nan, np.nan, 0.0],
+            PairwiseDistance.calc_distances(allele_matrix, "jaccard"),
+        )
+
+    def test_calc_pairwise_distances(self):
+        output_fnp = os.path.join(self.test_dir.name, "distances.npy")
+        distances = PMOProcessor.calc_pairwise_distances(
+            self.combined_pmo_data, metric="ibs", output_fnp=output_fnp
+        )
+        np.testing.assert_allclose(distances, np.load(output_fnp))
+        np.testing.assert_allclose(
+            [0.671, 0.768, 0.742, 0.765, 0.747, 0.633], distances, atol=0.001
+        )
+        # thresholds drop the minor alleles
+        np.testing.assert_allclose(
+            PMOProcessor.calc_pairwise_distances(
+                PMOProcessor.extract_from_pmo_with_read_filter(
+                    self.combined_pmo_data, 100
+                )
+            ),
+            PMOProcessor.calc_pairwise_distances(self.combined_pmo_data, min_reads=100),
+        )
+        self.assertRaises(
+            Exception,
+            PMOProcessor.calc_pairwise_distances,
+            self.combined_pmo_data,
+            metric="euclidean",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import time
+import unittest
+import json
+
+from pmotools.pmo_engine.pmo_cache import PMOCache
+from pmotools.pmo_engine.pmo_reader import PMOReader
+
+
+class TestPMOCache(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = os.path.dirname(os.path.abspath(__file__))
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.test_dir.name, "cache")
+        self.data_dir = os.path.join(os.path.dirname(self.working_dir), "data")
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_read_in_pmo_with_cache(self):
+        pmo_fnp = os.path.join(self.test_dir.name, "pmo.json")
+        with open(os.path.join(self.data_dir, "combined_pmo_example.json")) as f:
+            pmo_data = json.load(f)
+        with open(pmo_fnp, "w") as f:
+            json.dump(pmo_data, f)
+
+        self.assertIsNone(PMOCache.load(PMOCache.file_header(pmo_fnp), self.cache_dir))
+        self.assertEqual(pmo_data, PMOReader.read_in_pmo(pmo_fnp, self.cache_dir))
+        self.assertEqual(
+            pmo_data, PMOCache.load(PMOCache.file_header(pmo_fnp), self.cache_dir)
+        )
+        self.assertEqual(pmo_data, PMOReader.read_in_pmo(pmo_fnp, self.cache_dir))
+        self.assertEqual(1, len(PMOCache.list_entries(self.cache_dir)))
+
+        # editing the file invalidates its entry
+        pmo_data["pmo_header"]["edited"] = True
+        with open(pmo_fnp, "w") as f:
+            json.dump(pmo_data, f)
+        os.utime(pmo_fnp, ns=(time.time_ns(), time.time_ns() + 10**9))
+        self.assertIsNone(PMOCache.load(PMOCache.file_header(pmo_fnp), self.cache_dir))
+        self.assertEqual(pmo_data, PMOReader.read_in_pmo(pmo_fnp, self.cache_dir))
+
+        # a file changed while it was being read is cached under the header taken before the read, so isn't used for the changed file
+        header = PMOCache.file_header(pmo_fnp)
+        pmo_data["pmo_header"]["edited"] = False
+        with open(pmo_fnp, "w") as f:
+            json.dump(pmo_data, f)
+        os.utime(pmo_fnp, ns=(time.time_ns(), time.time_ns() + 2 * 10**9))
+        PMOCache.store(header, {"stale": True}, self.cache_dir)
+        self.assertEqual(pmo_data, PMOReader.read_in_pmo(pmo_fnp, self.cache_dir))
+
+        # unreadable entries are parsed again
+        for entry in PMOCache.list_entries(self.cache_dir):
+            with open(entry["entry"], "wb") as f:
+                f.write(b"truncated")
+        self.assertEqual(pmo_data, PMOReader.read_in_pmo(pmo_fnp, self.cache_dir))
+
+    def test_evict(self):
+        pmo_fnps = [
+            os.path.join(self.data_dir, "minimum_pmo_example.json"),
+            os.path.join(self.data_dir, "minimum_pmo_example_2.json"),
+            os.path.join(self.data_dir, "minimum_pmo_example.json.gz"),
+        ]
+        for pmo_fnp in pmo_fnps:
+            PMOReader.read_in_pmo(pmo_fnp, self.cache_dir)
+        entries = PMOCache.list_entries(self.cache_dir)
+        self.assertEqual(
+            [os.path.abspath(pmo_fnp) for pmo_fnp in pmo_fnps],
+            [entry["fnp"] for entry in entries],
+        )
+        # reading the first file again makes the second the least recently used
+        for last_used, entry in enumerate(entries, start=1):
+            os.utime(entry["entry"], (last_used, last_used))
+        PMOReader.read_in_pmo(pmo_fnps[0], self.cache_dir)
+        entry_sizes = {entry["fnp"]: entry["entry_size"] for entry in entries}
+        max_size = sum(entry_sizes.values()) - 1
+        self.assertEqual(
+            (1, entry_sizes[os.path.abspath(pmo_fnps[1])]),
+            PMOCache.evict(self.cache_dir, max_size),
+        )
+        self.assertEqual(
+            {os.path.abspath(pmo_fnps[0]), os.path.abspath(pmo_fnps[2])},
+            {entry["fnp"] for entry in PMOCache.list_entries(self.cache_dir)},
+        )
+        self.assertEqual(2, PMOCache.clear(self.cache_dir)[0])
+        self.assertEqual([], PMOCache.list_entries(self.cache_dir))
+
+        self.assertEqual(500 * 1024**2, PMOCache.parse_size("500M"))
+        self.assertEqual(2 * 1024**3, PMOCache.parse_size("2G"))
+        self.assertRaises(Exception, PMOCache.parse_size, "lots")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
+import copy
 import hashlib
 import os
 import tempfile
 import unittest
 import json
 import pandas as pd
+from pmotools.pmo_engine.allele_matrix import AlleleMatrix
 from pmotools.pmo_engine.pmo_exporter import PMOExporter
+from pmotools.pmo_engine.pmo_processor import PMOProcessor
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
 
 
 def md5sum_of_fnp(filename):
@@ -157,6 +161,192 @@ class TestPMOExporter(unittest.TestCase):
         )
         self.assertEqual("c425004244e6af1386b6e7776da76fed", md5sum_of_fnp(output_fnp))
 
+    def test_extract_alleles_per_sample_table_sparse_fields(self):
+        mhaps = self.combined_pmo_data["detected_microhaplotypes"][0][
+            "library_samples"
+        ][0]["target_results"][0]["mhaps"]
+        mhaps[0]["umis"] = 5
+        mhaps[1]["umis"] = None
+        mhaps[1]["flags"] = ["chimera"]
+        self.combined_pmo_data["library_sample_info"][1]["batch"] = 2
+        allele_data = PMOExporter.extract_alleles_per_sample_table(
+            self.combined_pmo_data,
+            additional_microhap_fields=["umis", "flags"],
+            additional_library_sample_info_fields=["batch"],
+        )
+        self.assertEqual(474, len(allele_data))
+        self.assertEqual([5, None, "NA"], allele_data["umis"].tolist()[:3])
+        self.assertEqual(["NA", ["chimera"], "NA"], allele_data["flags"].tolist()[:3])
+        self.assertEqual(
+            {"NA": 474 - 117, 2: 117}, allele_data["batch"].value_counts().to_dict()
+        )
+
+    def test_export_all_tables(self):
+        tables = PMOExporter.export_all_tables(self.combined_pmo_data, threads=3)
+        self.assertEqual(PMOExporter.meta_table_names, list(tables))
+        pd.testing.assert_frame_equal(
+            PMOExporter.export_panel_info_meta_table(self.combined_pmo_data),
+            tables["panel_info_meta"],
+        )
+        # only the metadata of the PMO is needed
+        lazy_tables = PMOExporter.export_all_tables(
+            PMOStreamReader.read_in_pmo_lazily(
+                os.path.join(
+                    os.path.dirname(self.working_dir), "data/combined_pmo_example.json"
+                )
+            )
+        )
+        for table_name, table in tables.items():
+            pd.testing.assert_frame_equal(table, lazy_tables[table_name])
+        output_fnps = PMOExporter.write_all_tables(
+            self.combined_pmo_data,
+            os.path.join(self.test_dir.name, "tables"),
+            delim="comma",
+            gzip=True,
+            prefix="combined_",
+            table_names=["specimen_meta", "target_info_meta"],
+            threads=2,
+        )
+        self.assertEqual(
+            os.path.join(
+                self.test_dir.name, "tables", "combined_specimen_meta_table.csv.gz"
+            ),
+            output_fnps["specimen_meta"],
+        )
+        pd.testing.assert_frame_equal(
+            PMOExporter.export_target_info_meta_table(self.combined_pmo_data),
+            pd.read_csv(output_fnps["target_info_meta"]),
+        )
+        # nothing is written over without overwrite
+        self.assertRaises(
+            Exception,
+            PMOExporter.write_all_tables,
+            self.combined_pmo_data,
+            os.path.join(self.test_dir.name, "tables"),
+            delim="comma",
+            gzip=True,
+            prefix="combined_",
+        )
+        self.assertRaises(
+            Exception,
+            PMOExporter.export_all_tables,
+            self.combined_pmo_data,
+            table_names=["specimen_meta", "bioinformatics_run_meta"],
+        )
+
+    def test_write_alleles_per_sample_table(self):
+        output_fnp = os.path.join(self.test_dir.name, "alleles.tsv.gz")
+        allele_freqs_fnp = os.path.join(self.test_dir.name, "allele_freqs.tsv")
+        fields = dict(
+            additional_microhap_fields=["reads"],
+            additional_representative_info_fields=["seq"],
+            additional_library_sample_info_fields=["panel_id"],
+            additional_specimen_info_fields=["collection_country"],
+        )
+        # chunks that split library samples and targets give the same table as building it whole
+        PMOExporter.write_alleles_per_sample_table(
+            self.combined_pmo_data,
+            output_fnp,
+            allele_freqs_fnp=allele_freqs_fnp,
+            allele_freqs_group_by_fields=["collection_country"],
+            chunk_size=7,
+            **fields,
+        )
+        pd.testing.assert_frame_equal(
+            PMOExporter.extract_alleles_per_sample_table(
+                self.combined_pmo_data, **fields
+            ),
+            pd.read_csv(output_fnp, sep="\t"),
+        )
+        pd.testing.assert_frame_equal(
+            PMOProcessor.extract_allele_counts_freq_from_pmo(
+                self.combined_pmo_data, group_by_fields=["collection_country"]
+            ),
+            pd.read_csv(allele_freqs_fnp, sep="\t"),
+        )
+        self.assertRaises(
+            Exception,
+            PMOExporter.write_alleles_per_sample_table,
+            self.combined_pmo_data,
+            output_fnp,
+            chunk_size=0,
+        )
+
+        # microhaplotype fields without any data fail without leaving any output, in memory or lazily read
+        missing_output_fnp = os.path.join(self.test_dir.name, "missing.tsv")
+        for pmodata in [
+            self.combined_pmo_data,
+            PMOStreamReader.read_in_pmo_lazily(
+                os.path.join(
+                    os.path.dirname(self.working_dir), "data/combined_pmo_example.json"
+                )
+            ),
+        ]:
+            with self.assertRaises(Exception) as error:
+                PMOExporter.write_alleles_per_sample_table(
+                    pmodata, missing_output_fnp, additional_microhap_fields=["umi"]
+                )
+            self.assertIn("umi", str(error.exception))
+            self.assertEqual(
+                ["allele_freqs.tsv", "alleles.tsv.gz"],
+                sorted(os.listdir(self.test_dir.name)),
+            )
+
+        # values are written as they are in the PMO whichever chunk they fall in
+        pmodata = copy.deepcopy(self.combined_pmo_data)
+        for pos, specimen in enumerate(pmodata["specimen_info"]):
+            specimen["parasite_density_count"] = None if pos == 1 else 10 * pos
+        PMOExporter.write_alleles_per_sample_table(
+            pmodata,
+            missing_output_fnp,
+            additional_specimen_info_fields=["parasite_density_count"],
+            chunk_size=50,
+        )
+        with open(missing_output_fnp) as f:
+            densities = {line.rstrip("\n").split("\t")[-1] for line in f}
+        self.assertEqual({"parasite_density_count", "", "0", "20", "30"}, densities)
+
+    def test_export_allele_matrix(self):
+        allele_matrix = PMOExporter.export_allele_matrix(self.combined_pmo_data)
+        self.assertEqual((4, 271), allele_matrix.shape)
+        self.assertEqual(474, allele_matrix.nnz)
+        # the same as pivoting the allele table
+        allele_table = PMOExporter.extract_alleles_per_sample_table(
+            self.combined_pmo_data, additional_microhap_fields=["reads"]
+        )
+        pivoted = allele_table.pivot_table(
+            index="library_sample_name",
+            columns=["target_name", "mhap_id"],
+            values="reads",
+            aggfunc="sum",
+            fill_value=0,
+        )
+        dense = pd.DataFrame(
+            allele_matrix.to_dense(),
+            index=allele_matrix.library_sample_names,
+            columns=pd.MultiIndex.from_arrays(
+                [allele_matrix.target_names, allele_matrix.mhap_ids]
+            ),
+        )
+        self.assertTrue(
+            (dense.loc[pivoted.index, pivoted.columns].values == pivoted.values).all()
+        )
+
+        # saved and loaded back
+        output_fnp = os.path.join(self.test_dir.name, "allele_matrix.npz")
+        allele_matrix.save(output_fnp)
+        loaded = AlleleMatrix.load(output_fnp)
+        for name in AlleleMatrix.array_names:
+            self.assertTrue(
+                (getattr(allele_matrix, name) == getattr(loaded, name)).all()
+            )
+
+        presence = PMOExporter.export_allele_matrix(
+            self.combined_pmo_data, value="presence", bioinformatics_run_ids=[1]
+        )
+        self.assertEqual({1}, set(presence.data.tolist()))
+        self.assertEqual([0, 0, 0, 125, 223], presence.indptr.tolist())
+
     def test_export_specimen_meta_table(self):
         spec_table = PMOExporter.export_specimen_meta_table(self.minimum_pmo_data)
         spec_table.to_csv(os.path.join(self.test_dir.name, "specimen_meta_table.csv"))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import copy
+import os
+import unittest
+import json
+
+from pmotools.pmo_engine.pmo_frame import PMOFrame, TargetResultsFrame
+from pmotools.pmo_engine.pmo_index import PMOIndex
+from pmotools.pmo_engine.pmo_processor import PMOProcessor
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
+
+
+class TestPMOFrame(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = os.path.dirname(os.path.abspath(__file__))
+        self.combined_pmo_fnp = os.path.join(
+            os.path.dirname(self.working_dir), "data/combined_pmo_example.json"
+        )
+        with open(self.combined_pmo_fnp) as f:
+            self.combined_pmo_data = json.load(f)
+
+    def test_columns(self):
+        pmo_frame = PMOFrame.from_pmo(self.combined_pmo_data)
+        rows = []
+        for block in self.combined_pmo_data["detected_microhaplotypes"]:
+            for library_sample in block["library_samples"]:
+                for target_result in library_sample["target_results"]:
+                    for mhap in target_result["mhaps"]:
+                        rows.append(
+                            (
+                                block["bioinformatics_run_id"],
+                                library_sample["library_sample_id"],
+                                target_result["mhaps_target_id"],
+                                mhap["mhap_id"],
+                                mhap["reads"],
+                            )
+                        )
+        self.assertEqual(len(rows), len(pmo_frame))
+        self.assertEqual(
+            rows,
+            list(
+                zip(
+                    pmo_frame.bioinformatics_run_id.tolist(),
+                    pmo_frame.library_sample_id.tolist(),
+                    pmo_frame.mhaps_target_id.tolist(),
+                    pmo_frame.mhap_id.tolist(),
+                    pmo_frame.reads.tolist(),
+                )
+            ),
+        )
+        self.assertEqual(
+            rows,
+            list(
+                pmo_frame.to_dataframe()[
+                    [
+                        "bioinformatics_run_id",
+                        "library_sample_id",
+                        "mhaps_target_id",
+                        "mhap_id",
+                        "reads",
+                    ]
+                ].itertuples(index=False, name=None)
+            ),
+        )
+
+    def test_round_trip(self):
+        self.assertEqual(
+            self.combined_pmo_data["detected_microhaplotypes"],
+            PMOFrame.from_pmo(self.combined_pmo_data).to_detected_microhaplotypes(),
+        )
+        # lazily read PMOs can be converted in one pass
+        lazy_pmo = PMOStreamReader.read_in_pmo_lazily(self.combined_pmo_fnp)
+        self.assertEqual(
+            self.combined_pmo_data["detected_microhaplotypes"],
+            PMOFrame.from_pmo(lazy_pmo).to_detected_microhaplotypes(),
+        )
+        # umis, explicit nulls and additional fields are kept
+        detected_microhaplotypes = copy.deepcopy(
+            self.combined_pmo_data["detected_microhaplotypes"]
+        )
+        detected_microhaplotypes[0]["note"] = "block"
+        library_sample = detected_microhaplotypes[0]["library_samples"][0]
+        library_sample["note"] = "sample"
+        library_sample["target_results"][0]["note"] = "target"
+        library_sample["target_results"][0]["mhaps"][0]["umis"] = 7
+        library_sample["target_results"][0]["mhaps"][0]["note"] = "mhap"
+        library_sample["target_results"][1]["mhaps"][0]["umis"] = None
+        library_sample["target_results"][2]["mhaps"] = []
+        detected_microhaplotypes.append(
+            {"bioinformatics_run_id": 0, "library_samples": []}
+        )
+        pmo_frame = PMOFrame.from_detected_microhaplotypes(detected_microhaplotypes)
+        self.assertEqual(7, pmo_frame.umis[0])
+        self.assertEqual(
+            detected_microhaplotypes, pmo_frame.to_detected_microhaplotypes()
+        )
+        self.assertEqual(
+            [], PMOFrame.from_detected_microhaplotypes([]).to_detected_microhaplotypes()
+        )
+
+    def test_get_pmo_frame(self):
+        pmo_index = PMOIndex(self.combined_pmo_data)
+        pmo_frame = PMOProcessor.get_pmo_frame(self.combined_pmo_data, pmo_index)
+        self.assertIs(
+            pmo_frame, PMOProcessor.get_pmo_frame(self.combined_pmo_data, pmo_index)
+        )
+        self.assertEqual(
+            pmo_frame.mhap_id.tolist(),
+            PMOProcessor.get_pmo_frame(self.combined_pmo_data).mhap_id.tolist(),
+        )
+
+    def test_target_results_frame(self):
+        pmo_frame = PMOFrame.from_pmo(self.combined_pmo_data)
+        for target_results in [
+            TargetResultsFrame.from_detected_microhaplotypes(
+                self.combined_pmo_data["detected_microhaplotypes"]
+            ),
+            TargetResultsFrame.from_detected_microhaplotypes(
+                PMOStreamReader.read_in_pmo_lazily(self.combined_pmo_fnp)[
+                    "detected_microhaplotypes"
+                ]
+            ),
+        ]:
+            for column in [
+                "block_bioinformatics_run_ids",
+                "block_sample_offsets",
+                "sample_library_sample_ids",
+                "sample_target_offsets",
+                "target_mhaps_target_ids",
+                "target_reads",
+                "target_bioinformatics_run_ids",
+                "target_library_sample_ids",
+            ]:
+                self.assertEqual(
+                    getattr(pmo_frame, column).tolist(),
+                    getattr(target_results, column).tolist(),
+                )
+
+        # an index reuses its PMOFrame once built, and the counts are the same either way
+        pmo_index = PMOIndex(self.combined_pmo_data)
+        target_counts = PMOProcessor.count_library_samples_per_target(
+            self.combined_pmo_data, 100, pmo_index=pmo_index
+        )
+        self.assertNotIn("pmo_frame", pmo_index.__dict__)
+        pmo_index = PMOIndex(self.combined_pmo_data)
+        self.assertIs(pmo_index.pmo_frame, pmo_index.target_results_frame)
+        self.assertTrue(
+            target_counts.equals(
+                PMOProcessor.count_library_samples_per_target(
+                    self.combined_pmo_data, 100, pmo_index=pmo_index
+                )
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+import json
+
+import pandas as pd
+
+from pmotools.pmo_engine.pmo_exporter import PMOExporter
+from pmotools.pmo_engine.pmo_index import PMOIndex
+from pmotools.pmo_engine.pmo_processor import PMOProcessor
+
+
+class TestPMOIndex(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/combined_pmo_example.json"
+            )
+        ) as f:
+            self.combined_pmo_data = json.load(f)
+
+    def test_look_ups(self):
+        pmo_index = PMOIndex(self.combined_pmo_data)
+        self.assertEqual(
+            {
+                specimen["specimen_name"]: idx
+                for idx, specimen in enumerate(self.combined_pmo_data["specimen_info"])
+            },
+            pmo_index.specimen_name_index,
+        )
+        self.assertEqual(
+            {
+                library_sample["library_sample_name"]: idx
+                for idx, library_sample in enumerate(
+                    self.combined_pmo_data["library_sample_info"]
+                )
+            },
+            pmo_index.library_sample_name_index,
+        )
+        for (
+            specimen_id,
+            library_sample_ids,
+        ) in pmo_index.specimen_library_sample_ids.items():
+            for library_sample_id in library_sample_ids:
+                self.assertEqual(
+                    specimen_id,
+                    self.combined_pmo_data["library_sample_info"][library_sample_id][
+                        "specimen_id"
+                    ],
+                )
+        for mhaps_target_id, target in enumerate(
+            self.combined_pmo_data["representative_microhaplotypes"]["targets"]
+        ):
+            target_name = self.combined_pmo_data["target_info"][target["target_id"]][
+                "target_name"
+            ]
+            self.assertEqual(
+                mhaps_target_id, pmo_index.target_name_representative_index[target_name]
+            )
+            self.assertEqual(
+                mhaps_target_id,
+                pmo_index.target_id_representative_index[target["target_id"]],
+            )
+        # look-ups are only built once
+        self.assertIs(pmo_index.target_name_index, pmo_index.target_name_index)
+
+    def test_reuse_with_processor_and_exporter(self):
+        pmo_index = PMOIndex(self.combined_pmo_data)
+        pd.testing.assert_frame_equal(
+            PMOProcessor.count_library_samples_per_target(self.combined_pmo_data, 100),
+            PMOProcessor.count_library_samples_per_target(
+                self.combined_pmo_data, 100, pmo_index=pmo_index
+            ),
+        )
+        pd.testing.assert_frame_equal(
+            PMOProcessor.extract_allele_counts_freq_from_pmo(self.combined_pmo_data),
+            PMOProcessor.extract_allele_counts_freq_from_pmo(
+                self.combined_pmo_data, pmo_index=pmo_index
+            ),
+        )
+        pd.testing.assert_frame_equal(
+            PMOExporter.extract_alleles_per_sample_table(self.combined_pmo_data),
+            PMOExporter.extract_alleles_per_sample_table(
+                self.combined_pmo_data, pmo_index=pmo_index
+            ),
+        )
+        specimen_names = {"5tbx", "XUC009"}
+        self.assertEqual(
+            PMOProcessor.filter_pmo_by_specimen_names(
+                self.combined_pmo_data, specimen_names
+            ),
+            PMOProcessor.filter_pmo_by_specimen_names(
+                self.combined_pmo_data, specimen_names, pmo_index
+            ),
+        )
+        # an index for a different PMO can't be used
+        self.assertRaises(
+            Exception,
+            PMOProcessor.get_specimen_names,
+            json.loads(json.dumps(self.combined_pmo_data)),
+            pmo_index,
+        )
+
+    def test_invalidate(self):
+        pmo_index = PMOIndex(self.combined_pmo_data)
+        self.assertEqual(0, pmo_index.specimen_name_index["8025874217"])
+        self.combined_pmo_data["specimen_info"][0]["specimen_name"] = "renamed"
+        # stale until invalidated
+        self.assertIn("8025874217", pmo_index.specimen_name_index)
+        pmo_index.invalidate()
+        self.assertNotIn("8025874217", pmo_index.specimen_name_index)
+        self.assertEqual(0, pmo_index.specimen_name_index["renamed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
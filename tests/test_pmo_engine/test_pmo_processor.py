@@ -8,6 +8,7 @@ import json
 import pandas as pd
 
 from pmotools.pmo_engine.pmo_checker import PMOChecker
+from pmotools.pmo_engine.pmo_filter import PMOFilterSpec
 from pmotools.pmo_engine.pmo_processor import PMOProcessor
 import hashlib
 from pmotools.utils.schema_loader import load_schema
@@ -186,6 +187,106 @@ class TestPMOProcessor(unittest.TestCase):
             targets_per_sample_counts_collapsed,
         )
 
+    def test_count_library_samples_per_target_multiple_runs(self):
+        pmo_data = json.loads(json.dumps(self.combined_pmo_data))
+        second_run = json.loads(json.dumps(pmo_data["detected_microhaplotypes"][0]))
+        second_run["bioinformatics_run_id"] = 2
+        second_run["library_samples"] = second_run["library_samples"][1:]
+        pmo_data["detected_microhaplotypes"].insert(0, second_run)
+        target_names = PMOProcessor.get_target_names(pmo_data)
+        expected_counts = {}
+        expected_collapsed_counts = {}
+        for result in pmo_data["detected_microhaplotypes"]:
+            for sample in result["library_samples"]:
+                for target_result in sample["target_results"]:
+                    if sum(hap["reads"] for hap in target_result["mhaps"]) >= 150:
+                        target_name = target_names[
+                            pmo_data["representative_microhaplotypes"]["targets"][
+                                target_result["mhaps_target_id"]
+                            ]["target_id"]
+                        ]
+                        key = (result["bioinformatics_run_id"], target_name)
+                        expected_counts[key] = expected_counts.get(key, 0) + 1
+                        expected_collapsed_counts[target_name] = (
+                            expected_collapsed_counts.get(target_name, 0) + 1
+                        )
+        counts = PMOProcessor.count_library_samples_per_target(pmo_data, 150)
+        self.assertEqual(
+            sorted(expected_counts.items()),
+            [
+                ((run_id, target_name), sample_count)
+                for run_id, target_name, sample_count in counts.itertuples(
+                    index=False, name=None
+                )
+            ],
+        )
+        collapsed_counts = PMOProcessor.count_library_samples_per_target(
+            pmo_data, 150, collapse_across_runs=True
+        )
+        self.assertEqual(
+            sorted(expected_collapsed_counts.items()),
+            list(collapsed_counts.itertuples(index=False, name=None)),
+        )
+        targets_per_sample_counts = PMOProcessor.count_targets_per_library_sample(
+            pmo_data, 150
+        )
+        self.assertEqual(
+            [2, 0, 0, 1, 1], targets_per_sample_counts["bioinformatics_run_id"].tolist()
+        )
+
+    def test_calc_within_sample_diversity(self):
+        diversity = PMOProcessor.calc_within_sample_diversity(self.combined_pmo_data)
+        self.assertEqual(
+            [
+                "8025874266_lib_name",
+                "8025874217_lib_name",
+                "XUC009_lib_name",
+                "5tbx_lib_name",
+            ],
+            diversity["library_sample_name"].tolist(),
+        )
+        self.assertEqual([85, 99, 98, 100], diversity["target_number"].tolist())
+        self.assertEqual(
+            [29, 35, 0, 25], diversity["polyallelic_target_number"].tolist()
+        )
+        self.assertEqual([3, 2, 1, 2], diversity["max_alleles_per_target"].tolist())
+        # within host heterozygosity from the read frequencies of each target
+        for detected_microhaplotypes in self.combined_pmo_data[
+            "detected_microhaplotypes"
+        ]:
+            for sample in detected_microhaplotypes["library_samples"]:
+                heterozygosities = []
+                for target in sample["target_results"]:
+                    total = sum(microhap["reads"] for microhap in target["mhaps"])
+                    heterozygosities.append(
+                        1
+                        - sum(
+                            (microhap["reads"] / total) ** 2
+                            for microhap in target["mhaps"]
+                        )
+                    )
+                self.assertAlmostEqual(
+                    sum(heterozygosities) / len(heterozygosities),
+                    diversity["mean_within_host_heterozygosity"][
+                        diversity["library_sample_name"]
+                        == self.combined_pmo_data["library_sample_info"][
+                            sample["library_sample_id"]
+                        ]["library_sample_name"]
+                    ].iloc[0],
+                )
+
+        diversity = PMOProcessor.calc_within_sample_diversity(
+            self.combined_pmo_data, min_within_target_freq=0.2
+        )
+        self.assertEqual(
+            [0, 30, 0, 23], diversity["polyallelic_target_number"].tolist()
+        )
+        diversity = PMOProcessor.calc_within_sample_diversity(
+            self.combined_pmo_data, min_reads=1e9
+        )
+        self.assertEqual([0, 0, 0, 0], diversity["target_number"].tolist())
+        self.assertTrue(diversity["max_alleles_per_target"].isna().all())
+
     def test_count_specimen_per_meta_fields(self):
         specimen_meta_fields_counts = PMOProcessor.count_specimen_per_meta_fields(
             self.combined_pmo_data
@@ -309,6 +410,57 @@ class TestPMOProcessor(unittest.TestCase):
             "cb34c7e1357e2e35024a89464b63f06c",
         )
 
+    def test_extract_allele_counts_freq_from_pmo_grouped(self):
+        allele_counts = PMOProcessor.extract_allele_counts_freq_from_pmo(
+            self.combined_pmo_data,
+            collapse_across_runs=True,
+            group_by_fields=["collection_country"],
+        )
+        self.assertEqual(
+            ["India", "Mozambique", "Papua New Guinea"],
+            allele_counts["collection_country"].unique().tolist(),
+        )
+        # each group is the same as computing the frequencies of its specimens alone
+        for country in ["Mozambique", "India"]:
+            pd.testing.assert_frame_equal(
+                PMOProcessor.extract_allele_counts_freq_from_pmo(
+                    PMOProcessor.filter_pmo(
+                        self.combined_pmo_data,
+                        PMOFilterSpec(
+                            meta_fields_values=f"collection_country={country}"
+                        ),
+                    ),
+                    collapse_across_runs=True,
+                ),
+                allele_counts[allele_counts["collection_country"] == country]
+                .drop(columns="collection_country")
+                .reset_index(drop=True),
+            )
+        self.assertEqual(
+            ["MOZ2018", "MOZ2018", "PathWeaverHeome1", "PathWeaverHeome1"],
+            PMOProcessor.get_library_sample_field_values(
+                self.combined_pmo_data, "project_name"
+            ),
+        )
+        allele_counts = PMOProcessor.extract_allele_counts_freq_from_pmo(
+            self.combined_pmo_data,
+            target_names=["t96"],
+            group_by_fields=["project_name"],
+        )
+        self.assertEqual(
+            [
+                "project_name",
+                "bioinformatics_run_id",
+                "target_name",
+                "mhap_id",
+                "count",
+                "freq",
+                "total_haps_per_target",
+            ],
+            allele_counts.columns.tolist(),
+        )
+        self.assertEqual({"t96"}, set(allele_counts["target_name"]))
+
     def test_extract_from_pmo_with_read_filter(self):
         pmo_data_filtered = PMOProcessor.extract_from_pmo_with_read_filter(
             self.combined_pmo_data, 1000
@@ -322,6 +474,217 @@ class TestPMOProcessor(unittest.TestCase):
         checker = PMOChecker(self.pmo_jsonschema_data)
         checker.validate_pmo_json(pmo_data_filtered)
 
+    def test_filter_share_unchanged(self):
+        original_json = json.dumps(self.combined_pmo_data)
+        for filter_func, selection in [
+            (PMOProcessor.filter_pmo_by_library_sample_ids, {1, 3}),
+            (PMOProcessor.filter_pmo_by_specimen_names, {"8025874217", "5tbx"}),
+            (PMOProcessor.filter_pmo_by_target_ids, {1, 10, 11, 55}),
+            (PMOProcessor.extract_from_pmo_with_read_filter, 1000),
+        ]:
+            copied = filter_func(self.combined_pmo_data, selection)
+            shared = filter_func(
+                self.combined_pmo_data, selection, share_unchanged=True
+            )
+            self.assertEqual(copied, shared)
+            # the source PMO is left untouched
+            self.assertEqual(original_json, json.dumps(self.combined_pmo_data))
+        # unchanged sections and records are shared rather than copied
+        shared = PMOProcessor.filter_pmo_by_library_sample_ids(
+            self.combined_pmo_data, {1, 3}, share_unchanged=True
+        )
+        self.assertIs(
+            self.combined_pmo_data["representative_microhaplotypes"],
+            shared["representative_microhaplotypes"],
+        )
+        source_target_results = [
+            sample["target_results"]
+            for block in self.combined_pmo_data["detected_microhaplotypes"]
+            for sample in block["library_samples"]
+        ]
+        for block in shared["detected_microhaplotypes"]:
+            for sample in block["library_samples"]:
+                self.assertTrue(
+                    any(
+                        sample["target_results"] is target_results
+                        for target_results in source_target_results
+                    )
+                )
+        self.assertIsNot(
+            self.combined_pmo_data["representative_microhaplotypes"],
+            PMOProcessor.filter_pmo_by_library_sample_ids(
+                self.combined_pmo_data, {1, 3}
+            )["representative_microhaplotypes"],
+        )
+
+    def test_filter_pmo(self):
+        original_json = json.dumps(self.combined_pmo_data)
+        specimen_names = {"8025874217", "5tbx"}
+        target_names = {"t96", "t80", "t34", "t55"}
+        chained = PMOProcessor.extract_from_pmo_with_read_filter(
+            PMOProcessor.filter_pmo_by_target_names(
+                PMOProcessor.filter_pmo_by_specimen_names(
+                    self.combined_pmo_data, specimen_names
+                ),
+                target_names,
+            ),
+            1000,
+        )
+        filter_spec = PMOFilterSpec(
+            specimen_names=specimen_names, target_names=target_names, min_reads=1000
+        )
+        pmo_data_filtered = PMOProcessor.filter_pmo(self.combined_pmo_data, filter_spec)
+        self.assertEqual(original_json, json.dumps(self.combined_pmo_data))
+        self.assertEqual(
+            pmo_data_filtered,
+            PMOProcessor.filter_pmo(
+                self.combined_pmo_data, filter_spec, share_unchanged=True
+            ),
+        )
+        for section in chained:
+            # chaining loses panel_info and read_counts_by_stage
+            if section not in {"panel_info", "read_counts_by_stage"}:
+                self.assertEqual(chained[section], pmo_data_filtered[section])
+        self.assertEqual(
+            [[[0, 1, 2, 3]]],
+            [
+                [reaction["panel_targets"] for reaction in panel["reactions"]]
+                for panel in pmo_data_filtered["panel_info"]
+            ],
+        )
+        for read_count in pmo_data_filtered["read_counts_by_stage"]:
+            for sample in read_count["read_counts_by_library_sample_by_stage"]:
+                self.assertIn(sample["library_sample_id"], {0, 1})
+                self.assertEqual(
+                    [0, 1, 2, 3],
+                    sorted(
+                        target["target_id"]
+                        for target in sample["read_counts_for_targets"]
+                    ),
+                )
+        checker = PMOChecker(self.pmo_jsonschema_data)
+        checker.validate_pmo_json(pmo_data_filtered)
+
+        # library sample selections are combined
+        pmo_data_filtered = PMOProcessor.filter_pmo(
+            self.combined_pmo_data,
+            PMOFilterSpec(
+                specimen_names=specimen_names,
+                meta_fields_values="collection_country=Mozambique",
+            ),
+        )
+        self.assertEqual(
+            ["8025874217"],
+            PMOProcessor.get_specimen_names(pmo_data_filtered),
+        )
+        # an empty spec keeps everything
+        self.assertEqual(
+            self.combined_pmo_data,
+            PMOProcessor.filter_pmo(self.combined_pmo_data, PMOFilterSpec()),
+        )
+
+        # within target frequency
+        pmo_data_filtered = PMOProcessor.filter_pmo(
+            self.combined_pmo_data, PMOFilterSpec(min_within_target_freq=0.5)
+        )
+        for detected_microhaplotypes in pmo_data_filtered["detected_microhaplotypes"]:
+            for sample in detected_microhaplotypes["library_samples"]:
+                for target in sample["target_results"]:
+                    self.assertEqual(1, len(target["mhaps"]))
+
+        self.assertRaises(
+            Exception,
+            PMOProcessor.filter_pmo,
+            self.combined_pmo_data,
+            PMOFilterSpec(target_names={"not_a_target"}),
+        )
+
+    def test_split_pmo(self):
+        original_json = json.dumps(self.combined_pmo_data)
+        self.assertEqual(
+            {"MOZ2018": [0, 1], "PathWeaverHeome1": [2, 3]},
+            PMOProcessor.partition_library_samples(
+                self.combined_pmo_data, group_by_field="project_name"
+            ),
+        )
+        self.assertEqual(
+            {"Mozambique": [0, 1], "India": [2], "Papua New Guinea": [3]},
+            PMOProcessor.partition_library_samples(
+                self.combined_pmo_data, group_by_field="collection_country"
+            ),
+        )
+        shard_library_sample_ids = PMOProcessor.partition_library_samples(
+            self.combined_pmo_data, n_shards=2
+        )
+        self.assertEqual(
+            [0, 1, 2, 3], sorted(sum(shard_library_sample_ids.values(), []))
+        )
+        self.assertEqual(2, len(shard_library_sample_ids))
+        self.assertRaises(
+            Exception,
+            PMOProcessor.partition_library_samples,
+            self.combined_pmo_data,
+        )
+
+        shards = PMOProcessor.split_pmo(
+            self.combined_pmo_data,
+            PMOProcessor.partition_library_samples(
+                self.combined_pmo_data, group_by_field="project_name"
+            ),
+        )
+        self.assertEqual(original_json, json.dumps(self.combined_pmo_data))
+        checker = PMOChecker(self.pmo_jsonschema_data)
+        for shard_name, shard in shards.items():
+            checker.validate_pmo_json(shard)
+            # each shard only refers to its own project and bioinformatics run
+            self.assertEqual(
+                [shard_name],
+                [project["project_name"] for project in shard["project_info"]],
+            )
+            self.assertEqual(1, len(shard["bioinformatics_run_info"]))
+            self.assertEqual(1, len(shard["detected_microhaplotypes"]))
+            # the shard's alleles are the same as extracting its specimens
+            extracted = PMOProcessor.filter_pmo(
+                self.combined_pmo_data,
+                PMOFilterSpec(
+                    specimen_names=set(PMOProcessor.get_specimen_names(shard))
+                ),
+            )
+            # mhap_ids are renumbered in the shard so compare the counts of each target
+            self.assertEqual(
+                sorted(
+                    PMOProcessor.extract_allele_counts_freq_from_pmo(extracted)[
+                        ["target_name", "count"]
+                    ].itertuples(index=False)
+                ),
+                sorted(
+                    PMOProcessor.extract_allele_counts_freq_from_pmo(shard)[
+                        ["target_name", "count"]
+                    ].itertuples(index=False)
+                ),
+            )
+        self.assertEqual(
+            99,
+            len(shards["MOZ2018"]["representative_microhaplotypes"]["targets"]),
+        )
+        self.assertEqual([], shards["PathWeaverHeome1"]["read_counts_by_stage"])
+        self.assertEqual(
+            shards,
+            PMOProcessor.split_pmo(
+                self.combined_pmo_data,
+                PMOProcessor.partition_library_samples(
+                    self.combined_pmo_data, group_by_field="project_name"
+                ),
+                share_unchanged=True,
+            ),
+        )
+        self.assertRaises(
+            Exception,
+            PMOProcessor.split_pmo,
+            self.combined_pmo_data,
+            {"a": [0, 1], "b": [1]},
+        )
+
     def test_filter_pmo_by_target_ids(self):
         pmo_data_select_targets = PMOProcessor.filter_pmo_by_target_ids(
             self.combined_pmo_data, {1, 10, 11, 55}
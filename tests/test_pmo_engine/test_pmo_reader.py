@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 import json
 import os
+import tempfile
 import unittest
 
 from pmotools.pmo_engine.pmo_checker import PMOChecker
 from pmotools.pmo_engine.pmo_reader import PMOReader
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
+from pmotools.pmo_engine.pmo_writer import PMOWriter
 from pmotools.utils.schema_loader import load_schema
 
 
@@ -71,6 +74,31 @@ class TestPMOReader(unittest.TestCase):
             ]
         )
 
+    def test_read_in_pmos_parallel(self):
+        fnps = [
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/minimum_pmo_example.json.gz"
+            ),
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/minimum_pmo_example_2.json"
+            ),
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/combined_pmo_example.json"
+            ),
+        ]
+        expected = PMOReader.read_in_pmos(fnps)
+        # output should be in input order regardless of the number of workers or the in-flight window
+        self.assertEqual(expected, PMOReader.read_in_pmos(fnps, threads=2))
+        self.assertEqual(
+            expected, PMOReader.read_in_pmos(fnps, threads=2, max_in_flight=1)
+        )
+        self.assertEqual(
+            expected, list(PMOReader.iter_in_pmos(fnps, threads=3, max_in_flight=2))
+        )
+        self.assertRaises(
+            Exception, PMOReader.read_in_pmos, ["STDIN", fnps[0]], threads=2
+        )
+
     def test_combine_multiple_pmos(self):
         pmo_data_list = PMOReader.read_in_pmos(
             [
@@ -102,6 +130,177 @@ class TestPMOReader(unittest.TestCase):
 
         self.assertEqual(expected_pmo, combined_pmo)
 
+    def test_combine_multiple_pmos_consume_inputs(self):
+        fnps = [
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/minimum_pmo_example.json"
+            ),
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/minimum_pmo_example_2.json"
+            ),
+        ]
+        pmo_data_list = PMOReader.read_in_pmos(fnps)
+        combined_pmo = PMOReader.combine_multiple_pmos(pmo_data_list)
+        # by default the inputs are left untouched
+        self.assertEqual(PMOReader.read_in_pmos(fnps), pmo_data_list)
+
+        consumed_pmo_data_list = PMOReader.read_in_pmos(fnps)
+        combined_pmo_consumed = PMOReader.combine_multiple_pmos(
+            consumed_pmo_data_list, consume_inputs=True
+        )
+        # inputs have been moved into the combined PMO
+        self.assertEqual([{}, {}], consumed_pmo_data_list)
+        combined_pmo.pop("pmo_header")
+        combined_pmo_consumed.pop("pmo_header")
+        self.assertEqual(combined_pmo, combined_pmo_consumed)
+
+    def test_combine_multiple_pmos_streamed(self):
+        fnps = [
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/minimum_pmo_example.json"
+            ),
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/minimum_pmo_example_2.json.gz"
+            ),
+        ]
+        combined_pmo = PMOReader.combine_multiple_pmos(PMOReader.read_in_pmos(fnps))
+        combined_pmo.pop("pmo_header")
+        lazy_combined_pmo = PMOReader.combine_multiple_pmos(
+            [PMOStreamReader.read_in_pmo_lazily(fnp) for fnp in fnps],
+            consume_inputs=True,
+        )
+        lazy_combined_pmo.pop("pmo_header")
+        with tempfile.TemporaryDirectory() as test_dir:
+            # writing out streams the data sections from the input files
+            PMOWriter.write_out_pmo(
+                lazy_combined_pmo, os.path.join(test_dir, "combined.json")
+            )
+            # the combined sections can be iterated over more than once
+            PMOWriter.write_out_pmo(
+                lazy_combined_pmo, os.path.join(test_dir, "combined_2.json.gz")
+            )
+            self.assertEqual(
+                combined_pmo,
+                PMOReader.read_in_pmo(os.path.join(test_dir, "combined.json")),
+            )
+            self.assertEqual(
+                combined_pmo,
+                PMOReader.read_in_pmo(os.path.join(test_dir, "combined_2.json.gz")),
+            )
+
+    def test_combine_multiple_pmos_bioinformatics_methods_id(self):
+        pmo_data_list = PMOReader.read_in_pmos(
+            [
+                os.path.join(
+                    os.path.dirname(self.working_dir), "data/minimum_pmo_example.json"
+                ),
+                os.path.join(
+                    os.path.dirname(self.working_dir), "data/minimum_pmo_example_2.json"
+                ),
+            ]
+        )
+        # the run of the second PMO uses its second methods entry
+        second_pmo = pmo_data_list[1]
+        second_pmo["bioinformatics_methods_info"].insert(
+            0, {"methods": [], "note": "unused"}
+        )
+        second_pmo["bioinformatics_run_info"][0]["bioinformatics_methods_id"] = 1
+        expected_methods = second_pmo["bioinformatics_methods_info"][1]
+        combined_pmo = PMOReader.combine_multiple_pmos(pmo_data_list)
+        self.assertEqual(
+            [0, 2],
+            [
+                run["bioinformatics_methods_id"]
+                for run in combined_pmo["bioinformatics_run_info"]
+            ],
+        )
+        self.assertEqual(
+            expected_methods, combined_pmo["bioinformatics_methods_info"][2]
+        )
+
+    def test_combine_multiple_pmos_new_microhaplotype_counts(self):
+        pmo_data_list = PMOReader.read_in_pmos(
+            [
+                os.path.join(
+                    os.path.dirname(self.working_dir), "data/minimum_pmo_example.json"
+                ),
+                os.path.join(
+                    os.path.dirname(self.working_dir), "data/minimum_pmo_example_2.json"
+                ),
+            ]
+        )
+        # reverse the second PMO's target_info so its target indexes differ from the first PMO's
+        second_pmo = pmo_data_list[1]
+        target_count = len(second_pmo["target_info"])
+        second_pmo["target_info"].reverse()
+        for panel in second_pmo["panel_info"]:
+            for reaction in panel["reactions"]:
+                reaction["panel_targets"] = [
+                    target_count - 1 - target_id
+                    for target_id in reaction["panel_targets"]
+                ]
+        for target in second_pmo["representative_microhaplotypes"]["targets"]:
+            target["target_id"] = target_count - 1 - target["target_id"]
+
+        # expected sequences per target name
+        expected_seqs = {}
+        for pmo in pmo_data_list:
+            for target in pmo["representative_microhaplotypes"]["targets"]:
+                expected_seqs.setdefault(
+                    pmo["target_info"][target["target_id"]]["target_name"], set()
+                ).update(mhap["seq"] for mhap in target["microhaplotypes"])
+
+        (
+            combined_pmo,
+            new_microhaplotype_counts,
+        ) = PMOReader.combine_multiple_pmos(
+            pmo_data_list, return_new_microhaplotype_counts=True
+        )
+        self.assertEqual([181, 90], new_microhaplotype_counts)
+        combined_seqs = {}
+        for target in combined_pmo["representative_microhaplotypes"]["targets"]:
+            combined_seqs[
+                combined_pmo["target_info"][target["target_id"]]["target_name"]
+            ] = [mhap["seq"] for mhap in target["microhaplotypes"]]
+        self.assertEqual(
+            expected_seqs, {name: set(seqs) for name, seqs in combined_seqs.items()}
+        )
+        self.assertEqual(
+            sum(new_microhaplotype_counts),
+            sum(len(seqs) for seqs in combined_seqs.values()),
+        )
+
+    def test_append_pmo(self):
+        fnps = [
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/minimum_pmo_example.json"
+            ),
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/minimum_pmo_example_2.json"
+            ),
+        ]
+        combined_pmo = PMOReader.combine_multiple_pmos(PMOReader.read_in_pmos(fnps))
+        pmo_data_list = PMOReader.read_in_pmos(fnps)
+        appended_pmo, new_microhaplotype_counts = PMOReader.append_pmo(
+            pmo_data_list[0],
+            pmo_data_list[1:],
+            return_new_microhaplotype_counts=True,
+        )
+        # the existing PMO is moved into the output while the new PMOs are left untouched
+        self.assertEqual({}, pmo_data_list[0])
+        self.assertEqual(PMOReader.read_in_pmo(fnps[1]), pmo_data_list[1])
+        self.assertEqual([181, 90], new_microhaplotype_counts)
+        self.assertEqual(
+            "pmotools-python.PMOReader.append_pmo",
+            appended_pmo["pmo_header"]["generation_method"]["program_name"],
+        )
+        combined_pmo.pop("pmo_header")
+        appended_pmo.pop("pmo_header")
+        self.assertEqual(combined_pmo, appended_pmo)
+        self.assertRaises(
+            Exception, PMOReader.append_pmo, PMOReader.read_in_pmo(fnps[0]), []
+        )
+
     def test_combine_multiple_pmos_fail_dup_specimen_names(self):
         # the two files below have same specimen_names but have different meta so will fail when trying to combine
         pmo_data_list = PMOReader.read_in_pmos(
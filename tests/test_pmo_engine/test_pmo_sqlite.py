@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+import copy
+import os
+import sqlite3
+import tempfile
+import unittest
+import json
+
+from pmotools.pmo_engine.pmo_sqlite import PMOSqlite
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
+
+
+class TestPMOSqlite(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = os.path.dirname(os.path.abspath(__file__))
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.combined_pmo_fnp = os.path.join(
+            os.path.dirname(self.working_dir), "data/combined_pmo_example.json"
+        )
+        with open(self.combined_pmo_fnp) as f:
+            self.combined_pmo_data = json.load(f)
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_pmo_to_sqlite_round_trip(self):
+        db_fnp = os.path.join(self.test_dir.name, "pmo.sqlite")
+        PMOSqlite.pmo_to_sqlite(self.combined_pmo_data, db_fnp, batch_size=7)
+        pmo = PMOSqlite.sqlite_to_pmo(db_fnp)
+        self.assertEqual(self.combined_pmo_data, pmo)
+        self.assertEqual(list(self.combined_pmo_data), list(pmo))
+
+        # the tables can be queried directly
+        connection = sqlite3.connect(db_fnp)
+        self.assertEqual(
+            474,
+            connection.execute(
+                "SELECT COUNT(*) FROM detected_microhaplotypes"
+            ).fetchone()[0],
+        )
+        reads_per_sample = dict(
+            connection.execute(
+                "SELECT library_sample_name, SUM(reads) FROM detected_microhaplotypes JOIN library_sample_info USING (library_sample_id) GROUP BY library_sample_id"
+            ).fetchall()
+        )
+        expected = {}
+        for run in self.combined_pmo_data["detected_microhaplotypes"]:
+            for sample in run["library_samples"]:
+                name = self.combined_pmo_data["library_sample_info"][
+                    sample["library_sample_id"]
+                ]["library_sample_name"]
+                expected[name] = expected.get(name, 0) + sum(
+                    mhap["reads"]
+                    for target in sample["target_results"]
+                    for mhap in target["mhaps"]
+                )
+        self.assertEqual(expected, reads_per_sample)
+        indexes = {
+            row[0]
+            for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        }
+        self.assertIn("idx_detected_microhaplotypes_library_sample_id", indexes)
+        connection.close()
+
+        # existing databases are only replaced with overwrite
+        self.assertRaises(
+            Exception, PMOSqlite.pmo_to_sqlite, self.combined_pmo_data, db_fnp
+        )
+
+    def test_pmo_to_sqlite_lazily_read_and_sparse_fields(self):
+        db_fnp = os.path.join(self.test_dir.name, "pmo.sqlite")
+        PMOSqlite.pmo_to_sqlite(
+            PMOStreamReader.read_in_pmo_lazily(self.combined_pmo_fnp), db_fnp
+        )
+        self.assertEqual(self.combined_pmo_data, PMOSqlite.sqlite_to_pmo(db_fnp))
+
+        # explicit nulls, extra fields and missing optional lists are kept
+        pmo = copy.deepcopy(self.combined_pmo_data)
+        library_samples = pmo["detected_microhaplotypes"][0]["library_samples"]
+        target_result = library_samples[0]["target_results"][0]
+        target_result["mhaps"][0]["umis"] = None
+        target_result["mhaps"][1]["note"] = {"flagged": [1, 2]}
+        target_result["checked"] = True
+        del library_samples[1]["target_results"]
+        pmo["representative_microhaplotypes"]["targets"][0]["microhaplotypes"][0][
+            "alt_annotations"
+        ] = ["a"]
+        PMOSqlite.pmo_to_sqlite(pmo, db_fnp, overwrite=True, create_indexes=False)
+        self.assertEqual(pmo, PMOSqlite.sqlite_to_pmo(db_fnp))
+
+    def test_load_pmo_database_and_query(self):
+        sql = "SELECT bioinformatics_run_id, COUNT(DISTINCT library_sample_id) AS library_samples FROM detected_microhaplotypes GROUP BY bioinformatics_run_id"
+        output_fnp = os.path.join(self.test_dir.name, "query.tsv")
+        connection = PMOSqlite.load_pmo_database(self.combined_pmo_fnp)
+        self.assertEqual(2, PMOSqlite.write_query_results(connection, sql, output_fnp))
+        with open(output_fnp) as f:
+            self.assertEqual(
+                "bioinformatics_run_id\tlibrary_samples\n0\t2\n1\t2\n", f.read()
+            )
+        # the database is only for queries
+        self.assertRaises(
+            sqlite3.OperationalError,
+            connection.execute,
+            "DELETE FROM specimen_info",
+        )
+        connection.close()
+
+        # the cached database is reused for the same PMO contents
+        cache_dir = os.path.join(self.test_dir.name, "cache")
+        connection = PMOSqlite.load_pmo_database(
+            self.combined_pmo_fnp, cache_dir=cache_dir
+        )
+        connection.close()
+        db_fnp = os.path.join(
+            cache_dir, PMOSqlite.file_hash(self.combined_pmo_fnp) + ".sqlite"
+        )
+        self.assertEqual([os.path.basename(db_fnp)], os.listdir(cache_dir))
+        modified_time = os.path.getmtime(db_fnp)
+        connection = PMOSqlite.load_pmo_database(
+            self.combined_pmo_fnp, cache_dir=cache_dir
+        )
+        self.assertEqual(modified_time, os.path.getmtime(db_fnp))
+        self.assertEqual(
+            2,
+            PMOSqlite.write_query_results(
+                connection, sql, output_fnp + ".gz", header=False
+            ),
+        )
+        self.assertRaises(
+            Exception,
+            PMOSqlite.write_query_results,
+            connection,
+            "PRAGMA foreign_keys = ON",
+            output_fnp,
+        )
+        connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
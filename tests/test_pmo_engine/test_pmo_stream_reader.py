@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import json
+import os
+import unittest
+
+import pandas as pd
+
+from pmotools.pmo_engine.pmo_processor import PMOProcessor
+from pmotools.pmo_engine.pmo_reader import PMOReader
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader, StreamedPMOSection
+
+
+class TestPMOStreamReader(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = os.path.dirname(os.path.abspath(__file__))
+        self.pmo_fnp = os.path.join(
+            os.path.dirname(self.working_dir), "data/minimum_pmo_example.json"
+        )
+        self.pmo_gz_fnp = os.path.join(
+            os.path.dirname(self.working_dir), "data/minimum_pmo_example.json.gz"
+        )
+        self.combined_pmo_fnp = os.path.join(
+            os.path.dirname(self.working_dir), "data/combined_pmo_example.json"
+        )
+        with open(self.pmo_fnp) as f:
+            self.pmo_data = json.load(f)
+
+    def test_read_in_pmo_sections(self):
+        # use a tiny chunk size to make sure values split across chunks are handled
+        for chunk_size in [7, 4096]:
+            sections = PMOStreamReader.read_in_pmo_sections(
+                self.pmo_gz_fnp,
+                ["library_sample_info", "target_info"],
+                chunk_size=chunk_size,
+            )
+            self.assertEqual(["library_sample_info", "target_info"], list(sections))
+            self.assertEqual(
+                self.pmo_data["library_sample_info"], sections["library_sample_info"]
+            )
+            self.assertEqual(self.pmo_data["target_info"], sections["target_info"])
+
+        sections = PMOStreamReader.read_in_pmo_sections(
+            self.pmo_fnp, skip_sections=["detected_microhaplotypes"]
+        )
+        expected = dict(self.pmo_data)
+        expected.pop("detected_microhaplotypes")
+        self.assertEqual(expected, sections)
+
+    def test_iter_detected_microhaplotypes(self):
+        expected = [
+            (block["bioinformatics_run_id"], library_sample)
+            for block in self.pmo_data["detected_microhaplotypes"]
+            for library_sample in block["library_samples"]
+        ]
+        for fnp in [self.pmo_fnp, self.pmo_gz_fnp]:
+            for chunk_size in [13, PMOStreamReader.default_chunk_size]:
+                self.assertEqual(
+                    expected,
+                    list(
+                        PMOStreamReader.iter_detected_microhaplotypes(fnp, chunk_size)
+                    ),
+                )
+
+    def test_iter_target_results(self):
+        expected = [
+            (
+                block["bioinformatics_run_id"],
+                library_sample["library_sample_id"],
+                target_result,
+            )
+            for block in self.pmo_data["detected_microhaplotypes"]
+            for library_sample in block["library_samples"]
+            for target_result in library_sample["target_results"]
+        ]
+        self.assertEqual(
+            expected, list(PMOStreamReader.iter_target_results(self.pmo_gz_fnp))
+        )
+
+    def test_iter_section_blocks_partial_consumption(self):
+        # only looking at the first record of each block should still leave the parser in the right place
+        first_records = []
+        for block in PMOStreamReader.iter_section_blocks(
+            self.combined_pmo_fnp, "read_counts_by_stage", chunk_size=64
+        ):
+            first_records.append(
+                (
+                    block["bioinformatics_run_id"],
+                    next(block["read_counts_by_library_sample_by_stage"]),
+                )
+            )
+        pmo_data = PMOReader.read_in_pmo(self.combined_pmo_fnp)
+        self.assertEqual(
+            [
+                (
+                    block["bioinformatics_run_id"],
+                    block["read_counts_by_library_sample_by_stage"][0],
+                )
+                for block in pmo_data["read_counts_by_stage"]
+            ],
+            first_records,
+        )
+        self.assertRaises(
+            Exception,
+            list,
+            PMOStreamReader.iter_section_blocks(self.pmo_fnp, "specimen_info"),
+        )
+
+    def test_read_in_pmo_lazily(self):
+        lazy_pmo = PMOStreamReader.read_in_pmo_lazily(self.combined_pmo_fnp)
+        self.assertIsInstance(lazy_pmo["detected_microhaplotypes"], StreamedPMOSection)
+        pmo_data = PMOReader.read_in_pmo(self.combined_pmo_fnp)
+        self.assertEqual(pmo_data["specimen_info"], lazy_pmo["specimen_info"])
+        # the processor's counting functions only loop over detected_microhaplotypes so work on the lazily read PMO
+        pd.testing.assert_frame_equal(
+            PMOProcessor.count_targets_per_library_sample(pmo_data, 100),
+            PMOProcessor.count_targets_per_library_sample(lazy_pmo, 100),
+        )
+        pd.testing.assert_frame_equal(
+            PMOProcessor.count_library_samples_per_target(pmo_data, 100, True),
+            PMOProcessor.count_library_samples_per_target(lazy_pmo, 100, True),
+        )
+        self.assertRaises(Exception, PMOStreamReader.read_in_pmo_lazily, "STDIN")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,7 @@ import tempfile
 import unittest
 import json
 from pmotools.pmo_engine.pmo_writer import PMOWriter
+from pmotools.pmo_engine.pmo_stream_reader import PMOStreamReader
 import hashlib
 import gzip
 
@@ -70,6 +71,70 @@ class TestPMOWriter(unittest.TestCase):
                 hash_md5.update(chunk)
         self.assertEqual("947659479b1924a40e91dedcb5f558fb", hash_md5.hexdigest())
 
+    def test_write_out_pmo_lazily_read(self):
+        # sections read in lazily are streamed to the output and should give the exact same file
+        pmo_data = PMOStreamReader.read_in_pmo_lazily(
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/minimum_pmo_example.json"
+            )
+        )
+        output_fnp = os.path.join(self.test_dir.name, "out_pmo.json")
+        PMOWriter.write_out_pmo(pmo_data, output_fnp, True)
+        with open(output_fnp, "rb") as file_to_check:
+            md5_returned = hashlib.md5(file_to_check.read()).hexdigest()
+        self.assertEqual("947659479b1924a40e91dedcb5f558fb", md5_returned)
+        # empty lazy sections and generators nested inside lists
+        output_fnp = os.path.join(self.test_dir.name, "out_lazy.json")
+        lazy_data = {
+            "a": iter([]),
+            "b": [{"c": 1}],
+            "d": iter([{"e": iter([1, {"f": "g\nh"}]), "i": []}]),
+        }
+        PMOWriter.write_out_pmo(lazy_data, output_fnp, True)
+        with open(output_fnp) as f:
+            self.assertEqual(
+                json.dumps(
+                    {
+                        "a": [],
+                        "b": [{"c": 1}],
+                        "d": [{"e": [1, {"f": "g\nh"}], "i": []}],
+                    },
+                    indent=2,
+                ),
+                f.read(),
+            )
+
+    def test_write_out_pmos(self):
+        with open(
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/minimum_pmo_example.json"
+            )
+        ) as f:
+            pmo_data = json.load(f)
+        output_fnps = [
+            os.path.join(self.test_dir.name, "out_pmo_1.json"),
+            os.path.join(self.test_dir.name, "out_pmo_2.json.gz"),
+        ]
+        PMOWriter.write_out_pmos(
+            {output_fnp: pmo_data for output_fnp in output_fnps}, threads=2
+        )
+        with open(output_fnps[0], "rb") as f:
+            self.assertEqual(
+                "947659479b1924a40e91dedcb5f558fb", hashlib.md5(f.read()).hexdigest()
+            )
+        with gzip.open(output_fnps[1], "rb") as f:
+            self.assertEqual(
+                "947659479b1924a40e91dedcb5f558fb", hashlib.md5(f.read()).hexdigest()
+            )
+        # nothing is written if any of the outputs already exist
+        new_output_fnp = os.path.join(self.test_dir.name, "out_pmo_3.json")
+        self.assertRaises(
+            Exception,
+            PMOWriter.write_out_pmos,
+            {new_output_fnp: pmo_data, output_fnps[0]: pmo_data},
+        )
+        self.assertFalse(os.path.exists(new_output_fnp))
+
     def test_write_out_pmo_fail_overwrite(self):
         with open(
             os.path.join(
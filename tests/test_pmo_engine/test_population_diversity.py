@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+import json
+from math import comb
+
+import numpy as np
+import pandas as pd
+
+from pmotools.pmo_engine.pmo_processor import PMOProcessor
+from pmotools.pmo_engine.population_diversity import PopulationDiversity
+
+
+class TestPopulationDiversity(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/combined_pmo_example.json"
+            )
+        ) as f:
+            self.combined_pmo_data = json.load(f)
+
+    def test_calc_target_diversity(self):
+        allele_counts = pd.DataFrame(
+            {
+                "population": ["a", "a", "a", "b", "b", "b", "c"],
+                "target_name": ["t1", "t1", "t2", "t1", "t2", "t2", "t2"],
+                "mhap_id": [0, 1, 0, 0, 0, 1, 0],
+                "count": [3, 1, 1, 2, 2, 2, 5],
+            }
+        )
+        diversity = PopulationDiversity(
+            allele_counts, ["population"]
+        ).calc_target_diversity()
+        self.assertEqual(["a", "a", "b", "b", "c"], diversity["population"].tolist())
+        self.assertEqual(
+            ["t1", "t2", "t1", "t2", "t2"], diversity["target_name"].tolist()
+        )
+        self.assertEqual([4, 1, 2, 4, 5], diversity["target_total"].tolist())
+        self.assertEqual([2, 1, 1, 2, 1], diversity["allele_number"].tolist())
+        np.testing.assert_allclose(
+            [4 / 3 * (1 - 10 / 16), np.nan, 0, 4 / 3 * 0.5, 0],
+            diversity["expected_heterozygosity"],
+        )
+        np.testing.assert_allclose(
+            [16 / 10, 1, 1, 2, 1], diversity["effective_allele_number"]
+        )
+        # rarefied to the smallest total of each target, 2 for t1 and 1 for t2
+        np.testing.assert_allclose(
+            [1 + 1 - comb(3, 2) / comb(4, 2), 1, 1, 1, 1],
+            diversity["allele_richness"],
+        )
+
+    def test_calc_pairwise_fst(self):
+        population_diversity = PMOProcessor.get_population_diversity(
+            self.combined_pmo_data, ["collection_country"]
+        )
+        allele_counts = PMOProcessor.extract_allele_counts_freq_from_pmo(
+            self.combined_pmo_data,
+            collapse_across_runs=True,
+            group_by_fields=["collection_country"],
+        )
+        fst = population_diversity.calc_pairwise_fst()
+        countries = sorted(set(allele_counts["collection_country"]))
+        self.assertEqual(len(countries) * (len(countries) - 1) // 2, len(fst))
+
+        # brute force Hudson's Fst from the allele frequencies
+        freqs = {
+            country: {
+                target: dict(zip(rows["mhap_id"], rows["freq"]))
+                for target, rows in country_rows.groupby("target_name")
+                if rows["count"].sum() >= 2
+            }
+            for country, country_rows in allele_counts.groupby("collection_country")
+        }
+        totals = allele_counts.groupby(["collection_country", "target_name"])[
+            "count"
+        ].sum()
+        for row in fst.itertuples():
+            a, b = row.collection_country_1, row.collection_country_2
+            within = 0
+            between = 0
+            shared = set(freqs[a]) & set(freqs[b])
+            for target in shared:
+                for country in [a, b]:
+                    n = totals[(country, target)]
+                    within += (
+                        n
+                        / (n - 1)
+                        * (1 - sum(p * p for p in freqs[country][target].values()))
+                    ) / 2
+                between += 1 - sum(
+                    p * freqs[b][target].get(mhap_id, 0)
+                    for mhap_id, p in freqs[a][target].items()
+                )
+            self.assertEqual(len(shared), row.target_number)
+            if len(shared) == 0:
+                self.assertTrue(np.isnan(row.fst))
+            else:
+                self.assertAlmostEqual(1 - within / between, row.fst)
+
+        # projects share targets
+        project_fst = PMOProcessor.get_population_diversity(
+            self.combined_pmo_data, ["project_name"]
+        ).calc_pairwise_fst()
+        self.assertEqual(89, project_fst["target_number"].iloc[0])
+        self.assertAlmostEqual(0.1347, project_fst["fst"].iloc[0], places=4)
+        self.assertRaises(
+            Exception,
+            PopulationDiversity,
+            allele_counts,
+            ["project_name"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+import json
+
+from pmotools.pmo_engine.pmo_index import PMOIndex
+from pmotools.pmo_engine.pmo_processor import PMOProcessor
+from pmotools.pmo_engine.specimen_meta_index import SpecimenMetaIndex
+
+
+class TestSpecimenMetaIndex(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(
+            os.path.join(
+                os.path.dirname(self.working_dir), "data/combined_pmo_example.json"
+            )
+        ) as f:
+            self.combined_pmo_data = json.load(f)
+        # specimen order: 8025874217, 8025874266, 5tbx, XUC009
+        self.combined_pmo_data["specimen_info"][1]["host_age"] = 3.5
+        self.combined_pmo_data["specimen_info"][2]["host_age"] = 40
+        self.combined_pmo_data["specimen_info"][3]["collection_date"] = "2012-08"
+
+    def select_ids(self, meta_index: SpecimenMetaIndex, field: str, values: list):
+        return SpecimenMetaIndex.bitset_to_ids(meta_index.select(field, values))
+
+    def test_select(self):
+        meta_index = SpecimenMetaIndex(self.combined_pmo_data["specimen_info"])
+        self.assertEqual(
+            [0, 1], self.select_ids(meta_index, "collection_country", ["Mozambique"])
+        )
+        self.assertEqual(
+            [0, 1, 2],
+            self.select_ids(meta_index, "collection_country", ["Mozambique", "India"]),
+        )
+        self.assertEqual([], self.select_ids(meta_index, "missing_field", ["a"]))
+        self.assertEqual(
+            [1, 3],
+            self.select_ids(meta_index, "specimen_name", ["XUC009", "8025874266", "a"]),
+        )
+        # numeric ranges
+        self.assertEqual([1], self.select_ids(meta_index, "host_age", ["..5"]))
+        self.assertEqual([1, 2], self.select_ids(meta_index, "host_age", ["3.5..40"]))
+        self.assertEqual([2], self.select_ids(meta_index, "host_age", ["5.."]))
+        # date ranges, partial dates need to fall completely within the range
+        self.assertEqual(
+            [0, 1], self.select_ids(meta_index, "collection_date", ["2018..2018"])
+        )
+        self.assertEqual(
+            [0], self.select_ids(meta_index, "collection_date", ["2018-05..2018-12"])
+        )
+        self.assertEqual(
+            [2, 3],
+            self.select_ids(meta_index, "collection_date", ["2012-08..2012-08-31"]),
+        )
+        self.assertEqual(
+            [2],
+            self.select_ids(meta_index, "collection_date", ["2012-08-01..2012-08-15"]),
+        )
+        # groups are intersections of their fields
+        self.assertEqual(
+            {0: 0b0010, 1: 0b0100},
+            meta_index.select_groups(
+                {
+                    0: {"collection_country": ["Mozambique"], "host_age": ["..5"]},
+                    1: {"project_id": ["1"], "host_age": ["10.."]},
+                }
+            ),
+        )
+
+    def test_counts(self):
+        meta_index = SpecimenMetaIndex(self.combined_pmo_data["specimen_info"])
+        self.assertEqual(
+            {
+                ("Mozambique", "NA"): 1,
+                ("Mozambique", "3.5"): 1,
+                ("India", "40"): 1,
+                ("Papua New Guinea", "NA"): 1,
+            },
+            meta_index.count_by_field_values(["collection_country", "host_age"]),
+        )
+        # a field with a value per specimen
+        self.assertEqual(
+            {
+                ("8025874217", "Mozambique"): 1,
+                ("8025874266", "Mozambique"): 1,
+                ("5tbx", "India"): 1,
+                ("XUC009", "Papua New Guinea"): 1,
+            },
+            meta_index.count_by_field_values(["specimen_name", "collection_country"]),
+        )
+        self.assertEqual(2, meta_index.field_specimen_count("host_age"))
+        self.assertEqual(
+            list(
+                dict.fromkeys(
+                    field
+                    for specimen in self.combined_pmo_data["specimen_info"]
+                    for field in specimen
+                )
+            ),
+            meta_index.fields,
+        )
+
+    def test_with_processor(self):
+        pmo_index = PMOIndex(self.combined_pmo_data)
+        (
+            pmo_data_select_meta,
+            group_counts,
+        ) = PMOProcessor.extract_from_pmo_samples_with_meta_groupings(
+            self.combined_pmo_data,
+            "collection_date=2012..2013;host_age=..5",
+            pmo_index,
+        )
+        self.assertEqual(
+            ["8025874266", "5tbx", "XUC009"],
+            PMOProcessor.get_specimen_names(pmo_data_select_meta),
+        )
+        self.assertEqual([2, 1], group_counts["count"].tolist())
+        # the meta index is built once and reused
+        self.assertIs(pmo_index.specimen_meta_index, pmo_index.specimen_meta_index)
+
+
+if __name__ == "__main__":
+    unittest.main()